@@ -3,9 +3,12 @@ from enum import IntEnum
 from .data_types_tree import *
 from .flow_data_types import *
 from .code_formater import Formater
+from . import result_store
+from .result_store import StoreFormat
 import math
 import uuid
 import threading
+import time
 import hashlib
 import os
 import logging
@@ -83,6 +86,8 @@ class Runner():
         """list of file paths generated by action"""
         self.work_dir = ""
         """Working directory of external process. (Relative to analysis work dir.)"""
+        self.create_time = time.time()
+        """time when runner was created, i.e. action is ready for external processing"""
 
 __action_counter__ = 0
 """action counter for unique settings in created script for code generation"""
@@ -107,6 +112,8 @@ class BaseActionType(metaclass=abc.ABCMeta):
     """Display name of action"""
     description = ""
     """Display description of action"""
+    _store_format = StoreFormat.text
+    """default format of stored results, pipeline processor sets it to its actions"""
 
     def __init__(self, **kwargs):
         global __action_counter__
@@ -332,12 +339,22 @@ class BaseActionType(metaclass=abc.ABCMeta):
         """set restore_id from identical_list"""
         self._restore_id = identical_list.get_old_iname(self._store_id)
 
+    def _set_store_format(self, store_format):
+        """set format of stored results"""
+        self._store_format = store_format
+
     def _store(self, path):
         """
         make all needed serialization processess and
-        return text data for storing
+        return text data for storing, or bytes if binary
+        store format is set
         """
         if self._output is not None:
+            if self._store_format == StoreFormat.binary:
+                try:
+                    return result_store.dumps(self._output)
+                except result_store.StoreError as e:
+                    logger.warning("Binary store is not possible, text is used: {0}".format(e))
             return self._output._get_settings_script()
         return ""
 
@@ -352,8 +369,12 @@ class BaseActionType(metaclass=abc.ABCMeta):
         data = self._store(path)
         file = os.path.join(path, "store", "{0}_{1}".format(self.name, self._store_id))
         try:
-            file_d = open(file, 'w')
-            file_d.write('\n'.join(data))
+            if isinstance(data, bytes):
+                file_d = open(file, 'wb')
+                file_d.write(data)
+            else:
+                file_d = open(file, 'w')
+                file_d.write('\n'.join(data))
             file_d.close()
         except (RuntimeError, IOError) as err:
             raise Exception("Can't save result to file {0} ({1})".format(path , str(err)))
@@ -380,6 +401,17 @@ class BaseActionType(metaclass=abc.ABCMeta):
                 logger.warning("Error in restore data: {0}: {1}".format(e.__class__.__name__, e))
                 self._restore_id = None
 
+    def _restore_binary(self, file_d, path):
+        """
+        make all needed deserialization processess from
+        file with binary store format
+        """
+        try:
+            self._output = result_store.load(file_d)
+        except Exception as e:
+            logger.warning("Error in restore data: {0}: {1}".format(e.__class__.__name__, e))
+            self._restore_id = None
+
     def _restore_results(self, path):
         """
         If restore is needed and restore data is available, read data 
@@ -397,9 +429,11 @@ class BaseActionType(metaclass=abc.ABCMeta):
                 return
         file = os.path.join(path, "restore",  "{0}_{1}".format(self.name, self._restore_id))
         try:
-            file_d = open(file, 'r')
-            data = file_d.read()
-            file_d.close()
+            with open(file, 'rb') as file_d:
+                if result_store.is_binary(file_d):
+                    self._restore_binary(file_d, path)
+                    return
+                data = file_d.read().decode("utf-8")
             self._restore(data, path)
         except (RuntimeError, IOError):
             self._restore_id = None
@@ -775,6 +809,11 @@ class WrapperActionType(BaseActionType, metaclass=abc.ABCMeta):
         super()._set_restore_id(identical_list)
         self._variables['WrappedAction']._set_restore_id(identical_list)
 
+    def _set_store_format(self, store_format):
+        """set format of stored results of this and wrapped action"""
+        super()._set_store_format(store_format)
+        self._variables['WrappedAction']._set_store_format(store_format)
+
     def get_resources(self):
         """Return list of resource files"""
         return self._variables['WrappedAction'].get_resources()
@@ -988,6 +1027,12 @@ class WorkflowActionType(BaseActionType, metaclass=abc.ABCMeta):
         for action in self._get_child_list():
             action._set_restore_id(identical_list)
 
+    def _set_store_format(self, store_format):
+        """set format of stored results of this and nested actions"""
+        super()._set_store_format(store_format)
+        for action in self._get_child_list():
+            action._set_store_format(store_format)
+
     def get_resources(self):
         """Return list of resource files"""
         ret = []
@@ -1,8 +1,15 @@
 from .data_types_tree import *
 from .flow_data_types import Enum
+from . import result_store
 
 from enum import IntEnum
 import numpy as np
+import base64
+import json
+import os
+import logging
+
+logger = logging.getLogger("Analysis")
 
 
 class CalibrationParameter():
@@ -271,3 +278,114 @@ class CalibrationOutputType():
                       result=Struct(n_iter=Int(),
                                     converge_reason=Enum(["none", "converged", "failure"]),
                                     residual=Float()))
+
+
+class CalibrationEvaluationCache():
+    def __init__(self, tolerances=None, digits=12):
+        """
+        Cache of model evaluations of calibration, parameter vector -> model output.
+        Every parameter is quantized to multiples of its tolerance, so points
+        closer than tolerance (in the same quantization cell) share one record
+        and the model is not evaluated again. Parameters without tolerance are
+        rounded to given number of significant digits, so only bitwise different
+        but practically identical points share one record.
+        Outputs can be persisted in file, one JSON record per line with output
+        in binary result store encoding, and reused by next run of the same calibration.
+        :param list tolerances: tolerance of every parameter, zero for no tolerance,
+        None for no tolerance of all parameters
+        :param int digits: number of significant digits of parameters without tolerance
+        """
+        self.tolerances = tolerances
+        """tolerances of parameters, has to be set before records are added or loaded"""
+        self.digits = digits
+        self._outputs = {}
+        """quantized x -> model output"""
+        self._xs = {}
+        """quantized x -> x of model output"""
+        self._jacs = {}
+        """quantized x -> jacobian matrix"""
+        self._file = None
+        """path to file for persisting of new records, None if not persisted"""
+
+    def key(self, x):
+        """return hashable quantized parameter vector"""
+        if self.tolerances is None:
+            return tuple(self._round(v) for v in x)
+        return tuple(int(round(v / t)) if t > 0 else self._round(v) for v, t in zip(x, self.tolerances))
+
+    def _round(self, v):
+        return float("{0:.{1}e}".format(v, self.digits - 1))
+
+    def __len__(self):
+        return len(self._outputs)
+
+    def __contains__(self, x):
+        return self.key(x) in self._outputs
+
+    def get_output(self, x):
+        """return model output in x or None"""
+        return self._outputs.get(self.key(x), None)
+
+    def add_output(self, x, output):
+        """add model output in x"""
+        key = self.key(x)
+        self._outputs[key] = output
+        self._xs[key] = [float(v) for v in x]
+        if self._file is not None:
+            self._write_records([(x, output)])
+
+    def get_jac(self, x):
+        """return jacobian matrix in x or None"""
+        return self._jacs.get(self.key(x), None)
+
+    def add_jac(self, x, jac):
+        """add jacobian matrix in x"""
+        self._jacs[self.key(x)] = jac
+
+    def load(self, file):
+        """
+        Load records from file, return number of loaded records.
+        Unreadable records are skipped.
+        """
+        if not os.path.isfile(file):
+            return 0
+        n = 0
+        try:
+            with open(file, 'r') as fd:
+                for line in fd:
+                    try:
+                        record = json.loads(line)
+                        output = result_store.loads(base64.b64decode(record["output"]))
+                    except Exception as e:
+                        logger.warning("Error in calibration cache record: {0}: {1}".format(e.__class__.__name__, e))
+                        continue
+                    key = self.key(record["x"])
+                    self._outputs[key] = output
+                    self._xs[key] = record["x"]
+                    n += 1
+        except (RuntimeError, IOError) as err:
+            logger.warning("Can't read calibration cache {0} ({1})".format(file, str(err)))
+        return n
+
+    def set_store_file(self, file):
+        """Persist all current and new records to file"""
+        self._file = file
+        try:
+            open(file, 'w').close()
+        except (RuntimeError, IOError) as err:
+            raise Exception("Can't save calibration cache to file {0} ({1})".format(file, str(err)))
+        self._write_records([(self._xs[key], output) for key, output in self._outputs.items()])
+
+    def _write_records(self, records):
+        try:
+            with open(self._file, 'a') as fd:
+                for x, output in records:
+                    try:
+                        data = base64.b64encode(result_store.dumps(output)).decode("ascii")
+                    except result_store.StoreError as e:
+                        logger.warning("Calibration cache record is not stored: {0}".format(e))
+                        continue
+                    record = {"x": [float(v) for v in x], "output": data}
+                    fd.write(json.dumps(record) + "\n")
+        except (RuntimeError, IOError) as err:
+            raise Exception("Can't save calibration cache to file {0} ({1})".format(self._file, str(err)))
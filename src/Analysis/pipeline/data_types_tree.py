@@ -1,6 +1,7 @@
 import abc
 import copy
 import math
+import numpy as np
 from .generic_tree import TT, GDTT
 from .code_formater import Formater
 
@@ -478,7 +479,7 @@ class Struct(CompositeDTT):
                 continue
             if not name in type_tree.__dict__:
                 return False
-            if type(value) is not type(type_tree.__dict__[name]):
+            if _match_class(value) is not _match_class(type_tree.__dict__[name]):
                 return False
             if isinstance(value, CompositeDTT):
                 if not type_tree.__dict__[name]._match_type(value):
@@ -613,7 +614,7 @@ class Tuple(CompositeDTT):
         if len(self._list) != len(type_tree._list):
                 return False
         for i in range(0, len(self._list)):
-            if type(self._list[i]) is not type(type_tree._list[i]):
+            if _match_class(self._list[i]) is not _match_class(type_tree._list[i]):
                 return False
             if isinstance(self._list[i], CompositeDTT):
                 if not type_tree._list[i]._match_type(self._list[i]):
@@ -921,3 +922,258 @@ class Sequence(Ensemble):
         if func_name == "tail" or func_name == "head":
             return [], self.subtype
         return ["Unknown template function {0}".format(func_name)], None
+
+
+class ColumnSequence(Sequence):
+    """
+    Sequence stored by columns
+
+    Items have the structure of the subtype (Struct and Tuple nesting),
+    values of the leaf variables are stored in columns identified by path
+    (for example '1.flux' for variable flux of Struct in the second Tuple
+    item). Numeric columns are NumPy arrays. Items are created only when
+    they are accessed, so big tables don't allocate objects for all values.
+    """
+
+    def __init__(self, subtype, columns=None):
+        """
+        :param DTT subtype: item type
+        :param dict columns: path => sequence of values, each column
+            in schema is required, all columns must have same length
+        """
+        self.subtype = subtype
+        self._schema = _column_schema(subtype)
+        """list of (column path, leaf type)"""
+        self._columns = {}
+        """column path => NumPy array"""
+        self._size = 0
+        """number of items"""
+        self._items = None
+        """list of created items"""
+        self._rows = None
+        """list of rows of column values"""
+        self._build = _item_builder(subtype)
+        """function creating item from row values"""
+        for i, (path, leaf) in enumerate(self._schema):
+            column = _to_column([] if columns is None else columns[path], leaf)
+            if i == 0:
+                self._size = len(column)
+            elif len(column) != self._size:
+                raise ValueError('Columns must have same length.')
+            self._columns[path] = column
+
+    @property
+    def schema(self):
+        """list of (column path, leaf type)"""
+        return self._schema
+
+    def column(self, path):
+        """return column values as NumPy array"""
+        return self._columns[path]
+
+    def column_items(self, path):
+        """return list of column values as leaf type instances"""
+        build = _item_builder(dict(self._schema)[path])
+        return [build(iter((value,))) for value in self._columns[path].tolist()]
+
+    @property
+    def _list(self):
+        """list of all items, created during first access"""
+        if self._items is None:
+            self._items = [self._get_row(i) for i in range(self._size)]
+        return self._items
+
+    def _get_row(self, i):
+        """create item from i-th values of columns"""
+        if self._rows is None:
+            self._rows = list(zip(*[self._columns[path].tolist() for path, leaf in self._schema]))
+        return self._build(iter(self._rows[i]))
+
+    def _take(self, indices):
+        """return ColumnSequence with items on set indices"""
+        indices = np.asarray(indices, dtype=np.intp)
+        return ColumnSequence(self.subtype, {
+            path: column[indices] for path, column in self._columns.items()})
+
+    def duplicate(self):
+        """
+        make deep copy
+        """
+        return self._take(np.arange(self._size))
+
+    def add_item(self, value):
+        if not isinstance(value, TT) or not self.subtype._match_type(value):
+            raise ValueError('Not supported ensemble type ({0}).'.format(str(value)))
+        leaves = []
+        _item_leaves(self.subtype, value, leaves)
+        for (path, leaf), value_leaf in zip(self._schema, leaves):
+            self._columns[path] = np.concatenate((
+                self._columns[path], _to_column([_leaf_value(leaf, value_leaf)], leaf)))
+        self._size += 1
+        self._rows = None
+        if self._items is not None:
+            self._items.append(value)
+
+    def _get_settings_script(self):
+        """return python script, that create instance of this class"""
+        lines = super(ColumnSequence, self)._get_settings_script()
+        lines[0] = "Sequence("
+        return lines
+
+    def _is_set(self):
+        """
+        return if structure contain real data
+        """
+        for path, leaf in self._schema:
+            column = self._columns[path]
+            if column.dtype == object:
+                for value in column:
+                    if value is None or (isinstance(value, DTT) and not value._is_set()):
+                        return False
+        return True
+
+    def _get_generics(self):
+        """return list of generic contained in this structure"""
+        return []
+
+    def __len__(self):
+        return self._size
+
+    def get_item(self, i):
+        if i < self._size:
+            if self._items is not None:
+                return self._items[i]
+            return self._get_row(i)
+        return None
+
+    def head(self):
+        if self._size > 0:
+            return self.get_item(0)
+        return self.subtype
+
+    def tail(self):
+        if self._size > 0:
+            return self.get_item(self._size - 1)
+        return self.subtype
+
+    def select(self, predicate):
+        """return selected Sequence accoding set predicate"""
+        return self._take([i for i in range(self._size)
+                           if predicate._get_bool(self.get_item(i))])
+
+    def sort(self, key_selector):
+        """return sorted Sequence accoding set predicate"""
+        keys = [key_selector._get_key(self.get_item(i)) for i in range(self._size)]
+        return self._take(sorted(range(self._size), key=keys.__getitem__))
+
+
+def _match_class(value):
+    """return class compared during type matching, ColumnSequence is Sequence"""
+    if isinstance(value, ColumnSequence):
+        return Sequence
+    return type(value)
+
+
+def _struct_names(struct):
+    """return variable names of Struct"""
+    return [name for name in struct.__dict__ if not (name[:2] == '__' and name[-2:] == '__')]
+
+
+def _column_schema(subtype, path=None):
+    """return list of (column path, leaf type) of the item type"""
+    if isinstance(subtype, Struct):
+        keys = _struct_names(subtype)
+        children = [subtype.__dict__[name] for name in keys]
+    elif isinstance(subtype, Tuple):
+        keys = [str(i) for i in range(len(subtype))]
+        children = subtype._list
+    else:
+        return [("" if path is None else path, subtype)]
+    schema = []
+    for key, child in zip(keys, children):
+        schema.extend(_column_schema(child, key if path is None else path + "." + key))
+    return schema
+
+
+def _column_dtype(leaf):
+    """return NumPy type of column with the leaf type"""
+    if isinstance(leaf, Float):
+        return np.float64
+    if isinstance(leaf, Int):
+        return np.int64
+    if isinstance(leaf, Bool):
+        return np.bool_
+    return object
+
+
+def _to_column(values, leaf):
+    """return NumPy array with values of the leaf type"""
+    dtype = _column_dtype(leaf)
+    if dtype is not object:
+        if isinstance(values, np.ndarray) or all(value is not None for value in values):
+            return np.asarray(values, dtype=dtype)
+        # unset values are kept in object column
+    if isinstance(values, np.ndarray) and values.dtype == object:
+        return values
+    # fill by items, DTT or strings must not be expanded to dimensions
+    column = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        column[i] = value
+    return column
+
+
+def _leaf_value(leaf, value):
+    """return value stored in column of the leaf type"""
+    if isinstance(leaf, BaseDTT):
+        return value.value
+    return value
+
+
+def _item_leaves(subtype, item, leaves):
+    """append leaf values of the item in schema order"""
+    if isinstance(subtype, Struct):
+        for name in _struct_names(subtype):
+            _item_leaves(subtype.__dict__[name], item.__dict__[name], leaves)
+    elif isinstance(subtype, Tuple):
+        for child, item_child in zip(subtype._list, item._list):
+            _item_leaves(child, item_child, leaves)
+    else:
+        leaves.append(item)
+
+
+def _item_builder(subtype):
+    """
+    return function, that create item of the subtype from values
+    iterator, type checks are resolved once for whole column
+    """
+    if isinstance(subtype, Struct):
+        names = _struct_names(subtype)
+        builders = [_item_builder(subtype.__dict__[name]) for name in names]
+
+        def build_struct(values):
+            item = Struct()
+            # values have types from schema, assignation check is not needed
+            item.__dict__.update(zip(names, [build(values) for build in builders]))
+            return item
+        return build_struct
+    if isinstance(subtype, Tuple):
+        builders = [_item_builder(child) for child in subtype._list]
+
+        def build_tuple(values):
+            item = Tuple()
+            item._list = [build(values) for build in builders]
+            return item
+        return build_tuple
+    if isinstance(subtype, BaseDTT):
+        cls = subtype.__class__
+        state = subtype.__dict__
+
+        def build_leaf(values):
+            value = next(values)
+            leaf = cls.__new__(cls)
+            leaf.__dict__.update(state)
+            if value is not None:
+                leaf._assigne(value)
+            return leaf
+        return build_leaf
+    return next
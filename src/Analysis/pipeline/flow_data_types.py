@@ -2,7 +2,9 @@ from .data_types_tree import *
 from gm_base.flow_util import YamlSupportRemote, ObservedQuantitiesValueType
 import xml.etree.ElementTree as ET
 import os
+import numpy as np
 import yaml as pyyaml
+from .observe_reader import read_observe_file
 
 
 class MeshType(BaseDTT):
@@ -72,7 +74,7 @@ class SimulationTime(Float):
         """
         make deep copy
         """
-        return SimulationTime(self.__float)
+        return SimulationTime(self.value)
 
     def _get_settings_script(self):
         """return python script, that create instance of this class"""
@@ -97,7 +99,7 @@ class Enum(String):
         """
         make deep copy
         """
-        return Enum(self.option_list, self.__string)
+        return Enum(list(self.option_list), self.value)
 
     def _get_settings_script(self):
         """return python script, that create instance of this class"""
@@ -111,15 +113,6 @@ class Enum(String):
             return ["Enum({0})".format(ol)]
         return ["Enum({0}, '{1}')".format(ol, self.value)]
 
-    def _assigne(self, value):
-        """
-        Assigne appropriate python variable to data
-        """
-        if isinstance(value, BaseDTT):
-            self.__string = str(value.value)
-        else:
-            self.__string = str(value)
-
 
 # class RegionEnum(String):
 #     def __init__(self, string=None):
@@ -166,6 +159,11 @@ class PVD_Type():
 
 
 class BalanceType():
+    VALUE_NAMES = ["flux", "flux_in", "flux_out", "mass", "source", "source_in",
+                   "source_out", "flux_increment", "source_increment",
+                   "flux_cumulative", "source_cumulative", "error"]
+    """names of numeric balance columns in file order"""
+
     @staticmethod
     def create_iner_test_data(region_options, quantity_options):
         return Struct(time=SimulationTime(1.0),
@@ -220,38 +218,31 @@ class BalanceType():
         try:
             with open(file, 'r') as fd:
                 fd.readline()
-                for line in fd:
-                    if line[-1] == "\n":
-                        line = line[:-1]
-                    s = line.split("\t")
-                    if len(s) < 15:
-                        continue
-                    for i in range(len(s)):
-                        if s[i][0] == '"' and s[i][-1] == '"':
-                            s[i] = s[i][1:-1]
-                    time = float(s[0])
-                    iner_data = Struct(time=SimulationTime(time),
-                                       region=Enum(region_options, s[1]),
-                                       quantity=Enum(quantity_options, s[2]),
-                                       flux=Float(float(s[3])),
-                                       flux_in=Float(float(s[4])),
-                                       flux_out=Float(float(s[5])),
-                                       mass=Float(float(s[6])),
-                                       source=Float(float(s[7])),
-                                       source_in=Float(float(s[8])),
-                                       source_out=Float(float(s[9])),
-                                       flux_increment=Float(float(s[10])),
-                                       source_increment=Float(float(s[11])),
-                                       flux_cumulative=Float(float(s[12])),
-                                       source_cumulative=Float(float(s[13])),
-                                       error=Float(float(s[14])))
-                    ret.add_item(Tuple(Float(time), iner_data))
+                lines = [line for line in fd if line.count("\t") >= 14]
+            if len(lines) > 0:
+                # numbers are read in bulk, strings are only unquoted
+                values = np.loadtxt(lines, delimiter="\t", usecols=[0] + list(range(3, 15)), ndmin=2)
+                texts = [line.split("\t", 3)[1:3] for line in lines]
+                columns = {"0": values[:, 0], "1.time": values[:, 0],
+                           "1.region": [_unquote(t[0]) for t in texts],
+                           "1.quantity": [_unquote(t[1]) for t in texts]}
+                for i, name in enumerate(BalanceType.VALUE_NAMES):
+                    columns["1." + name] = values[:, i + 1]
+                ret = ColumnSequence(ret.subtype, columns)
         except (RuntimeError, IOError) as e:
             err.append("Can't open balance file: {0}".format(e))
             #return err
         return ret
 
 
+def _unquote(text):
+    """remove quotes from balance file field"""
+    text = text.strip()
+    if len(text) > 1 and text[0] == '"' and text[-1] == '"':
+        return text[1:-1]
+    return text
+
+
 class PositionVector():
     @staticmethod
     def create_data():
@@ -310,51 +301,42 @@ class ObservationType():
         return Sequence(iner)
 
     @staticmethod
-    def parse_data_from_file(file, observed_quantities):
+    def parse_data_from_file(file, observed_quantities, point_names=None, quantity_names=None):
+        """
+        Parse observe file, the file is read as stream, only values of
+        points in point_names and quantities in quantity_names (all
+        if None) are stored.
+        """
         err = []
+        if quantity_names is not None:
+            observed_quantities = {oq: vt for oq, vt in observed_quantities.items()
+                                   if oq in quantity_names}
         observe_points, observe_data = ObservationType.create_type(observed_quantities)
         try:
-            with open(file, 'r') as file_d:
-                data = pyyaml.load(file_d)
-
-            # observe points
-            #op = []
-            point_names = []
-            for point in data["points"]:
-                n = point["name"]
-                p = point["observe_point"]
-                #op.append(Tuple(Float(p[0]), Float(p[1]), Float(p[2])))
-                point_names.append(n)
-                observe_points.add_item(Struct(name=String(n), point=Tuple(Float(p[0]), Float(p[1]), Float(p[2]))))
-
-            #j = 0
-            for item in data["data"]:
-                std = ObservationType.create_single_time_data_type(observed_quantities)
-                for i in range(len(observe_points)):
-                    oqt = Struct(name=String(point_names[i]))
-                    for oq, vt in observed_quantities.items():
-                        if vt == ObservedQuantitiesValueType.integer:
-                            setattr(oqt, oq, Int(item[oq][i]))
-                        elif vt == ObservedQuantitiesValueType.scalar:
-                            setattr(oqt, oq, Float(item[oq][i]))
-                        elif vt == ObservedQuantitiesValueType.vector:
-                            setattr(oqt, oq, Tuple(Float(item[oq][i][0]), Float(item[oq][i][1]), Float(item[oq][i][2])))
-                        elif vt == ObservedQuantitiesValueType.tensor:
-                            setattr(oqt, oq, Tuple(Float(item[oq][i][0][0]), Float(item[oq][i][0][1]), Float(item[oq][i][0][2]),
-                                                   Float(item[oq][i][1][0]), Float(item[oq][i][1][1]), Float(item[oq][i][1][2]),
-                                                   Float(item[oq][i][2][0]), Float(item[oq][i][2][1]), Float(item[oq][i][2][2])))
-                        #iner_data = Struct(time=SimulationTime(Float(item["time"])),
-                        #                   point=op[i],
-                        #                   observation=oqt)
-                    std.add_item(oqt)
-                observe_data.add_item(Tuple(Float(item["time"]), std))
-                    #j += 1
-        except (RuntimeError, IOError) as e:
+            data = read_observe_file(file, observed_quantities, point_names)
+
+            observe_points = ColumnSequence(observe_points.subtype, {
+                "name": data.names, "point.0": data.points[:, 0],
+                "point.1": data.points[:, 1], "point.2": data.points[:, 2]})
+
+            # columns of all time frames are views of the read arrays
+            subtype = observe_data.subtype[1].subtype
+            for frame, time in enumerate(data.times.tolist()):
+                columns = {"name": data.names}
+                for oq, vt in observed_quantities.items():
+                    values = data.values[oq][frame]
+                    if vt == ObservedQuantitiesValueType.integer or \
+                            vt == ObservedQuantitiesValueType.scalar:
+                        columns[oq] = values[:, 0]
+                    else:
+                        for j in range(values.shape[1]):
+                            columns["{0}.{1}".format(oq, j)] = values[:, j]
+                observe_data.add_item(Tuple(Float(time), ColumnSequence(subtype, columns)))
+        except (RuntimeError, IOError, pyyaml.YAMLError) as e:
             err.append("Can't open observe .yaml file: {0}".format(e))
             #return err
         return observe_points, observe_data
 
-
     @staticmethod
     def create_type(observed_quantities):
         observe_points = Sequence(Struct(name=String(), point=Tuple(Float(), Float(), Float())))
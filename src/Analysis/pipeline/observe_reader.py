@@ -0,0 +1,269 @@
+"""
+Streaming reader of Flow123d observe files.
+
+Observe files (`*_observe.yaml`) of long transient simulations have
+hundreds of MB, so they are not loaded as a python tree. YAML events
+are read from the file stream (by the libyaml C parser if available),
+time frames are processed one by one and values of the selected points
+and quantities are written to preallocated NumPy arrays.
+"""
+import math
+
+import numpy as np
+import yaml as pyyaml
+
+from gm_base.flow_util import ObservedQuantitiesValueType
+
+
+LIBYAML_AVAILABLE = getattr(pyyaml, '__with_libyaml__', False)
+"""True if pyyaml is built with the libyaml C parser."""
+
+_VALUE_SIZES = {
+    ObservedQuantitiesValueType.integer: 1,
+    ObservedQuantitiesValueType.scalar: 1,
+    ObservedQuantitiesValueType.vector: 3,
+    ObservedQuantitiesValueType.tensor: 9}
+"""number of values of one point for quantity value type"""
+
+_SPECIAL_FLOATS = {'.nan': math.nan, '.inf': math.inf, '+.inf': math.inf, '-.inf': -math.inf}
+
+_INITIAL_FRAMES = 16
+"""initial capacity of frame arrays"""
+
+
+class ObserveData:
+    """Observe points and values of observed quantities in time frames"""
+
+    def __init__(self, names, points, times, values):
+        self.names = names
+        """list of observe point names"""
+        self.points = points
+        """array (points, 3) of observe point coordinates"""
+        self.times = times
+        """array (frames) of frame times"""
+        self.values = values
+        """quantity => array (frames, points, values of the point)"""
+
+
+def read_observe_file(file, observed_quantities, point_names=None, quantity_names=None,
+                      use_libyaml=True):
+    """
+    Read observe file.
+
+    :param str file: observe file path
+    :param dict observed_quantities: quantity name => ObservedQuantitiesValueType
+    :param list point_names: names of read points, all points if None
+    :param list quantity_names: names of read quantities, all observed
+        quantities if None
+    :param bool use_libyaml: use the libyaml C parser if available
+    :return: ObserveData
+    """
+    quantities = {oq: vt for oq, vt in observed_quantities.items()
+                  if quantity_names is None or oq in quantity_names}
+    with open(file, 'r') as file_d:
+        if use_libyaml and LIBYAML_AVAILABLE:
+            events = pyyaml.parse(file_d, Loader=pyyaml.CLoader)
+        else:
+            events = pyyaml.parse(file_d)
+        reader = _ObserveReader(events, quantities, point_names)
+        return reader.read()
+
+
+class _ObserveReader:
+    """Reader of observe file YAML events"""
+
+    def __init__(self, events, quantities, point_names):
+        self._events = events
+        self._quantities = quantities
+        """quantity => value type"""
+        self._point_names = point_names
+        """names of read points, all if None"""
+        self._indices = None
+        """indices of read points in file"""
+        self._names = []
+        self._points = np.empty((0, 3))
+        self._times = None
+        self._values = {}
+        self._n_frames = 0
+
+    def _next(self):
+        try:
+            return next(self._events)
+        except StopIteration:
+            raise pyyaml.YAMLError("Unexpected end of observe file")
+
+    def read(self):
+        event = self._next()
+        while not isinstance(event, pyyaml.MappingStartEvent):
+            if isinstance(event, pyyaml.StreamEndEvent):
+                raise pyyaml.YAMLError("Observe file is empty")
+            event = self._next()
+        event = self._next()
+        while not isinstance(event, pyyaml.MappingEndEvent):
+            key = event.value
+            event = self._next()
+            if key == "points":
+                self._read_points(event)
+            elif key == "data":
+                self._read_data(event)
+            else:
+                self._skip(event)
+            event = self._next()
+        # unused capacity is released
+        values = {name: array[:self._n_frames].copy() for name, array in self._values.items()}
+        times = self._times[:self._n_frames].copy() if self._times is not None else np.empty(0)
+        return ObserveData(self._names, self._points, times, values)
+
+    def _skip(self, event):
+        """skip events of the node starting by event"""
+        depth = 0
+        while True:
+            if isinstance(event, (pyyaml.MappingStartEvent, pyyaml.SequenceStartEvent)):
+                depth += 1
+            elif isinstance(event, (pyyaml.MappingEndEvent, pyyaml.SequenceEndEvent)):
+                depth -= 1
+            if depth == 0:
+                return
+            event = self._next()
+
+    def _read_node(self, event):
+        """read small node (observe point) as python value, scalars as texts"""
+        if isinstance(event, pyyaml.ScalarEvent):
+            return event.value
+        if isinstance(event, pyyaml.SequenceStartEvent):
+            ret = []
+            event = self._next()
+            while not isinstance(event, pyyaml.SequenceEndEvent):
+                ret.append(self._read_node(event))
+                event = self._next()
+            return ret
+        if isinstance(event, pyyaml.MappingStartEvent):
+            ret = {}
+            event = self._next()
+            while not isinstance(event, pyyaml.MappingEndEvent):
+                key = event.value
+                ret[key] = self._read_node(self._next())
+                event = self._next()
+            return ret
+        self._skip(event)
+        return None
+
+    def _read_points(self, event):
+        points = self._read_node(event)
+        names = [point["name"] for point in points]
+        if self._point_names is None:
+            self._indices = list(range(len(points)))
+        else:
+            positions = {name: i for i, name in enumerate(names)}
+            self._indices = [positions[name] for name in self._point_names if name in positions]
+        self._names = [names[i] for i in self._indices]
+        self._points = np.asarray([[_to_float(value) for value in points[i]["observe_point"]]
+                                   for i in self._indices], dtype=np.float64).reshape(len(self._indices), 3)
+
+    def _allocate(self, capacity):
+        """allocate or grow frame arrays to capacity"""
+        n_points = len(self._indices)
+        times = np.empty(capacity)
+        if self._times is not None:
+            times[:self._n_frames] = self._times[:self._n_frames]
+        self._times = times
+        for name, value_type in self._quantities.items():
+            dtype = np.int64 if value_type == ObservedQuantitiesValueType.integer else np.float64
+            array = np.empty((capacity, n_points, _VALUE_SIZES[value_type]), dtype=dtype)
+            if name in self._values:
+                array[:self._n_frames] = self._values[name][:self._n_frames]
+            self._values[name] = array
+
+    def _read_data(self, event):
+        if self._indices is None:
+            raise pyyaml.YAMLError("Observe points must precede data")
+        self._allocate(_INITIAL_FRAMES)
+        if not isinstance(event, pyyaml.SequenceStartEvent):
+            self._skip(event)
+            return
+        event = self._next()
+        while not isinstance(event, pyyaml.SequenceEndEvent):
+            if self._n_frames == len(self._times):
+                self._allocate(2 * len(self._times))
+            self._read_frame(event)
+            self._n_frames += 1
+            event = self._next()
+
+    def _read_frame(self, event):
+        """read one time frame to arrays at frame index"""
+        frame = self._n_frames
+        read = set()
+        event = self._next()
+        while not isinstance(event, pyyaml.MappingEndEvent):
+            key = event.value
+            event = self._next()
+            if key == "time":
+                self._times[frame] = _to_float(event.value)
+                read.add(key)
+            elif key in self._quantities:
+                self._read_values(event, self._values[key][frame])
+                read.add(key)
+            else:
+                self._skip(event)
+            event = self._next()
+        missing = [name for name in ["time"] + list(self._quantities) if name not in read]
+        if len(missing) > 0:
+            raise ValueError("Frame {0} of observe file has no {1}".format(frame, ", ".join(missing)))
+
+    def _read_values(self, event, array):
+        """read values of all points, store values of read points to array"""
+        convert = _to_int if array.dtype.kind == 'i' else _to_float
+        size = array.shape[1]
+        targets = {index: i for i, index in enumerate(self._indices)}
+        point = 0
+        event = self._next()
+        while not isinstance(event, pyyaml.SequenceEndEvent):
+            target = targets.get(point)
+            if target is None:
+                self._skip(event)
+            else:
+                values = []
+                self._read_scalars(event, values)
+                if len(values) != size:
+                    raise ValueError("Observed value must have {0} components".format(size))
+                array[target] = [convert(value) for value in values]
+            point += 1
+            event = self._next()
+        if len(targets) > 0 and point <= max(targets):
+            raise ValueError("Observed quantity has {0} values only".format(point))
+
+    def _read_scalars(self, event, values):
+        """append scalar texts of node (scalar or nested sequence) to values"""
+        if isinstance(event, pyyaml.ScalarEvent):
+            values.append(event.value)
+            return
+        depth = 0
+        while True:
+            if isinstance(event, pyyaml.ScalarEvent):
+                values.append(event.value)
+            elif isinstance(event, pyyaml.SequenceStartEvent):
+                depth += 1
+            elif isinstance(event, pyyaml.SequenceEndEvent):
+                depth -= 1
+            if depth == 0:
+                return
+            event = self._next()
+
+
+def _to_float(text):
+    """convert YAML scalar to float"""
+    try:
+        return float(text)
+    except ValueError:
+        try:
+            return _SPECIAL_FLOATS[text.lower()]
+        except KeyError:
+            raise ValueError("Value {0} is not a number".format(text))
+
+
+def _to_int(text):
+    """convert YAML scalar to int"""
+    try:
+        return int(text)
+    except ValueError:
+        return int(_to_float(text))
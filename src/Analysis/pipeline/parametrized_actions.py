@@ -64,7 +64,8 @@ class Flow123dAction(ParametrizedActionType):
                 return
 
         # check hash consistency
-        err, yaml_file_hash_real = YamlSupportRemote.file_hash(yaml_file)
+        err, yaml_file_hash_real = YamlSupportRemote.file_hash(
+            yaml_file, YamlSupportRemote.hash_algorithm(self._yaml_support.get_yaml_file_hash()))
         if len(err) > 0:
             self._extend_error(self._load_errs, err)
             return
@@ -74,7 +75,8 @@ class Flow123dAction(ParametrizedActionType):
         input_files_hashes = self._yaml_support.get_input_files_hashes()
         for file in self._yaml_support.get_input_files():
             file_path = os.path.join(dir, os.path.normpath(file))
-            err, file_hash_real = YamlSupportRemote.file_hash(file_path)
+            err, file_hash_real = YamlSupportRemote.file_hash(
+                file_path, YamlSupportRemote.hash_algorithm(input_files_hashes[file]))
             if len(err) > 0:
                 self._extend_error(self._load_errs, err)
                 return
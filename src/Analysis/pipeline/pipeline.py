@@ -1,4 +1,5 @@
 from .action_types import WorkflowActionType, ActionStateType, BaseActionType
+from .result_store import StoreFormat
 
 class PipelineResult(WorkflowActionType):
     def __init__(self, action, output):
@@ -25,6 +26,8 @@ class Pipeline(WorkflowActionType):
         :param object Output: This variable is ignore, during inicialize
             is set accoding OutputAction's outputs
         :param array of PipelineResult: Action that is exit from pipeline
+        :param str StoreFormat: Format of stored action results ('text' - python
+            script, 'binary' - compact binary encoding), 'text' is default
         """
         super(Pipeline, self).__init__(**kwargs)        
 
@@ -60,7 +63,15 @@ class Pipeline(WorkflowActionType):
             self._add_error(err, "Parameter 'ResultActions' is require for pipeline")
         elif len(self._variables['ResultActions'])<1:
             self._add_error(err, "Parameter 'ResultActions' must contains least one action")
+        if 'StoreFormat' in self._variables and \
+            self._variables['StoreFormat'] not in StoreFormat.formats:
+            self._add_error(err, "Parameter 'StoreFormat' must be one of {0}".format(
+                ", ".join(StoreFormat.formats)))
         return err
+
+    def _get_store_format(self):
+        """return format of stored action results"""
+        return self._variables.get('StoreFormat', StoreFormat.text)
         
     def validate(self):    
         """validate variables, input and output"""
@@ -112,5 +123,7 @@ class Pipeline(WorkflowActionType):
                         array += ", "
                     array += out._get_instance_name()                    
             var.append([array+']'])
+        if 'StoreFormat' in self._variables:
+            var.append(["StoreFormat='{0}'".format(self._variables['StoreFormat'])])
         # ToDo PipelineResult
         return var
@@ -46,9 +46,12 @@ class Pipelineprocessor():
     """
 
     __workers__ = 4
-    """Number of threads for processing internal jobs"""
+    """Default number of threads for processing internal jobs"""
+    __plan_timeout__ = 0.1
+    """Maximal waiting for event before next planning pass, if no action is ready"""
 
-    def __init__(self, pipeline, log_path=None, log_level=logging.WARNING, save_path="./backup", identical_list=None):
+    def __init__(self, pipeline, log_path=None, log_level=logging.WARNING, save_path="./backup", identical_list=None,
+                 n_workers=None):
         self._pipeline = pipeline
         """pipeline"""       
         self._is_validate = False
@@ -69,6 +72,8 @@ class Pipelineprocessor():
             establishing connection. File identical_list is needed only for action
             processing, and for action planning should be None. Equal list is
             created in client site by :class:`client_pipeline.identical_list_creator.ELCreator`.
+        :param int n_workers: Number of threads for processing internal jobs,
+            if None, __workers__ is used
         """
         self._errs = []
         """validation errors"""
@@ -89,12 +94,20 @@ class Pipelineprocessor():
         """signal to sepparate thread for pausing"""
         self._run_errs = []
         """errors during run"""
+        self._n_workers = self.__workers__ if n_workers is None else n_workers
+        """number of threads for processing internal jobs"""
+        self._wake_event = threading.Event()
+        """
+        Event for waking up sepparate thread, set if worker finish action,
+        external job is finished or processing is stopped or paused
+        """
         self._save_path = save_path
         """path for result saving (read-only)"""
         if log_path is not None:
             self.__set_loger(log_path,  log_level)
         self._save_path = save_path
         self.WorkerThread._save_path = save_path
+        pipeline._set_store_format(pipeline._get_store_format())
         self._establish_processing(identical_list)
         
     class WorkerThread():
@@ -108,13 +121,17 @@ class Pipelineprocessor():
         """lock for runners"""
         _save_path = None
         """path for result saving (read-only)"""
-        def __init__(self):
+        def __init__(self, wake_event=None):
             self._action = None
             """processed action"""
             self._stop = False
             """stop thread"""            
             self._action_lock = threading.Lock()
             """lock for action settings"""
+            self._action_cond = threading.Condition(self._action_lock)
+            """condition for waiting for action or stop signal"""
+            self._wake_event = wake_event
+            """event set after action processing (can be None)"""
             self._after_run = False
             """is processed after run externall action"""
             self._error = None
@@ -130,6 +147,7 @@ class Pipelineprocessor():
             if self._action is None:
                 self._after_run=after_run
                 self._action = action
+                self._action_cond.notify()
                 ret = True
             self._action_lock.release()            
             return ret            
@@ -146,17 +164,11 @@ class Pipelineprocessor():
         def run(self):
             """worker thread"""
             while True:
-                is_action = False
-                while not is_action:                
-                    self._action_lock.acquire()
+                with self._action_cond:
+                    while self._action is None and not self._stop:
+                        self._action_cond.wait()
                     if self._stop:
-                        self._action_lock.release()
                         return
-                    if self._action is not None:
-                        is_action = True
-                    self._action_lock.release()
-                    if not  is_action:
-                        time.sleep(0.1)
                 if self._after_run:
                     self._action._after_update(self._save_path)
                     logger.info("External action {0} processing is ended".format(
@@ -194,10 +206,13 @@ class Pipelineprocessor():
                 self._action_lock.acquire()
                 self._action = None
                 self._action_lock.release()
+                if self._wake_event is not None:
+                    self._wake_event.set()
 
         def stop(self):
             self._action_lock.acquire()
             self._stop = True
+            self._action_cond.notify()
             self._action_lock.release()
             
         def get_error(self):
@@ -262,6 +277,7 @@ class Pipelineprocessor():
         self._action_lock.acquire()
         self._stop = True
         self._action_lock.release()
+        self._wake_event.set()
 
     def pause(self, pause):
         """Pause or rerun sepparate thread"""
@@ -270,6 +286,7 @@ class Pipelineprocessor():
         self._action_lock.acquire()
         self._pause = pause
         self._action_lock.release()
+        self._wake_event.set()
 
     def get_statistics(self):
         """Get pipeline statistics. First statistics are ready after 
@@ -303,6 +320,7 @@ class Pipelineprocessor():
         self.WorkerThread._processed_runners.remove(ret)
         self.WorkerThread._finished_runners.append(ret)                
         self.WorkerThread._runners_lock.release()
+        self._wake_event.set()
         
     def _establish_processing(self, identical_list):
         """
@@ -403,9 +421,10 @@ class Pipelineprocessor():
         wait_actions = []
         """action that can be processed"""
         
-        for i in range(0, self.__workers__):
-            workers.append(self.WorkerThread())
+        for i in range(0, self._n_workers):
+            workers.append(self.WorkerThread(self._wake_event))
         while True:           
+            self._wake_event.clear()
             self._action_lock.acquire()
             if self._stop or self._pause:
                 while True:
@@ -420,7 +439,8 @@ class Pipelineprocessor():
                     if self._pause:
                         # pause after signall
                         self._action_lock.release()
-                        time.sleep(1)                        
+                        self._wake_event.wait(1)
+                        self._wake_event.clear()
                         self._action_lock.acquire()
                     else:
                         break
@@ -446,7 +466,7 @@ class Pipelineprocessor():
                     worker.add_action(runner.action, True)
             # try add action to workers
             if len(wait_actions)==0:
-                time.sleep(0.1)
+                self._wake_event.wait(self.__plan_timeout__)
             try:
                 action = wait_actions.pop() 
                 for worker in workers:
@@ -456,6 +476,9 @@ class Pipelineprocessor():
             except IndexError:
                 # empty queue
                 pass
+            if len(wait_actions) > 0:
+                # all workers are busy
+                self._wake_event.wait(self.__plan_timeout__)
             if state is ActionRunningState.finished and \
                 len(self.WorkerThread._complex_runners) == 0 and \
                 len(self.WorkerThread._processed_runners) == 0 and \
@@ -0,0 +1,483 @@
+"""
+Binary store of action results.
+
+Results (DTT trees) are stored in a typed, length-prefixed binary encoding
+instead of python script. Ensembles and Sequences of items with the same
+structure (balance tables, observation series) are stored by columns,
+numeric columns as NumPy arrays.
+"""
+import io
+import struct
+
+import numpy as np
+
+from .data_types_tree import Int, Float, Bool, String, Struct, Tuple, Ensemble, Sequence, \
+    ColumnSequence
+from .flow_data_types import MeshType, SimulationTime, Enum
+
+
+class StoreFormat:
+    """Result store formats"""
+    text = "text"
+    """python script evaluated during restore"""
+    binary = "binary"
+    """binary encoding of DTT tree"""
+    formats = [text, binary]
+    """all store formats"""
+
+
+class StoreError(Exception):
+    """Value can't be stored or stored data are corrupted"""
+    pass
+
+
+MAGIC = b"GMDTT\x00\x01"
+"""binary store file header (name, format version)"""
+
+# value tags
+_NONE = 0
+_INT = 1
+_BIG_INT = 2
+_FLOAT = 3
+_BOOL = 4
+_STRING = 5
+_MESH = 6
+_SIMULATION_TIME = 7
+_ENUM = 8
+_STRUCT = 9
+_TUPLE = 10
+_ENSEMBLE = 11
+_SEQUENCE = 12
+
+# list layouts
+_ITEMS = 0
+_COLUMNS = 1
+
+# column kinds
+_NUMERIC_COLUMN = 0
+_STRING_COLUMN = 1
+_ENUM_COLUMN = 2
+_VALUE_COLUMN = 3
+
+_NUMERIC_TYPES = {
+    Float: (_FLOAT, '<f8'),
+    SimulationTime: (_SIMULATION_TIME, '<f8'),
+    Int: (_INT, '<i8'),
+    Bool: (_BOOL, '|u1')}
+_NUMERIC_TAGS = {tag: (cls, dtype) for cls, (tag, dtype) in _NUMERIC_TYPES.items()}
+_STRING_TYPES = {String: _STRING, MeshType: _MESH}
+_STRING_TAGS = {_STRING: String, _MESH: MeshType}
+
+_U32 = struct.Struct('<I')
+_I64 = struct.Struct('<q')
+_F64 = struct.Struct('<d')
+_INT64_MIN = -2**63
+_INT64_MAX = 2**63 - 1
+
+
+def is_binary(file_d):
+    """Return True if the file opened in binary mode contains binary store"""
+    position = file_d.tell()
+    header = file_d.read(len(MAGIC))
+    file_d.seek(position)
+    return header == MAGIC
+
+
+def dump(value, file_d):
+    """Write DTT tree to file opened in binary mode"""
+    file_d.write(MAGIC)
+    _Writer(file_d).write_value(value)
+
+
+def dumps(value):
+    """Return DTT tree encoded to bytes"""
+    buffer = io.BytesIO()
+    dump(value, buffer)
+    return buffer.getvalue()
+
+
+def load(file_d):
+    """Read DTT tree from file opened in binary mode"""
+    reader = _Reader(file_d)
+    reader.read_header()
+    return reader.read_value()
+
+
+def loads(data):
+    """Return DTT tree decoded from bytes"""
+    return load(io.BytesIO(data))
+
+
+def iter_items(file_d):
+    """
+    Read stored Ensemble or Sequence item by item.
+
+    The whole list is never created, so big result tables can be
+    processed with a small memory footprint.
+    """
+    reader = _Reader(file_d)
+    reader.read_header()
+    tag = reader.read_tag()
+    if tag not in (_ENSEMBLE, _SEQUENCE):
+        raise StoreError("Stored value is not Ensemble or Sequence")
+    reader.read_value(tag)
+    yield from reader.iter_list_items()
+
+
+class _Writer:
+    """Encoder of DTT tree"""
+
+    def __init__(self, file_d):
+        self._file_d = file_d
+
+    def _write_tag(self, tag):
+        self._file_d.write(bytes((tag,)))
+
+    def _write_u32(self, value):
+        self._file_d.write(_U32.pack(value))
+
+    def _write_str(self, value):
+        data = value.encode("utf-8")
+        self._write_u32(len(data))
+        self._file_d.write(data)
+
+    def write_value(self, value):
+        """Write one DTT value"""
+        cls = type(value)
+        if cls in _NUMERIC_TYPES:
+            v = value.value
+            if cls is Int and v is not None and not _INT64_MIN <= v <= _INT64_MAX:
+                self._write_tag(_BIG_INT)
+                self._write_str(str(v))
+                return
+            tag, dtype = _NUMERIC_TYPES[cls]
+            self._write_tag(tag)
+            self._write_scalar(v, tag)
+        elif cls in _STRING_TYPES:
+            self._write_tag(_STRING_TYPES[cls])
+            self._write_optional_str(value.value)
+        elif cls is Enum:
+            self._write_tag(_ENUM)
+            self._write_options(value.option_list)
+            self._write_optional_str(value.value)
+        elif cls is Struct:
+            self._write_tag(_STRUCT)
+            names = _struct_names(value)
+            self._write_u32(len(names))
+            for name in names:
+                self._write_str(name)
+                self.write_value(value.__dict__[name])
+        elif cls is Tuple:
+            self._write_tag(_TUPLE)
+            self._write_u32(len(value._list))
+            for item in value._list:
+                self.write_value(item)
+        elif cls is ColumnSequence:
+            self._write_tag(_SEQUENCE)
+            self.write_value(value.subtype)
+            self._write_column_sequence(value)
+        elif cls in (Ensemble, Sequence):
+            self._write_tag(_SEQUENCE if cls is Sequence else _ENSEMBLE)
+            self.write_value(value.subtype)
+            self._write_list(value._list)
+        else:
+            raise StoreError("Type {0} can't be stored".format(cls.__name__))
+
+    def _write_scalar(self, value, tag):
+        """Write numeric scalar with set flag"""
+        if value is None:
+            self._write_tag(0)
+            return
+        self._write_tag(1)
+        if tag == _INT:
+            self._file_d.write(_I64.pack(value))
+        elif tag == _BOOL:
+            self._write_tag(1 if value else 0)
+        else:
+            self._file_d.write(_F64.pack(value))
+
+    def _write_optional_str(self, value):
+        """Write string with set flag"""
+        if value is None:
+            self._write_tag(0)
+        else:
+            self._write_tag(1)
+            self._write_str(value)
+
+    def _write_options(self, options):
+        self._write_u32(len(options))
+        for option in options:
+            self._write_str(option)
+
+    def _write_list(self, items):
+        """Write list items, by columns if all items have same structure"""
+        self._write_u32(len(items))
+        if len(items) > 1:
+            shape, columns = _split_to_columns(items)
+            if shape is not None:
+                self._write_tag(_COLUMNS)
+                self._write_shape(shape)
+                for column in columns:
+                    self._write_column(column)
+                return
+        self._write_tag(_ITEMS)
+        for item in items:
+            self.write_value(item)
+
+    def _write_column_sequence(self, value):
+        """Write ColumnSequence items, numeric columns without creating items"""
+        leaves = []
+        shape = _item_shape(value.subtype, leaves)
+        if shape is None or len(value) < 2:
+            self._write_list(value._list)
+            return
+        self._write_u32(len(value))
+        self._write_tag(_COLUMNS)
+        self._write_shape(shape)
+        for path, leaf in value.schema:
+            column = value.column(path)
+            cls = type(leaf)
+            if cls in _NUMERIC_TYPES and column.dtype != object:
+                tag, dtype = _NUMERIC_TYPES[cls]
+                self._write_tag(_NUMERIC_COLUMN)
+                self._write_tag(tag)
+                self._file_d.write(column.astype(dtype).tobytes())
+            else:
+                self._write_column(value.column_items(path))
+
+    def _write_shape(self, shape):
+        if shape is None:
+            self._write_tag(_NONE)
+        elif shape[0] is Struct:
+            self._write_tag(_STRUCT)
+            self._write_u32(len(shape[1]))
+            for name, child in zip(shape[1], shape[2]):
+                self._write_str(name)
+                self._write_shape(child)
+        else:
+            self._write_tag(_TUPLE)
+            self._write_u32(len(shape[2]))
+            for child in shape[2]:
+                self._write_shape(child)
+
+    def _write_column(self, column):
+        """Write leaf values of all items, homogeneous columns in compact form"""
+        cls = type(column[0])
+        if (cls in _NUMERIC_TYPES or cls in _STRING_TYPES or cls is Enum) and \
+                all(type(value) is cls and value.value is not None for value in column):
+            if cls in _NUMERIC_TYPES:
+                tag, dtype = _NUMERIC_TYPES[cls]
+                try:
+                    array = np.fromiter((value.value for value in column), dtype, len(column))
+                except OverflowError:
+                    array = None
+                if array is not None:
+                    self._write_tag(_NUMERIC_COLUMN)
+                    self._write_tag(tag)
+                    self._file_d.write(array.tobytes())
+                    return
+            elif cls in _STRING_TYPES:
+                self._write_tag(_STRING_COLUMN)
+                self._write_tag(_STRING_TYPES[cls])
+                for value in column:
+                    self._write_str(value.value)
+                return
+            elif cls is Enum:
+                options = column[0].option_list
+                if all(value.option_list == options for value in column):
+                    self._write_tag(_ENUM_COLUMN)
+                    self._write_options(options)
+                    for value in column:
+                        self._write_str(value.value)
+                    return
+        self._write_tag(_VALUE_COLUMN)
+        for value in column:
+            self.write_value(value)
+
+
+class _Reader:
+    """Streaming decoder of DTT tree"""
+
+    def __init__(self, file_d):
+        self._file_d = file_d
+
+    def _read(self, size):
+        data = self._file_d.read(size)
+        if len(data) != size:
+            raise StoreError("Unexpected end of stored data")
+        return data
+
+    def read_header(self):
+        if self._file_d.read(len(MAGIC)) != MAGIC:
+            raise StoreError("Data are not in binary store format")
+
+    def read_tag(self):
+        return self._read(1)[0]
+
+    def _read_u32(self):
+        return _U32.unpack(self._read(4))[0]
+
+    def _read_str(self):
+        return self._read(self._read_u32()).decode("utf-8")
+
+    def _read_optional_str(self):
+        if self.read_tag():
+            return self._read_str()
+        return None
+
+    def _read_options(self):
+        return [self._read_str() for i in range(self._read_u32())]
+
+    def read_value(self, tag=None):
+        """
+        Read one DTT value. For lists only subtype is read if tag
+        is set, items are read by :func:`iter_list_items`.
+        """
+        items_follow = tag is not None
+        if tag is None:
+            tag = self.read_tag()
+        if tag in _NUMERIC_TAGS:
+            cls, dtype = _NUMERIC_TAGS[tag]
+            return cls(self._read_scalar(tag))
+        if tag == _BIG_INT:
+            return Int(int(self._read_str()))
+        if tag in _STRING_TAGS:
+            return _STRING_TAGS[tag](self._read_optional_str())
+        if tag == _ENUM:
+            options = self._read_options()
+            return Enum(options, self._read_optional_str())
+        if tag == _STRUCT:
+            fields = {}
+            for i in range(self._read_u32()):
+                name = self._read_str()
+                fields[name] = self.read_value()
+            return Struct(fields)
+        if tag == _TUPLE:
+            return Tuple(*[self.read_value() for i in range(self._read_u32())])
+        if tag in (_ENSEMBLE, _SEQUENCE):
+            subtype = self.read_value()
+            if items_follow:
+                return subtype
+            ret = Sequence(subtype) if tag == _SEQUENCE else Ensemble(subtype)
+            # items were checked before storing
+            ret._list.extend(self.iter_list_items())
+            return ret
+        raise StoreError("Unknown stored type tag {0}".format(tag))
+
+    def _read_scalar(self, tag):
+        if not self.read_tag():
+            return None
+        if tag == _INT:
+            return _I64.unpack(self._read(8))[0]
+        if tag == _BOOL:
+            return bool(self.read_tag())
+        return _F64.unpack(self._read(8))[0]
+
+    def iter_list_items(self):
+        """Yield items of the list, which subtype was just read"""
+        count = self._read_u32()
+        layout = self.read_tag()
+        if layout == _ITEMS:
+            for i in range(count):
+                yield self.read_value()
+        elif layout == _COLUMNS:
+            shape = self._read_shape()
+            n_columns = _count_leaves(shape)
+            columns = [iter(self._read_column(count)) for i in range(n_columns)]
+            for i in range(count):
+                yield _build_item(shape, iter(columns))
+        else:
+            raise StoreError("Unknown list layout {0}".format(layout))
+
+    def _read_shape(self):
+        tag = self.read_tag()
+        if tag == _NONE:
+            return None
+        if tag == _STRUCT:
+            names = []
+            children = []
+            for i in range(self._read_u32()):
+                names.append(self._read_str())
+                children.append(self._read_shape())
+            return Struct, names, children
+        if tag == _TUPLE:
+            return Tuple, None, [self._read_shape() for i in range(self._read_u32())]
+        raise StoreError("Unknown stored shape tag {0}".format(tag))
+
+    def _read_column(self, count):
+        kind = self.read_tag()
+        if kind == _NUMERIC_COLUMN:
+            tag = self.read_tag()
+            cls, dtype = _NUMERIC_TAGS[tag]
+            dtype = np.dtype(dtype)
+            array = np.frombuffer(self._read(count * dtype.itemsize), dtype, count)
+            if tag == _BOOL:
+                return [cls(bool(value)) for value in array.tolist()]
+            return [cls(value) for value in array.tolist()]
+        if kind == _STRING_COLUMN:
+            cls = _STRING_TAGS[self.read_tag()]
+            return [cls(self._read_str()) for i in range(count)]
+        if kind == _ENUM_COLUMN:
+            options = self._read_options()
+            return [Enum(options, self._read_str()) for i in range(count)]
+        if kind == _VALUE_COLUMN:
+            return [self.read_value() for i in range(count)]
+        raise StoreError("Unknown stored column kind {0}".format(kind))
+
+
+def _struct_names(value):
+    """Return Struct variable names"""
+    return [name for name in value.__dict__ if not (name[:2] == '__' and name[-2:] == '__')]
+
+
+def _item_shape(value, leaves):
+    """
+    Return hashable shape of Struct and Tuple nesting (None for leaf),
+    leaf values are appended to leaves
+    """
+    cls = type(value)
+    if cls is Struct:
+        names = tuple(_struct_names(value))
+        return Struct, names, tuple(_item_shape(value.__dict__[name], leaves) for name in names)
+    if cls is Tuple:
+        return Tuple, None, tuple(_item_shape(item, leaves) for item in value._list)
+    leaves.append(value)
+    return None
+
+
+def _split_to_columns(items):
+    """
+    Return shape and leaf columns if all items are Structs or Tuples
+    with same shape, else return None, None
+    """
+    leaves = []
+    shape = _item_shape(items[0], leaves)
+    if shape is None:
+        return None, None
+    columns = [[leaf] for leaf in leaves]
+    for item in items[1:]:
+        leaves = []
+        if _item_shape(item, leaves) != shape:
+            return None, None
+        for column, leaf in zip(columns, leaves):
+            column.append(leaf)
+    return shape, columns
+
+
+def _count_leaves(shape):
+    if shape is None:
+        return 1
+    return sum(_count_leaves(child) for child in shape[2])
+
+
+def _build_item(shape, columns):
+    """Build item of the shape from next values of columns iterator"""
+    if shape is None:
+        return next(next(columns))
+    if shape[0] is Struct:
+        item = Struct()
+        # stored values are DTT, assignation check is not needed
+        item.__dict__.update((name, _build_item(child, columns))
+                             for name, child in zip(shape[1], shape[2]))
+        return item
+    return Tuple(*[_build_item(child, columns) for child in shape[2]])
@@ -9,6 +9,10 @@ from .calibration_data_types import *
 
 import threading
 import time
+import inspect
+import hashlib
+import os
+import logging
 from enum import IntEnum
 import math
 from math import *
@@ -17,6 +21,8 @@ import numpy as np
 from scipy.optimize import minimize
 from scipy.optimize import differential_evolution
 
+logger = logging.getLogger("Analysis")
+
 
 class ForEach(WrapperActionType):
     
@@ -141,6 +147,7 @@ class ForEach(WrapperActionType):
                 self._wa_instances[-1]._inicialize()
                 self._wa_instances[-1]._reset_storing(
                     self._variables['WrappedAction'], self._index_iden +"_"+ str(i)) 
+                self._wa_instances[-1]._set_store_format(self._store_format)
         if self._procesed_instances == len(self._wa_instances):
             for instance in self._wa_instances:
                 if not instance._is_state(ActionStateType.finished):
@@ -213,6 +220,8 @@ class Calibration(WrapperActionType):
     """Display name of action"""
     description = "Calibration of model parameters"
     """Display description of action"""
+    CACHE_TOLERANCE = 1e-9
+    """default of CacheTolerance parameter"""
 
     def __init__(self, **kwargs):
         """
@@ -224,13 +233,20 @@ class Calibration(WrapperActionType):
         :param CalibrationTerminationCriteria TerminationCriteria: termination criteria
         :param str MinimizationMethod: type of solver
         :param CalibrationBoundsType BoundsType: type of bounds
+        :param float CacheTolerance: tolerance of model evaluations cache relative to range
+            of parameter bounds (range of log10 of bounds for log transformed parameters),
+            model is evaluated once for points closer than tolerance, it should be
+            much smaller than differentiation increments
         :param CalibrationOutputType Output: output from calibration
         :param Action Input: action that return input to calibration
         """
 
         self._scipy_started = False
         """true if scipy thread was started"""
-        self._tmp_action = None
+        self._tmp_actions = None
+        """wrapped actions evaluating model in points of current batch"""
+        self._tmp_finished = []
+        """finished flags of _tmp_actions"""
         self._tmp_action_index = 0
 
         self._scipy_thread = None
@@ -241,17 +257,18 @@ class Calibration(WrapperActionType):
         """event for signaling that model is finished"""
         self._scipy_state = self.ScipyState.created
         """scipy state"""
-        self._scipy_x = None
-        self._scipy_y = None
+        self._scipy_xs = []
+        """points of current batch, evaluated concurrently"""
+        self._scipy_ys = []
+        """objective values in points of current batch"""
         self._scipy_log_transform = []
         self._scipy_lb = []
         self._scipy_ub = []
         self._scipy_diff_inc_rel = []
         self._scipy_diff_inc_abs = []
         self._scipy_res = None
-        self._scipy_xy_log = []
-        self._scipy_xj_log = []
-        self._scipy_x_output_log = []
+        self._scipy_cache = CalibrationEvaluationCache()
+        """model outputs and jacobians in evaluated points"""
         self._scipy_iterations = []
         self._scipy_model_eval_num = 0
 
@@ -345,7 +362,7 @@ class Calibration(WrapperActionType):
                     m = getattr(self.get_input_val(0).observations, o.name).value
                     mv = getattr(output, o.name).value
                     if jac_matrix is not None:
-                        sen = np.linalg.norm(jac_matrix[sen_ind, :]) * weights[sen_ind, 0] / self._scipy_x.shape[0]
+                        sen = np.linalg.norm(jac_matrix[sen_ind, :]) * weights[sen_ind, 0] / jac_matrix.shape[1]
                     else:
                         sen = np.nan
                     sen_ind += 1
@@ -426,6 +443,11 @@ class Calibration(WrapperActionType):
             v = "BoundsType={0}".format(str(self._variables['BoundsType']))
             var.append([v])
 
+        # CacheTolerance
+        if 'CacheTolerance' in self._variables:
+            v = "CacheTolerance={0}".format(repr(self._variables['CacheTolerance']))
+            var.append([v])
+
         return var
 
     def _set_storing(self, identical_list):
@@ -453,6 +475,14 @@ class Calibration(WrapperActionType):
                     self._set_state(ActionStateType.processed)
                     # send as short action for storing and settings state
                     return ActionRunningState.repeat,  self
+            self._scipy_cache.tolerances = self._cache_tolerances()
+            # reuse model evaluations from previous run of the same calibration
+            if path is not None:
+                cache_file = "{0}_cache_{1}".format(self.name, self._get_model_hash())
+                n = self._scipy_cache.load(os.path.join(path, "restore", cache_file))
+                if n > 0:
+                    logger.info("{0} model evaluations restored for {1}".format(n, self._get_instance_name()))
+                self._scipy_cache.set_store_file(os.path.join(path, "store", cache_file))
             # run scipy thread
             self._scipy_thread = threading.Thread(target=self._scipy_run)
             self._scipy_thread.daemon = True
@@ -463,21 +493,33 @@ class Calibration(WrapperActionType):
                 if self._scipy_event.is_set():
                     return ActionRunningState.wait, None
                 else:
-                    if self._tmp_action is None:
-                        self._tmp_action = self._create_tmp_action(self._scipy_x_to_wrapped_input(self._scipy_x))
-                    state, action = self._tmp_action._plan_action(path)
-                    if state is ActionRunningState.finished:
-                        output = action._get_output()
-                        self._scipy_y = self._wrapped_output_to_scipy_y(output, self._scipy_x)
-                        self._tmp_action = None
+                    if self._tmp_actions is None:
+                        # all points of the batch are evaluated concurrently
+                        self._tmp_actions = [self._create_tmp_action(self._scipy_x_to_wrapped_input(x))
+                                             for x in self._scipy_xs]
+                        self._tmp_finished = [False] * len(self._tmp_actions)
+                        self._scipy_ys = [None] * len(self._tmp_actions)
+                    for i in range(len(self._tmp_actions)):
+                        if self._tmp_finished[i]:
+                            continue
+                        state, action = self._tmp_actions[i]._plan_action(path)
+                        if state is ActionRunningState.finished:
+                            output = action._get_output()
+                            self._scipy_cache.add_output(self._scipy_xs[i], output)
+                            self._scipy_ys[i] = self._wrapped_output_to_scipy_y(output, self._scipy_xs[i])
+                            self._tmp_finished[i] = True
+                            continue
+                        if state is ActionRunningState.repeat:
+                            return state, action
+                        if state is ActionRunningState.error:
+                            return state, action
+                        if state is ActionRunningState.wait and action is not None:
+                            return ActionRunningState.repeat, action
+                        # run return wait, try next
+                    if all(self._tmp_finished):
+                        self._tmp_actions = None
                         self._scipy_event.set()
-                        return ActionRunningState.wait, None
-                    if state is ActionRunningState.repeat:
-                        return state, action
-                    if state is ActionRunningState.error:
-                        return state, action
-                    if state is ActionRunningState.wait and action is not None:
-                        return ActionRunningState.repeat, action
+                    return ActionRunningState.wait, None
             if self._get_scipy_state() == self.ScipyState.finished:
                 self._set_state(ActionStateType.processed)
                 self.__make_output()
@@ -506,6 +548,7 @@ class Calibration(WrapperActionType):
         new_dupl_workflow._inicialize()
         new_dupl_workflow._reset_storing(
             self._variables['WrappedAction'], self._index_iden + "_" + str(self._tmp_action_index))
+        new_dupl_workflow._set_store_format(self._store_format)
         return new_dupl_workflow
 
     def _check_params(self):
@@ -587,6 +630,14 @@ class Calibration(WrapperActionType):
             else:
                 self._add_error(err, "Parameter 'BoundsType' must be CalibrationBoundsType")
 
+        # CacheTolerance
+        if 'CacheTolerance' in self._variables:
+            if isinstance(self._variables['CacheTolerance'], (int, float)):
+                if not 0 <= self._variables['CacheTolerance'] < 1:
+                    self._add_error(err, "Parameter 'CacheTolerance' must be in interval [0, 1)")
+            else:
+                self._add_error(err, "Parameter 'CacheTolerance' must be float")
+
         # WrappedAction
         if 'WrappedAction' in self._variables:
             if not isinstance(self._variables['WrappedAction'], Workflow):
@@ -698,6 +749,18 @@ class Calibration(WrapperActionType):
         with self._scipy_lock:
             self._scipy_state = state
 
+    def _cache_tolerances(self):
+        """return tolerances of model evaluations cache for calibrated parameters"""
+        rel_tol = self._variables.get('CacheTolerance', self.CACHE_TOLERANCE)
+        tolerances = []
+        for par in self._variables['Parameters']:
+            if not par.fixed and par.tied_expression is None:
+                if par.log_transform:
+                    tolerances.append(rel_tol * (math.log10(par.bounds[1]) - math.log10(par.bounds[0])))
+                else:
+                    tolerances.append(rel_tol * (par.bounds[1] - par.bounds[0]))
+        return tolerances
+
     def _scipy_run(self): # todo:
         """run scipy minimalization"""
         init_values = []
@@ -738,6 +801,10 @@ class Calibration(WrapperActionType):
         #                                     'ftol': 1e-6, 'disp': True}, **args)
 
         if self._variables['MinimizationMethod'] == "DIFF":
+            if 'workers' in inspect.signature(differential_evolution).parameters:
+                # evaluate whole population concurrently
+                args["workers"] = self._scipy_map
+                args["updating"] = "deferred"
             self._scipy_res = differential_evolution(self._scipy_fun, strategy= "best1bin",
                                                      maxiter=self._variables['TerminationCriteria'].n_max_steps,
                                                      popsize=5, tol=1e-4, callback=self._scipy_callback,
@@ -767,10 +834,31 @@ class Calibration(WrapperActionType):
 
         return y
 
+    def _scipy_map(self, fun, xs):
+        """
+        map function for differential_evolution workers,
+        objective function is evaluated in all points concurrently
+        """
+        return self._scipy_models_eval([np.asarray(x) for x in xs])
+
     def _scipy_jac(self, x):
         """jacobian function called by scipy"""
         #print("_scipy_jac enter")
-        fx = self._scipy_model_eval(x)
+        # perturbed points
+        xhs = []
+        for i in range(x.shape[0]):
+            xh = x.copy()
+            if self._scipy_log_transform[i]:
+                h = self._scipy_diff_inc_rel[i] * math.fabs(math.pow(10.0, x[i])) + self._scipy_diff_inc_abs[i]
+                xh[i] = math.log10(math.pow(10.0, xh[i]) + h)
+            else:
+                h = self._scipy_diff_inc_rel[i] * math.fabs(x[i]) + self._scipy_diff_inc_abs[i]
+                xh[i] += h
+            xhs.append(xh)
+
+        # model is evaluated in all points concurrently
+        ys = self._scipy_models_eval([x] + xhs)
+        fx = ys[0]
 
         # observations in x
         obs_num = len(self._variables['Observations'])
@@ -784,16 +872,8 @@ class Calibration(WrapperActionType):
         jac = np.zeros_like(x)
         jac_matrix = np.zeros((obs_num, x.shape[0]))
         for i in range(x.shape[0]):
-            if self._scipy_log_transform[i]:
-                h = self._scipy_diff_inc_rel[i] * math.fabs(math.pow(10.0, x[i])) + self._scipy_diff_inc_abs[i]
-                xh = x.copy()
-                xh[i] = math.log10(math.pow(10.0, xh[i]) + h)
-                jac[i] = (self._scipy_model_eval(xh) - fx) / (xh[i] - x[i])
-            else:
-                h = self._scipy_diff_inc_rel[i] * math.fabs(x[i]) + self._scipy_diff_inc_abs[i]
-                xh = x.copy()
-                xh[i] += h
-                jac[i] = (self._scipy_model_eval(xh) - fx) / h
+            xh = xhs[i]
+            jac[i] = (ys[i + 1] - fx) / (xh[i] - x[i])
 
             # observations in xh
             obs_xh = np.zeros((obs_num, 1))
@@ -804,7 +884,7 @@ class Calibration(WrapperActionType):
                 ind += 1
 
             jac_matrix[:, i] = ((obs_xh - obs_x) / (xh[i] - x[i])).reshape(obs_num)
-        self._scipy_xj_log.append((x.copy(), jac_matrix))
+        self._scipy_cache.add_jac(x, jac_matrix)
         return jac
 
     def _scipy_callback(self, xk, convergence=None):
@@ -814,17 +894,35 @@ class Calibration(WrapperActionType):
         #print("conv: {}".format(convergence))
 
     def _scipy_model_eval(self, x):
-        """model evaluation used in _scipy_fun and _scipy_jac"""
-        for xy in self._scipy_xy_log:
-            if np.all(xy[0] == x):
-                return xy[1]
+        """model evaluation used in _scipy_fun and _scipy_callback"""
+        return self._scipy_models_eval([x])[0]
 
-        self._scipy_model_eval_num += 1
-        self._scipy_x = x
+    def _scipy_models_eval(self, xs):
+        """
+        Model evaluation in list of points used in _scipy_jac and _scipy_map.
+        Models in all not yet evaluated points are processed concurrently,
+        function wait until all models are finished.
+        """
+        ys = [None] * len(xs)
+        new_xs = {}
+        """quantized x -> (x, indexes in xs)"""
+        for i, x in enumerate(xs):
+            output = self._scipy_cache.get_output(x)
+            if output is not None:
+                ys[i] = self._wrapped_output_to_scipy_y(output, x)
+            else:
+                new_xs.setdefault(self._scipy_cache.key(x), (x.copy(), []))[1].append(i)
+        if len(new_xs) == 0:
+            return ys
+
+        self._scipy_model_eval_num += len(new_xs)
+        self._scipy_xs = [x for x, ind in new_xs.values()]
         self._scipy_event.clear()
         self._scipy_event.wait()
-        self._scipy_xy_log.append((x.copy(), self._scipy_y))
-        return self._scipy_y
+        for (x, ind), y in zip(new_xs.values(), self._scipy_ys):
+            for i in ind:
+                ys[i] = y
+        return ys
 
     def _scipy_x_to_wrapped_input(self, x):
         """convert x from scipy format to workflow format"""
@@ -872,9 +970,6 @@ class Calibration(WrapperActionType):
 
     def _wrapped_output_to_scipy_y(self, output, x):
         """convert output from workflow to scipy objective value"""
-        # log
-        self._scipy_x_output_log.append((x.copy(), output))
-
         ret = 0.0
         for obs in self._variables['Observations']:
             mo = getattr(output, obs.name).value
@@ -901,18 +996,19 @@ class Calibration(WrapperActionType):
 
     def _find_output_from_x(self, x):
         """find output from x"""
-        output = None
-        for o in self._scipy_x_output_log:
-            if np.all(o[0] == x):
-                output = o[1]
-                break
-        return output
+        return self._scipy_cache.get_output(x)
 
     def _find_jac_matrix_from_x(self, x):
         """find jacobian matrix from x"""
-        jac = None
-        for j in self._scipy_xj_log:
-            if np.all(j[0] == x):
-                jac = j[1]
-                break
-        return jac
+        return self._scipy_cache.get_jac(x)
+
+    def _get_model_hash(self):
+        """
+        return hash of wrapped model and its parametrization,
+        model evaluations with same hash are reusable
+        """
+        hash = hashlib.sha512()
+        hash.update(bytes(self._get_hash(), "utf-8"))
+        for par in self._variables['Parameters']:
+            hash.update(bytes('\n'.join(par._get_variables_script()), "utf-8"))
+        return hash.hexdigest()
@@ -1,12 +1,17 @@
 import socket
-import asynchat
-import asyncore
+import asyncio
+import collections
 import threading
 import json
+import struct
+import zlib
 import traceback
-import sys
 import logging
-import time
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
 """
 TODO:
@@ -25,17 +30,157 @@ zadani pozadavku : recipient, data
 odeslani pozadavku: id, recipient, sender, data; (data also stored)
 odpoved: id,  sender, answer data
 vraceni odpovedi: id, recipient, answer, request
+
+Vlakna:
+Vsechny sockety obsluhuje asyncio smycka ve vlakne repeateru. Ostatni vlakna
+predavaji praci smycce pres loop.call_soon_threadsafe, prijate pozadavky
+a odpovedi smycka uklada do collections.deque, ze kterych je vybira vlakno sluzby.
+
+Ramce:
+Zprava je poslana jako ramec: hlavicka _FRAME_HEADER (priznaky, delka smerovani,
+delka dat), smerovani (id, sender, recipient) v JSON a data. Repeater, ktery neni prijemcem,
+dekoduje jen smerovani a data preposila beze zmeny. Na zacatku spojeni si strany poslou
+ramec _FLAG_HELLO se seznamem podporovanych kodovani, data jsou kodovana msgpack jen
+pokud ho maji obe strany, jinak JSON. Zpravy zapsane behem jednoho
+pruchodu smyckou jsou odeslany jednim zapisem do socketu.
 """
 
 
-_terminator = '\n'.encode()
+CONNECT_TIMEOUT = 5
+"""Timeout of connecting to the child repeater [s]"""
+
+STARTER_CLIENT_PERIOD = 10
+"""Period of back connection attempts to the parent StarterServer [s]"""
+
+COMPRESS_THRESHOLD = 4096
+"""Message data longer than this are compressed [B]"""
+
+COMPRESS_LEVEL = 1
+"""zlib compression level of message data"""
+
+MAX_FRAME_SIZE = 1 << 30
+"""Maximal size of message frame, connection sending bigger frame is closed [B]"""
+
+_FRAME_HEADER = struct.Struct("!BII")
+"""frame header: flags, length of routing, length of data"""
+
+_FLAG_MSGPACK = 0x01
+"""data are encoded by msgpack, by JSON otherwise; routing is always JSON"""
+
+_FLAG_COMPRESSED = 0x02
+"""data are compressed by zlib"""
+
+_FLAG_HELLO = 0x04
+"""frame is not a message, its routing part lists codecs supported by the sender"""
+
+_CODECS = ["msgpack"] if msgpack is not None else []
+"""codecs of data supported by this repeater in addition to JSON"""
+
 
-def _pack_message(id, sender, recipient, data):
-    str_json=json.dumps((id, sender, recipient, data))
-    return str_json.encode() + _terminator
+def _encode(obj, flags):
+    if flags & _FLAG_MSGPACK:
+        return msgpack.packb(obj, use_bin_type=True)
+    return json.dumps(obj, separators=(',', ':')).encode()
 
-def _unpack_message(msg):
-    return json.loads(msg.decode())
+def _decode(data, flags):
+    if flags & _FLAG_MSGPACK:
+        if msgpack is None:
+            raise ValueError("Message encoded by msgpack, but msgpack is not installed.")
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+    return json.loads(data.decode())
+
+def _hello_frame():
+    """
+    Return frame announcing supported codecs, it is the first frame sent to the peer.
+    """
+    routing = json.dumps({"codecs": _CODECS}).encode()
+    return _FRAME_HEADER.pack(_FLAG_HELLO, len(routing), 0) + routing
+
+def _pack_frame(flags, id, sender, recipient, payload):
+    """
+    Return frame with given routing and already encoded data.
+    """
+    routing = _encode((id, sender, recipient), 0)
+    return b"".join((_FRAME_HEADER.pack(flags, len(routing), len(payload)), routing, payload))
+
+def _pack_message(id, sender, recipient, data, flags=0):
+    """
+    Return frame of the message, data longer than COMPRESS_THRESHOLD are compressed.
+    :param flags: _FLAG_MSGPACK if data should be encoded by msgpack,
+    use flags agreed with the peer (_FrameProtocol.flags)
+    """
+    payload = _encode(data, flags)
+    if len(payload) > COMPRESS_THRESHOLD:
+        compressed = zlib.compress(payload, COMPRESS_LEVEL)
+        if len(compressed) < len(payload):
+            payload = compressed
+            flags |= _FLAG_COMPRESSED
+    return _pack_frame(flags, id, sender, recipient, payload)
+
+def _unpack_message(frame):
+    """
+    Decode routing of the frame, data stay encoded.
+    :return: _Message
+    """
+    flags, routing_len, payload_len = _FRAME_HEADER.unpack_from(frame)
+    start = _FRAME_HEADER.size
+    id, sender, recipient = _decode(frame[start:start + routing_len], 0)
+    return _Message(id, sender, recipient, frame=frame, flags=flags,
+                    payload=frame[start + routing_len:])
+
+
+class _Message:
+    """
+    Message received by repeater. Data of message are decoded
+    on the first access, messages which are only forwarded are not decoded.
+    """
+    __slots__ = ["id", "sender", "recipient", "frame", "_flags", "_payload", "_data", "_decoded"]
+
+    def __init__(self, id, sender, recipient, data=None, frame=None, flags=0, payload=None):
+        self.id = id
+        self.sender = sender
+        self.recipient = recipient
+        self.frame = frame
+        """whole received frame"""
+        self._flags = flags
+        self._payload = payload
+        """encoded data"""
+        self._data = data
+        self._decoded = payload is None
+
+    @property
+    def decodable(self):
+        """False if data are encoded by codec which is not installed"""
+        return self._decoded or msgpack is not None or not self._flags & _FLAG_MSGPACK
+
+    @property
+    def data(self):
+        if not self._decoded:
+            payload = self._payload
+            if self._flags & _FLAG_COMPRESSED:
+                payload = zlib.decompress(payload)
+            self._data = _decode(payload, self._flags)
+            self._decoded = True
+        return self._data
+
+    def forward(self, recipient):
+        """
+        Return frame of the message with new recipient, data are not re-encoded.
+        """
+        return _pack_frame(self._flags, self.id, self.sender, recipient, self._payload)
+
+    def repack(self, flags):
+        """
+        Return frame of the message with data encoded according to flags.
+        """
+        return _pack_message(self.id, self.sender, self.recipient, self.data, flags)
+
+    def __repr__(self):
+        if not self._decoded:
+            data = "<{} B>".format(len(self._payload))
+        else:
+            data = repr(self._data)
+        return "({}, {}, {}, {})".format(self.id, self.sender, self.recipient, data)
 
 def _exception_answer(e):
     """
@@ -43,7 +188,26 @@ def _exception_answer(e):
     :param e: The excpetion.
     :return:
     """
-    return { 'error': 'Exception', 'exception': repr(e), 'traceback': traceback.format_tb() }
+    return { 'error': 'Exception', 'exception': repr(e), 'traceback': traceback.format_tb(e.__traceback__) }
+
+def _protocol_flags(protocol):
+    """
+    Return flags for packing messages sent by protocol, it can be None.
+    """
+    if protocol is None:
+        return 0
+    return protocol.flags
+
+def _listen_socket(port):
+    """
+    Create listening socket, it is created before the repeater loop
+    is started, so the port is known immediately.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("", port))
+    sock.listen(5)
+    sock.setblocking(False)
+    return sock
 
 class RequestData:
     """
@@ -80,8 +244,90 @@ class AnswerData:
         self.on_answer = on_answer
 
 
+class _FrameProtocol(asyncio.Protocol):
+    """
+    Connection with messages sent as frames (see _FRAME_HEADER).
+    Connection events and messages are passed to the owner dispatcher.
+    Frames written during one iteration of the loop are sent together.
+    Codec of message data is agreed with the peer by the first frame
+    (see _FLAG_HELLO), until then and if the peer doesn't support
+    msgpack the data are sent as JSON.
+    """
+    def __init__(self, owner):
+        self.owner = owner
+        self.transport = None
+        self._received_data = bytearray()
+        # Storage for partially received frame.
+        self._out = []
+        """frames waiting for sending"""
+        self.flags = 0
+        """flags of messages sent to the peer, _FLAG_MSGPACK if both sides support msgpack"""
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.write(_hello_frame())
+        self.owner._connection_made(self)
+
+    def data_received(self, data):
+        self._received_data.extend(data)
+        buffer = self._received_data
+        pos = 0
+        while len(buffer) - pos >= _FRAME_HEADER.size:
+            flags, routing_len, payload_len = _FRAME_HEADER.unpack_from(buffer, pos)
+            size = _FRAME_HEADER.size + routing_len + payload_len
+            if size > MAX_FRAME_SIZE:
+                logging.error("Frame too big ({} B), closing connection.".format(size))
+                self.transport.close()
+                return
+            if len(buffer) - pos < size:
+                break
+            frame = bytes(buffer[pos:pos + size])
+            pos += size
+            try:
+                if flags & _FLAG_HELLO:
+                    self._hello_received(frame)
+                    continue
+                msg = _unpack_message(frame)
+            except (ValueError, TypeError) as e:
+                logging.error("Invalid frame discarded: {}".format(e))
+                continue
+            self.owner._message_received(self, msg)
+        del buffer[:pos]
+
+    def _hello_received(self, frame):
+        routing_len = _FRAME_HEADER.unpack_from(frame)[1]
+        hello = json.loads(frame[_FRAME_HEADER.size:_FRAME_HEADER.size + routing_len].decode())
+        if "msgpack" in _CODECS and "msgpack" in hello["codecs"]:
+            self.flags = _FLAG_MSGPACK
+        else:
+            self.flags = 0
+
+    def connection_lost(self, exc):
+        self.owner._connection_lost(self, exc)
+
+    def write(self, data):
+        if data[0] & _FLAG_MSGPACK and not self.flags & _FLAG_MSGPACK:
+            # forwarded or packed before the codec was agreed
+            try:
+                data = _unpack_message(data).repack(self.flags)
+            except ValueError as e:
+                logging.error("Message can't be encoded for peer, discarded: {}".format(e))
+                return
+        if len(self._out) == 0:
+            self.owner._loop.call_soon(self._flush)
+        self._out.append(data)
+
+    def _flush(self):
+        data = b"".join(self._out)
+        self._out = []
+        if not self.transport.is_closing():
+            self.transport.write(data)
+
+    def close(self):
+        self.transport.close()
+
 
-class _ClientDispatcher(asynchat.async_chat):
+class _ClientDispatcher:
     """
     Client part of the communication. Send requests, process answers.
 
@@ -94,13 +340,21 @@ class _ClientDispatcher(asynchat.async_chat):
         3. Connecting.
 
         4. Connected.
+
+    Methods with suffix _safe may be called from any thread, other methods
+    except of get_answers() and send_request() run in the repeater loop.
     """
-    def __init__(self, repeater_address, server_dispatcher, connection, get_answer_on_connect=None, map=None):
+    def __init__(self, repeater_address, server_dispatcher, connection, get_answer_on_connect=None, loop=None,
+                 message_event=None):
         """
         :param repeater_address: Address of this repeater.
         :param server_dispatcher: Server side of the repeater (can be None). Used to resend answers.
         :param connection: A conncetion object for port forwarding of final connection to the child repeater.
+        :param loop: asyncio loop of the repeater.
+        :param message_event: threading.Event set when answer for local service is received (can be None).
         """
+        self.message_event = message_event
+        """Event set when answer for local service is received"""
         self.repeater_address = repeater_address
         # Own address given by parent repeater.
         self.address = None
@@ -109,7 +363,7 @@ class _ClientDispatcher(asynchat.async_chat):
         # Romete address at which child is listening.
         # (ip, port) on remote machine we connect to over tunnel
         self.server = server_dispatcher
-        self.answers = []
+        self.answers = collections.deque()
         # Received answers for local service.
         self.sent_requests={}
         # Sent requests from local service
@@ -117,8 +371,6 @@ class _ClientDispatcher(asynchat.async_chat):
         """Lock for self.sent_requests"""
         self.request_id=0
         # ID of the next request.
-        self.received_data = bytearray()
-        # Storage for partially received answer.
         self.connection = connection
         """connection for creating tunnels"""
         self.forwarded_local_port = None
@@ -130,10 +382,6 @@ class _ClientDispatcher(asynchat.async_chat):
         self.forwarded_remote_port_id = None
         """forwarded remote port connection id"""
 
-        self.connect_to_address_queue = []
-        """Queue for connect request"""
-        self.push_queue = []
-        """Queue for push request"""
         self.request_close = False
         """True if service thread wants to close dispatcher."""
         self.request_close_done = False
@@ -142,7 +390,16 @@ class _ClientDispatcher(asynchat.async_chat):
         self.set_remote_address_lock = threading.Lock()
         """Lock for set_remote_address()"""
 
-        asynchat.async_chat.__init__(self, map=map)
+        self._loop = loop
+        """asyncio loop of the repeater"""
+        self._protocol = None
+        """connected protocol"""
+        self._connect_task = None
+        """task of running connect"""
+
+    @property
+    def connected(self):
+        return self._protocol is not None
 
     def connect_to_address_safe(self, address):
         """
@@ -150,7 +407,7 @@ class _ClientDispatcher(asynchat.async_chat):
         :param address:
         :return:
         """
-        self.connect_to_address_queue.append(address)
+        self._loop.call_soon_threadsafe(self.connect_to_address, address)
 
     def connect_to_address(self, address):
         """
@@ -158,29 +415,28 @@ class _ClientDispatcher(asynchat.async_chat):
         :param address: address where child service listening
         :return:
         """
+        if self.request_close:
+            return
         self.close()
-        #self.discard_buffers()
-        self.received_data.clear()
-
-        # clear push_queue
-        for i in range(len(self.push_queue)):
-            self.push_queue.pop(0)
 
         # create request 0
         with self.sent_requests_lock:
             self.sent_requests[0] = (None, {"action": "on_answer_connect", "data": None})
 
         self.address = address
-        self.create_socket()
-        self.socket.settimeout(5)
         logging.info("Connecting: %s" % (str(self.address)))
-        try:
-            self.connect(self.address)
-        except OSError:
-            pass
+        self._connect_task = self._loop.create_task(self._connect(address))
 
-    # def is_connected(self):
-    #     return self.connected
+    async def _connect(self, address):
+        try:
+            await asyncio.wait_for(
+                self._loop.create_connection(lambda: _FrameProtocol(self), address[0], address[1]),
+                CONNECT_TIMEOUT)
+        except (OSError, asyncio.TimeoutError):
+            self._handle_error()
+        finally:
+            if self._connect_task is asyncio.current_task():
+                self._connect_task = None
 
     def get_answers(self):
         """
@@ -189,16 +445,14 @@ class _ClientDispatcher(asynchat.async_chat):
         :return:
         """
         copy=[]
-        size=len(self.answers)
-        for i in range(size):
-            answer = self.answers.pop(0)
-            logging.info("Copy answer: " + str(answer))
-            (id, sender, reciever, answer_dict) = answer
+        for i in range(len(self.answers)):
+            answer = self.answers.popleft()
+            logging.debug("Copy answer: %s", answer)
             with self.sent_requests_lock:
-                if id not in self.sent_requests:
+                if answer.id not in self.sent_requests:
                     continue
-                (request, on_answer) = self.sent_requests.pop(id)
-            copy.append( AnswerData(id, sender, request, answer_dict, on_answer) )
+                (request, on_answer) = self.sent_requests.pop(answer.id)
+            copy.append( AnswerData(answer.id, answer.sender, request, answer.data, on_answer) )
         return copy
 
 
@@ -214,10 +468,11 @@ class _ClientDispatcher(asynchat.async_chat):
         with self.sent_requests_lock:
             self.sent_requests[id] = (data, on_answer)
         if self.connected:
-            logging.info('Push: %s'%( _pack_message(id, self.repeater_address, target, data)) )
-            self.push_safe( _pack_message(id, self.repeater_address, target, data) )
+            msg = _pack_message(id, self.repeater_address, target, data, _protocol_flags(self._protocol))
+            logging.debug("Push: %d, %s, %d B", id, target, len(msg))
+            self.push_safe(msg)
         else:
-            self.answers.append((id, None, None, {"error": None}))
+            self.answers.append(_Message(id, None, None, {"error": None}))
 
     def set_remote_address(self, address):
         # Set remote address of the child repeater.
@@ -268,29 +523,14 @@ class _ClientDispatcher(asynchat.async_chat):
         if (self.forwarded_remote_port_id is not None) and (self.forwarded_remote_port_id == self.connection._id):
             self.connection.close_forwarded_remote_port(self.forwarded_remote_port)
 
-    def process_queues(self):
+    def push(self, data):
         """
-        Process requests from other threads.
+        Send message to the child repeater, message is discarded if not connected.
+        :param data:
         :return:
         """
-        if self.request_close:
-            if not self.request_close_done:
-                self.close()
-                self.request_close_done = True
-        else:
-            # connect to address
-            l = len(self.connect_to_address_queue)
-            if l > 0:
-                address = None
-                for i in range(l):
-                    address = self.connect_to_address_queue.pop(0)
-                self.connect_to_address(address)
-
-            # push
-            l = len(self.push_queue)
-            if l > 0:
-                for i in range(l):
-                    self.push(self.push_queue.pop(0))
+        if self._protocol is not None:
+            self._protocol.write(data)
 
     def push_safe(self, data):
         """
@@ -298,106 +538,138 @@ class _ClientDispatcher(asynchat.async_chat):
         :param data:
         :return:
         """
-        self.push_queue.append(data)
+        self._loop.call_soon_threadsafe(self.push, data)
+
+    def close(self):
+        """
+        Close connection to the child repeater.
+        :return:
+        """
+        if self._connect_task is not None:
+            self._connect_task.cancel()
+            self._connect_task = None
+        if self._protocol is not None:
+            self._protocol.close()
+            self._protocol = None
+
+    def close_safe(self):
+        """
+        Thread safe close, request_close_done is set when dispatcher is closed.
+        :return:
+        """
+        self.request_close = True
+        self._loop.call_soon_threadsafe(self._close_requested)
+
+    def _close_requested(self):
+        self.close()
+        self.request_close_done = True
+
+    def _set_message_event(self):
+        if self.message_event is not None:
+            self.message_event.set()
+
+    def _handle_error(self):
+        self.close()
+
+        with self.sent_requests_lock:
+            for k in self.sent_requests.keys():
+                self.answers.append(_Message(k, None, None, {"error": "connection"}))
+        self._set_message_event()
 
 
     """
-    Remaining are implementations of asyncore methods.
+    Remaining are callbacks of _FrameProtocol.
     """
 
-    def handle_connect(self):
+    def _connection_made(self, protocol):
+        if self.request_close:
+            protocol.close()
+            return
         logging.info("Connected")
-        self.set_terminator(_terminator)
+        self._protocol = protocol
 
         # create answer 0
-        self.answers.append((0, None, None, {"data": None}))
+        self.answers.append(_Message(0, None, None, {"data": None}))
+        self._set_message_event()
 
-    def handle_close(self):
+    def _connection_lost(self, protocol, exc):
+        if protocol is not self._protocol:
+            # closed connection was replaced
+            return
         logging.info("handle_close")
-        self.close()
-
-    def handle_error(self):
-        self.close()
-
-        with self.sent_requests_lock:
-            for k in self.sent_requests.keys():
-                self.answers.append((k, None, None, {"error": "connection"}))
-
-        # try:
-        #     raise
-        # except ConnectionRefusedError:
-        #     print("ConnectionRefusedError")
-        # except:
-        #     logging.error("Uncatch exception in repeater.run thread:\n" + "".join(traceback.format_exception(*sys.exc_info())))
-
-    def collect_incoming_data(self, data):
-        """Read an incoming message from the client and put it into our outgoing queue."""
-        logging.info("Collect")
-        self.received_data.extend(data)
-
-    def found_terminator(self):
-
-        msg = _unpack_message(self.received_data)
-        logging.info("Client, message: "+ str(msg))
-        self.received_data = bytearray()
-        if msg:
-            recipient = msg[2]
-            logging.info("recp: %s addr: %s"%(str(recipient), str(self.repeater_address)))
-            if recipient != self.repeater_address:
-                assert self.server, "Wrong recipient: %s"%(str(recipient))
-                # forward answer
-                self.server.push(msg)
-            else:
-                # process answers t own reqests
-                self.answers.append( msg )
+        if exc is None:
+            self.close()
+        else:
+            self._handle_error()
+
+    def _message_received(self, protocol, msg):
+        logging.debug("Client, message: %s, addr: %s", msg, self.repeater_address)
+        if msg.recipient != self.repeater_address:
+            assert self.server, "Wrong recipient: %s"%(str(msg.recipient))
+            # forward answer, frame is passed unchanged
+            self.server.push(msg.frame)
+        else:
+            # process answers t own reqests
+            if not msg.decodable:
+                msg = _Message(msg.id, msg.sender, None, {"error": "Unsupported encoding"})
+            self.answers.append( msg )
+            self._set_message_event()
 
 
 
 
-class Server(asyncore.dispatcher):
-    def __init__(self,  repeater, port, clients, map=None):
+class Server:
+    """
+    Server which accepts permanent connection from the parent repeater.
+    """
+    def __init__(self,  repeater, port, clients, loop=None):
         """
         host - get automatically
         :param port - port ( same as in socket module)
         """
         self.repeater = repeater
-        asyncore.dispatcher.__init__(self, map=map)
-        self.server_dispatcher = ServerDispatcher(repeater.repeater_address, port, clients)
-
-        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.bind( ("", port) )
-        self.address=self.socket.getsockname()
-        self.answers=[]
-        self.listen(5)
-
+        self.server_dispatcher = ServerDispatcher(repeater.repeater_address, port, clients, loop=loop,
+                                                  message_event=repeater.message_event)
+        self._loop = loop
+        self._socket = _listen_socket(port)
+        self.address=self._socket.getsockname()
+        self._server = None
+        """asyncio server"""
 
     def get_dispatcher(self):
         return self.server_dispatcher
 
-    def handle_accept(self):
+    async def start(self):
+        """
+        Start accepting connections in the repeater loop.
+        """
+        self._server = await self._loop.create_server(self._accept, sock=self._socket)
+
+    def _accept(self):
         # Called when a client connects to our socket
 
         # stop starter client
         self.repeater._starter_client_attempting = False
-
-        # close previous connection
-        self.server_dispatcher.close()
-        #self.server_dispatcher.discard_buffers()
-        self.server_dispatcher.received_data.clear()
-
-        client_info = self.accept()
         logging.info("Incomming connection accepted.")
-        #print("Incomming connection accepted.")
-        self.server_dispatcher.accept2(client_info[0], self._map)
+        return _FrameProtocol(self.server_dispatcher)
 
-    def handle_close(self):
-        self.close()
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+        else:
+            self._socket.close()
 
-class ServerDispatcher(asynchat.async_chat):
-    def __init__(self,  repeater_address, port, clients):
+class ServerDispatcher:
+    """
+    Server part of the communication with the parent repeater.
+    Receive requests, forward them or pass them to the local service, send answers.
+    """
+    def __init__(self,  repeater_address, port, clients, loop=None, message_event=None):
         """
         host - get automatically
         :param port - port ( same as in socket module)
+        :param loop: asyncio loop of the repeater.
+        :param message_event: threading.Event set when request for local service is received (can be None).
         """
         self.repeater_address = repeater_address
         logging.info("Raddr: %s"%(str(repeater_address)))
@@ -406,30 +678,24 @@ class ServerDispatcher(asynchat.async_chat):
         # Port we will connect after accept.
         self.clients = clients
         # Dict of client dispatchers.
-        self.requests = []
+        self.requests = collections.deque()
         # Recieved requests to be processed.
         self.request_senders={}
         # Dict  id-> sender. Used to send answers to correct origin.
-        self.received_data = bytearray()
-        # Uncomplete request.
         self.answer_id = 0
         # Server numbering of answers.
 
-        self.push_queue = []
-        """Queue for push request"""
+        self.message_event = message_event
+        """Event set when request for local service is received"""
 
-        self._async_chat_init = False
-        """True if async_chat was initialized"""
+        self._loop = loop
+        """asyncio loop of the repeater"""
+        self._protocol = None
+        """connected protocol"""
 
-
-    def accept2(self, socket, map):
-        logging.info("Accept")
-        #socket.settimeout(2)
-        asynchat.async_chat.__init__(self, sock = socket, map=map)
-        self._async_chat_init = True
-        #self.set_socket(socket)
-        self.set_terminator(_terminator)
-        return
+    @property
+    def connected(self):
+        return self._protocol is not None
 
     def get_requests(self):
         """
@@ -438,14 +704,11 @@ class ServerDispatcher(asynchat.async_chat):
         :return:
         """
         copy=[]
-        req_len=len(self.requests)
-        #logging.info("GET requests len: %d"%( len(self.requests) ))
-        for i in range(req_len):
-            request = self.requests.pop(0)
-            logging.info("copy req: " + str(request) )
-            (request_id, sender, recipient, data) = request
-            self.request_senders[self.answer_id]=(request_id, sender)
-            copy.append( RequestData(self.answer_id, sender, data) )
+        for i in range(len(self.requests)):
+            request = self.requests.popleft()
+            logging.debug("copy req: %s", request)
+            self.request_senders[self.answer_id]=(request.id, request.sender)
+            copy.append( RequestData(self.answer_id, request.sender, request.data) )
             self.answer_id += 1
         return copy
 
@@ -454,19 +717,18 @@ class ServerDispatcher(asynchat.async_chat):
         if answer_id in self.request_senders:
             (id, sender) = self.request_senders.pop(answer_id)
             if self.connected:
-                logging.info("send answer: " + str(_pack_message(id, self.repeater_address, sender, data)) )
-                self.push_safe( _pack_message(id, self.repeater_address, sender, data) )
+                msg = _pack_message(id, self.repeater_address, sender, data, _protocol_flags(self._protocol))
+                logging.debug("send answer: %d, %s, %d B", id, sender, len(msg))
+                self.push_safe(msg)
 
-    def process_queues(self):
+    def push(self, data):
         """
-        Process requests from other threads.
+        Send message to the parent repeater, message is discarded if not connected.
+        :param data:
         :return:
         """
-        # push
-        l = len(self.push_queue)
-        if l > 0:
-            for i in range(l):
-                self.push(self.push_queue.pop(0))
+        if self._protocol is not None:
+            self._protocol.write(data)
 
     def push_safe(self, data):
         """
@@ -474,118 +736,131 @@ class ServerDispatcher(asynchat.async_chat):
         :param data:
         :return:
         """
-        self.push_queue.append(data)
+        self._loop.call_soon_threadsafe(self.push, data)
 
     def close(self):
-        if self._async_chat_init:
-            super().close()
+        if self._protocol is not None:
+            self._protocol.close()
+            self._protocol = None
 
 
     """
-    Remaining are implementations of asyncore methods.
+    Remaining are callbacks of _FrameProtocol.
     """
-    def collect_incoming_data(self, data):
-        """
-        Read an incoming message from the client and put it into our outgoing queue.
-        """
-        self.received_data.extend(data)
 
-    def found_terminator(self):
+    def _connection_made(self, protocol):
+        logging.info("Accept")
+        # close previous connection
+        self.close()
+        self._protocol = protocol
+
+    def _connection_lost(self, protocol, exc):
+        if protocol is self._protocol:
+            self._protocol = None
+
+    def _message_received(self, protocol, msg):
         """
-        The end of a command or message has been seen.
+        The whole frame has been received.
         """
-        msg = _unpack_message(self.received_data)
-        logging.info("Server, message: " + str(msg))
-        self.received_data = bytearray()
-        if msg:
-            (id, sender, recipient, request) = msg
-            if len(recipient) == 0:
-                # empty recipient, we have to process
-                logging.info("process: " + str(msg))
-                self.requests.append( msg )
-                logging.info("requests len: %d"%( len(self.requests)  ))
+        logging.debug("Server, message: %s", msg)
+        (id, sender, recipient) = (msg.id, msg.sender, msg.recipient)
+        flags = protocol.flags
+        if len(recipient) == 0:
+            # empty recipient, we have to process
+            if not msg.decodable:
+                msg = {'error': "Unsupported encoding", 'recipient': self.repeater_address}
+                self.push(_pack_message(id, self.repeater_address, sender, msg, flags))
+                return
+            self.requests.append( msg )
+            logging.debug("requests len: %d", len(self.requests))
+            if self.message_event is not None:
+                self.message_event.set()
+        else:
+            try:
+                client = self.clients[recipient[0]]
+            except KeyError:
+                msg={ 'error' : "Unknown recipient", 'recipient': self.repeater_address + recipient[:1] }
+                self.push( _pack_message(id, self.repeater_address, sender, msg, flags) )
             else:
-                try:
-                    client = self.clients[recipient[0]]
-                except KeyError:
-                    msg={ 'error' : "Unknown recipient", 'recipient': self.own_address + recipient[0] }
-                    self.push( _pack_message(id, self.repeater_address, sender, msg ) )
-                else:
-                    if client.connected:
-                        try:
-                            # forward message
-                            client.push( _pack_message(id, sender, recipient[1:], request) )
-                        except Exception as e:
-                            self.push( _pack_message(id, self.repeater_address, sender, _exception_answer(e)) )
-                            return
-
-                    else:
-                        msg = {'error': "Recipient not connected", 'recipient': self.repeater_address + recipient[0]}
-                        self.push(_pack_message(id, self.repeater_address, sender, msg) )
-
-    def handle_close(self):
-        #self.logger.debug('handle_close()')
-        self.close()
-        return
+                if client.connected:
+                    try:
+                        # forward message, data are not re-encoded
+                        client.push( msg.forward(recipient[1:]) )
+                    except Exception as e:
+                        self.push( _pack_message(id, self.repeater_address, sender, _exception_answer(e), flags) )
+                        return
 
-    def handle_error(self):
-        self.close()
+                else:
+                    msg = {'error': "Recipient not connected", 'recipient': self.repeater_address + recipient[:1]}
+                    self.push(_pack_message(id, self.repeater_address, sender, msg, flags) )
 
 
-class StarterServer(asyncore.dispatcher):
+class StarterServer:
     """
     Server which accepts reverse connection from child repeaters.
     """
-    def __init__(self, async_repeater, map=None):
+    def __init__(self, async_repeater, loop=None):
         """
         :param async_repeater:
         """
-        asyncore.dispatcher.__init__(self, map=map)
-
         self.async_repeater = async_repeater
-
-        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.bind(("", 0))
-        self.address=self.socket.getsockname()
-        self.listen(5)
+        self._loop = loop
+        self._socket = _listen_socket(0)
+        self.address=self._socket.getsockname()
+        self._server = None
+        """asyncio server"""
         logging.info("Starter Server listening at address: {}".format(self.address))
 
-    def handle_accepted(self, sock, addr):
-        StarterServerDispatcher(sock, self.async_repeater)
-        #print(sock.getsockname())
+    async def start(self):
+        """
+        Start accepting connections in the repeater loop.
+        """
+        self._server = await self._loop.create_server(
+            lambda: _StarterProtocol(self.async_repeater), sock=self._socket)
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+        else:
+            self._socket.close()
 
 
-class StarterServerDispatcher(asyncore.dispatcher):
-    def __init__(self, sock, async_repeater):
-        super().__init__(sock, map=async_repeater._socket_map)
+class _StarterProtocol(asyncio.Protocol):
+    """
+    Back connection from child repeater, child sends its id and listening port.
+    """
+    def __init__(self, async_repeater):
         self.async_repeater = async_repeater
+        self._peername = None
+        self._data = bytearray()
 
-    def handle_read(self):
-        peername = self.socket.getpeername()
-        data = self.recv(1024)
-        #print(data)
-        if data:
-            s = data.decode().split("\n", maxsplit=2)
-            # Skip connections with wrong number of parameters.
-            if len(s) == 2:
-                child_id = int(s[0])
-                port = int(s[1])
-                #print((child_id, port))
-                #print(self.async_repeater.clients)
-
-                try:
-                    client = self.async_repeater.clients[child_id]
-                except KeyError:
-                    pass
-                else:
-                    if not client.request_close:
-                        client.set_remote_address((peername[0], port))
-                        logging.info("Initial back connection done.")
-        self.close()
-        # We close also if we get wrong data. As whole connection is from bad guy.
+    def connection_made(self, transport):
+        self._peername = transport.get_extra_info('peername')
 
-    def handle_error(self):
-        self.close()
+    def data_received(self, data):
+        self._data.extend(data)
+
+    def connection_lost(self, exc):
+        # We close also if we get wrong data. As whole connection is from bad guy.
+        s = self._data.decode(errors="replace").split("\n", maxsplit=2)
+        # Skip connections with wrong number of parameters.
+        if len(s) != 2:
+            return
+        try:
+            child_id = int(s[0])
+            port = int(s[1])
+        except ValueError:
+            return
+        try:
+            client = self.async_repeater.clients[child_id]
+        except KeyError:
+            pass
+        else:
+            if not client.request_close:
+                # port forwarding may block, it is done out of the repeater loop
+                self.async_repeater._loop.run_in_executor(
+                    None, client.set_remote_address, (self._peername[0], port))
+                logging.info("Initial back connection done.")
 
 
 class AsyncRepeater():
@@ -599,8 +874,11 @@ class AsyncRepeater():
     and then propagating back the answer to the request.
     Repeater do not process requests itself.
     Only in the case of error it sends the error answer itself.
+
+    All connections are served by asyncio loop running in the repeater thread.
     """
-    def __init__(self, repeater_address, parent_address=("", 0), max_client_id=0, requested_listen_port=0):
+    def __init__(self, repeater_address, parent_address=("", 0), max_client_id=0, requested_listen_port=0,
+                 message_event=None):
         """
         :param repeater_address: Repeater address as a list of IDs for path from root repeater to self.
             last item is ID of self repeater. Empty list mean root repeater.
@@ -609,9 +887,13 @@ class AsyncRepeater():
                0 - get by kernel (usual case)
         :param parent_address:
                 socket address ( address, port) of the parent repeater to connect for initialization.
+        :param message_event: threading.Event set whenever a request or an answer for the local service
+               is received, so the service loop can wake up immediately (can be None).
         """
-        self._socket_map = {}
-        """asyncore socket map"""
+        self.message_event = message_event
+        """Event set when message for local service is received"""
+        self._loop = asyncio.new_event_loop()
+        """asyncio loop of the repeater"""
         self.repeater_address = repeater_address
         self.parent_address = parent_address
         self.max_client_id = max_client_id
@@ -623,18 +905,16 @@ class AsyncRepeater():
         self._server_dispatcher = None
         self.listen_port = None
 
-        self._starter_client_thread = None
         self._starter_client_attempting = False
         if self.parent_address[0] != "":
-            self._server = Server(self, requested_listen_port, self.clients, map=self._socket_map)
+            self._server = Server(self, requested_listen_port, self.clients, loop=self._loop)
             self.listen_port = self._server.address[1]
             self._server_dispatcher = self._server.get_dispatcher()
 
             self._starter_client_attempting = True
 
-        self._starter_server = StarterServer(self, map=self._socket_map)
+        self._starter_server = StarterServer(self, loop=self._loop)
         self._loop_thread = None
-        self._loop_closing = False
 
     def run(self):
         """
@@ -642,40 +922,33 @@ class AsyncRepeater():
         Start starter client.
         :return: None
         """
-        self._loop_thread = threading.Thread(target=self._loop, daemon=True)
+        self._loop_thread = threading.Thread(target=self._loop_run, daemon=True)
         self._loop_thread.start()
-        self._loop_closing = False
         logging.info("Repeater loop started.")
 
-        if self._starter_client_attempting:
-            self._starter_client_thread = threading.Thread(target=self._starter_client_run, daemon=True)
-            self._starter_client_thread.start()
-            logging.info("Starter client started.")
-
-    def _loop(self):
+    def _loop_run(self):
         """
         Repeater loop.
         :return:
         """
-        while not self._loop_closing:
-            asyncore.loop(timeout=0.01, map=self._socket_map, count=1)
-            self._process_queues()
-
-    def _process_queues(self):
-        """
-        Process requests from other threads.
-        :return:
-        """
-        # server dispatcher
-        if self._server_dispatcher is not None:
-            self._server_dispatcher.process_queues()
-
-        # clients
-        with self.clients_lock:
-            clients = list(self.clients.values())
-        for c in clients:
-            c.process_queues()
-
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._start())
+            self._loop.run_forever()
+        finally:
+            tasks = asyncio.all_tasks(self._loop)
+            for task in tasks:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self._loop.close()
+
+    async def _start(self):
+        if self._server is not None:
+            await self._server.start()
+        await self._starter_server.start()
+        if self._starter_client_attempting:
+            self._loop.create_task(self._starter_client())
+            logging.info("Starter client started.")
 
     def add_child(self, connection, remote_address=None, id=None):
         """
@@ -701,7 +974,8 @@ class AsyncRepeater():
              Then it servers also as a unique token to check that the correct repeater is connecting to the StarterServer.
              Must keep generating of ID atomic.
         """
-        client = _ClientDispatcher(self.repeater_address, self._server_dispatcher, connection, map=self._socket_map)
+        client = _ClientDispatcher(self.repeater_address, self._server_dispatcher, connection, loop=self._loop,
+                                   message_event=self.message_event)
 
         with self.clients_lock:
             if id is not None:
@@ -738,7 +1012,7 @@ class AsyncRepeater():
         :param id:
         :return:
         """
-        self.clients[id].request_close = True
+        self.clients[id].close_safe()
 
     def discard_closed_childs(self):
         """
@@ -807,13 +1081,28 @@ class AsyncRepeater():
         Close repeater.
         :return:
         """
+        self._starter_client_attempting = False
+
         # repeater loop
-        if self._loop_thread is not None:
-            self._loop_closing = True
+        if self._loop_thread is not None and self._loop_thread.is_alive():
+            self._loop.call_soon_threadsafe(self._close_dispatchers)
             self._loop_thread.join(timeout=1)
             if self._loop_thread.is_alive():
                 logging.warning("Repeater loop closing timeout.")
+        elif not self._loop.is_closed():
+            self._close_dispatchers()
+            self._loop.close()
 
+        # client dispatchers
+        for c in self.clients.values():
+            if c is not None:
+                c.close_forwarded_ports()
+
+    def _close_dispatchers(self):
+        """
+        Close servers and all connections, stop the repeater loop.
+        :return:
+        """
         # server
         if self._server is not None:
             self._server.close()
@@ -826,23 +1115,21 @@ class AsyncRepeater():
         for c in self.clients.values():
             if c is not None:
                 c.close()
-                c.close_forwarded_ports()
 
         # starter server
         self._starter_server.close()
 
-    def _starter_client_run(self):
+        self._loop.stop()
+
+    async def _starter_client(self):
         logging.info("Attempting for back to parent initial connection to address: {}".format(self.parent_address))
+        data = "{}\n{}".format(self.repeater_address[-1], self.listen_port).encode()
         while self._starter_client_attempting:
-            s = socket.socket()
             try:
-                s.connect(self.parent_address)
-                data = "{}\n{}".format(self.repeater_address[-1], self.listen_port).encode()
-                s.sendall(data)
-            except ConnectionRefusedError:
-                pass
+                reader, writer = await asyncio.open_connection(self.parent_address[0], self.parent_address[1])
+                writer.write(data)
+                await writer.drain()
+                writer.close()
             except OSError:
                 pass
-            finally:
-                s.close()
-            time.sleep(10)
+            await asyncio.sleep(STARTER_CLIENT_PERIOD)
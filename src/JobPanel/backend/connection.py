@@ -1,6 +1,7 @@
 from .json_data import JsonData
 from .environment import Environment
 from .path_converter import if_win_lin2win_conv_path
+from . import manifest
 
 # import in code
 #from .service_proxy import DelegatorProxy
@@ -19,6 +20,9 @@ import time
 import enum
 import stat
 import sys
+import json
+import shlex
+import tarfile
 
 if sys.platform != "win32":
     import paramiko
@@ -115,6 +119,57 @@ class ConnectionBase(JsonData):
     def set_local_service(self, local_service):
         self._local_service = local_service
 
+    SYNC_CHUNK_SIZE = 100
+    """Number of files downloaded at once by sync_download"""
+
+    def sync_download(self, paths, local_prefix, remote_prefix, priority=False, follow_symlinks=True,
+                      compress=False, cache_dir=None):
+        """
+        Download given relative 'paths' like download, but transfer only files
+        which are missing locally or have different content.
+
+        Manifests (size, mtime and content hash of every file) are made on both sides,
+        hashes are cached in cache_dir on both sides (see manifest module). Changed files
+        are downloaded in chunks, manifest of downloaded files is saved after every chunk,
+        so interrupted synchronization (e.g. connection drop) is resumed by next call.
+        Files deleted on remote are not deleted locally.
+        :param bool compress: transfer files in compressed tar stream if possible
+        :param str cache_dir: directory of cached manifests relative to prefixes,
+        GEOMOP internal directory of synchronized MJ or job; if None, hashes are not cached
+        :return: list of downloaded relative file paths
+        :raises FileNotFoundError:
+        :raises PermissionError:
+        :raises SSHError:
+        """
+        remote = self._remote_manifest(paths, remote_prefix, cache_dir=cache_dir, follow_symlinks=follow_symlinks)
+        local = manifest.make_manifest(local_prefix, paths, cache_dir=cache_dir, follow_symlinks=follow_symlinks)
+        changed = manifest.changed_paths(remote, local)
+        for i in range(0, len(changed), self.SYNC_CHUNK_SIZE):
+            chunk = changed[i:i + self.SYNC_CHUNK_SIZE]
+            if compress:
+                self._download_tar(chunk, local_prefix, remote_prefix)
+            else:
+                self.download(chunk, local_prefix, remote_prefix, priority=priority, follow_symlinks=follow_symlinks)
+            manifest.make_manifest(local_prefix, chunk, cache_dir=cache_dir, follow_symlinks=follow_symlinks)
+        return changed
+
+    def _remote_manifest(self, paths, remote_prefix, cache_dir=None, follow_symlinks=True):
+        """
+        Return manifest of remote paths.
+        :raises FileNotFoundError: if some path does not exist
+        """
+        missing = []
+        ret = manifest.make_manifest(if_win_lin2win_conv_path(remote_prefix), paths, cache_dir=cache_dir,
+                                     follow_symlinks=follow_symlinks, missing=missing)
+        if len(missing) > 0:
+            raise FileNotFoundError(errno.ENOENT, "No such remote file/dir",
+                                    os.path.join(remote_prefix, missing[0]))
+        return ret
+
+    def _download_tar(self, paths, local_prefix, remote_prefix):
+        """Download files in compressed tar stream, default implementation only downloads files."""
+        self.download(paths, local_prefix, remote_prefix, follow_symlinks=False)
+
 
 class ConnectionLocal(ConnectionBase):
     def __init__(self, config={}):
@@ -156,11 +211,12 @@ class ConnectionLocal(ConnectionBase):
         """
         pass
 
-    def upload(self, paths, local_prefix, remote_prefix, priority=False, follow_symlinks=True):
+    def upload(self, paths, local_prefix, remote_prefix, priority=False, follow_symlinks=True, skip_unchanged=False):
         """
         Upload given relative 'paths' to remote, prefixing them by 'local_prefix' for source and
         by 'remote_prefix' for destination.
         If target exists, replace it.
+        :param bool skip_unchanged: if True, files with same size and mtime on target are not copied
         :return: None
         :raises FileNotFoundError:
         :raises PermissionError:
@@ -170,14 +226,16 @@ class ConnectionLocal(ConnectionBase):
         We assume symlinks only on files (not directories).
         If it is not possible to create symlink (it can happen on Windows), file is created instead.
         """
-        self._copy(paths, local_prefix, if_win_lin2win_conv_path(remote_prefix), follow_symlinks=follow_symlinks)
+        self._copy(paths, local_prefix, if_win_lin2win_conv_path(remote_prefix), follow_symlinks=follow_symlinks,
+                   skip_unchanged=skip_unchanged)
 
 
-    def download(self, paths, local_prefix, remote_prefix, priority=False, follow_symlinks=True):
+    def download(self, paths, local_prefix, remote_prefix, priority=False, follow_symlinks=True, skip_unchanged=False):
         """
         Download given relative 'paths' to remote, prefixing them by 'local_prefix' for destination and
         by 'remote_prefix' for source.
         If target exists, replace it.
+        :param bool skip_unchanged: if True, files with same size and mtime on target are not copied
         :return: None
         :raises FileNotFoundError:
         :raises PermissionError:
@@ -187,7 +245,8 @@ class ConnectionLocal(ConnectionBase):
         We assume symlinks only on files (not directories).
         If it is not possible to create symlink (it can happen on Windows), file is created instead.
         """
-        self._copy(paths, if_win_lin2win_conv_path(remote_prefix), local_prefix, follow_symlinks=follow_symlinks)
+        self._copy(paths, if_win_lin2win_conv_path(remote_prefix), local_prefix, follow_symlinks=follow_symlinks,
+                   skip_unchanged=skip_unchanged)
 
     def delete(self, paths, remote_prefix, priority=False):
         """
@@ -198,6 +257,17 @@ class ConnectionLocal(ConnectionBase):
         """
         pass
 
+    def sync_download(self, paths, local_prefix, remote_prefix, priority=False, follow_symlinks=True,
+                      compress=False, cache_dir=None):
+        """
+        See ConnectionBase.sync_download, nothing is done if prefixes are same.
+        """
+        if os.path.normcase(os.path.normpath(if_win_lin2win_conv_path(remote_prefix))) == \
+                os.path.normcase(os.path.normpath(local_prefix)):
+            return []
+        return super().sync_download(paths, local_prefix, remote_prefix, priority=priority,
+                                     follow_symlinks=follow_symlinks, compress=compress, cache_dir=cache_dir)
+
     def get_delegator(self):
         """
         Start delegator and return its proxy.
@@ -211,7 +281,7 @@ class ConnectionLocal(ConnectionBase):
 
         return self._delegator_proxy
 
-    def _copy(self, paths, from_prefix, to_prefix, follow_symlinks=True):
+    def _copy(self, paths, from_prefix, to_prefix, follow_symlinks=True, skip_unchanged=False):
         if os.path.normcase(os.path.normpath(from_prefix)) == \
                 os.path.normcase(os.path.normpath(to_prefix)):
             return
@@ -221,11 +291,17 @@ class ConnectionLocal(ConnectionBase):
             os.makedirs(os.path.dirname(dst), exist_ok=True)
             if (follow_symlinks and os.path.isdir(src)) or \
                     (not follow_symlinks and not os.path.islink(src) and os.path.isdir(src)):
-                self._copy_dir(src, dst, follow_symlinks=follow_symlinks)
+                self._copy_dir(src, dst, follow_symlinks=follow_symlinks, skip_unchanged=skip_unchanged)
             else:
-                self._copy_file(src, dst, follow_symlinks=follow_symlinks)
-
-    def _copy_file(self, src, dst, follow_symlinks=True):
+                self._copy_file(src, dst, follow_symlinks=follow_symlinks, skip_unchanged=skip_unchanged)
+
+    def _copy_file(self, src, dst, follow_symlinks=True, skip_unchanged=False):
+        if skip_unchanged and (follow_symlinks or not os.path.islink(src)) and \
+                os.path.isfile(dst) and not os.path.islink(dst):
+            src_st = os.stat(src)
+            dst_st = os.stat(dst)
+            if src_st.st_size == dst_st.st_size and int(src_st.st_mtime) == int(dst_st.st_mtime):
+                return
         if os.path.lexists(dst):
             os.remove(dst)
         if not follow_symlinks and os.path.islink(src):
@@ -236,8 +312,11 @@ class ConnectionLocal(ConnectionBase):
                 shutil.copyfile(src, dst)
         else:
             shutil.copyfile(src, dst)
+            if skip_unchanged:
+                st = os.stat(src)
+                os.utime(dst, (st.st_atime, st.st_mtime))
 
-    def _copy_dir(self, src, dst, follow_symlinks=True):
+    def _copy_dir(self, src, dst, follow_symlinks=True, skip_unchanged=False):
         names = os.listdir(src)
         os.makedirs(dst, exist_ok=True)
         for name in names:
@@ -245,9 +324,9 @@ class ConnectionLocal(ConnectionBase):
             dstname = os.path.join(dst, name)
             if (follow_symlinks and os.path.isdir(srcname)) or \
                     (not follow_symlinks and not os.path.islink(srcname) and os.path.isdir(srcname)):
-                self._copy_dir(srcname, dstname, follow_symlinks=follow_symlinks)
+                self._copy_dir(srcname, dstname, follow_symlinks=follow_symlinks, skip_unchanged=skip_unchanged)
             else:
-                self._copy_file(srcname, dstname, follow_symlinks=follow_symlinks)
+                self._copy_file(srcname, dstname, follow_symlinks=follow_symlinks, skip_unchanged=skip_unchanged)
 
 
 class ConnectionSSH(ConnectionBase):
@@ -330,6 +409,26 @@ class ConnectionSSH(ConnectionBase):
                         self._event_priority.clear()
                 return sftp
 
+        def try_acquire(self, priority=False):
+            """
+            Acquire sftp session from pool without waiting.
+            :param bool priority: if true session from priority reserve may be acquired
+            :return: sftp session or None if no session available
+            """
+            with self._lock:
+                if self._closing:
+                    return None
+                l = len(self._pool)
+                if (priority and l == 0) or (not priority and l <= self.PRIORITY_RESERVE):
+                    return None
+                sftp = self._pool.pop(0)
+                l = len(self._pool)
+                if l <= self.PRIORITY_RESERVE:
+                    self._event.clear()
+                if l == 0:
+                    self._event_priority.clear()
+            return sftp
+
         def release(self, sftp):
             """
             Returns sftp session back to pool.
@@ -346,6 +445,15 @@ class ConnectionSSH(ConnectionBase):
             if close:
                 sftp.close()
 
+    MAX_TRANSFER_SESSIONS = 3
+    """Maximal number of sftp sessions used by one upload/download"""
+
+    MANIFEST_TIMEOUT = 3600
+    """
+    Timeout of remote manifest, manifest is printed after all files are hashed,
+    first manifest of big workspace may take long [s]
+    """
+
     def __init__(self, config={}):
         """
         :param config:
@@ -378,6 +486,11 @@ class ConnectionSSH(ConnectionBase):
 
         self._sftp_pool = None
 
+        self._remote_dirs = set()
+        """cache of existing remote dirs"""
+        self._remote_dirs_lock = threading.Lock()
+        """Lock for _remote_dirs"""
+
         self._delegator_dir = ""
         """directory where delegator is executed"""
 
@@ -430,6 +543,8 @@ class ConnectionSSH(ConnectionBase):
         self._ssh.get_transport().set_keepalive(1)
 
         self._sftp_pool = self.SftpPool(self._ssh, self._timeout)
+        with self._remote_dirs_lock:
+            self._remote_dirs.clear()
 
         # prepare workspace
         sftp = self._sftp_pool.acquire()
@@ -660,17 +775,21 @@ class ConnectionSSH(ConnectionBase):
                 self._ssh.get_transport().cancel_port_forward('', remote_port)
             self._forwarded_remote_ports.remove(remote_port)
 
-    def upload(self, paths, local_prefix, remote_prefix, priority=False, follow_symlinks=True):
+    def upload(self, paths, local_prefix, remote_prefix, priority=False, follow_symlinks=True, skip_unchanged=False):
         """
         Upload given relative 'paths' to remote, prefixing them by 'local_prefix' for source and
         by 'remote_prefix' for destination.
         If target exists, replace it.
+        :param bool skip_unchanged: if True, files with same size and mtime on remote are not uploaded,
+            mtime of uploaded files is set to local mtime
         :return: None
         :raises FileNotFoundError:
         :raises PermissionError:
         :raises SSHTimeoutError:
 
-        Implementation: just copy
+        Implementation: local trees are listed first, remote directories are created
+        (known directories are cached), then files are copied concurrently
+        in free sessions of sftp pool.
 
         We assume symlinks only on files (not directories).
         """
@@ -686,6 +805,9 @@ class ConnectionSSH(ConnectionBase):
 
         rem = ""
         try:
+            # list local files
+            dirs = []
+            files = []
             for path in paths:
                 # make dirs
                 dir = os.path.dirname(path)
@@ -694,22 +816,37 @@ class ConnectionSSH(ConnectionBase):
                     dir_list.insert(0, dir)
                     dir = os.path.dirname(dir)
                 for dir in dir_list:
-                    prefix_dir = os.path.join(remote_prefix, dir)
-                    try:
-                        # for exception handling
-                        rem = prefix_dir
-
-                        sftp.mkdir(prefix_dir)
-                    except IOError:
-                        pass
+                    dirs.append(os.path.join(remote_prefix, dir))
 
                 loc = os.path.join(local_prefix, path)
                 rem = os.path.join(remote_prefix, path)
                 if (follow_symlinks and os.path.isdir(loc)) or \
                         (not follow_symlinks and not os.path.islink(loc) and os.path.isdir(loc)):
-                    self._upload_dir(sftp, loc, rem, follow_symlinks=follow_symlinks)
+                    self._list_upload_dir(loc, rem, dirs, files, follow_symlinks=follow_symlinks)
                 else:
-                    self._upload_file(sftp, loc, rem, follow_symlinks=follow_symlinks)
+                    files.append((loc, rem))
+
+            # make remote dirs
+            new_dirs = set()
+            for dir in dirs:
+                # for exception handling
+                rem = dir
+
+                if self._make_remote_dir(sftp, dir):
+                    new_dirs.add(dir)
+
+            # skip unchanged files
+            if skip_unchanged:
+                rem = remote_prefix
+                files = self._filter_unchanged_upload(sftp, files, new_dirs, follow_symlinks=follow_symlinks)
+
+            # copy files, biggest first
+            files.sort(key=lambda item: self._local_size(item[0]), reverse=True)
+
+            def upload_file(s, item):
+                self._upload_file(s, item[0], item[1], follow_symlinks=follow_symlinks,
+                                  keep_mtime=skip_unchanged)
+            self._run_transfers(sftp, priority, files, upload_file)
         except FileNotFoundError as e:
             if e.filename is None:
                 raise OSError(errno.ENOENT, "No such remote file/dir", rem)
@@ -727,7 +864,134 @@ class ConnectionSSH(ConnectionBase):
         finally:
             sftp_pool.release(sftp)
 
-    def _upload_file(self, sftp, loc, rem, follow_symlinks=True):
+    def _list_upload_dir(self, loc, rem, dirs, files, follow_symlinks=True):
+        """Append remote dirs to create and files to upload from local tree to lists."""
+        dirs.append(rem)
+        for name in os.listdir(loc):
+            loc_name = os.path.join(loc, name)
+            rem_name = os.path.join(rem, name)
+            if (follow_symlinks and os.path.isdir(loc_name)) or \
+                    (not follow_symlinks and not os.path.islink(loc_name) and os.path.isdir(loc_name)):
+                self._list_upload_dir(loc_name, rem_name, dirs, files, follow_symlinks=follow_symlinks)
+            else:
+                files.append((loc_name, rem_name))
+
+    def _make_remote_dir(self, sftp, dir):
+        """
+        Make remote dir if it is not in cache of existing dirs.
+        :return: True if dir was created
+        """
+        with self._remote_dirs_lock:
+            if dir in self._remote_dirs:
+                return False
+        created = False
+        try:
+            sftp.mkdir(dir)
+            created = True
+        except IOError:
+            try:
+                if not stat.S_ISDIR(sftp.stat(dir).st_mode):
+                    return False
+            except IOError:
+                return False
+        with self._remote_dirs_lock:
+            self._remote_dirs.add(dir)
+        return created
+
+    def _forget_remote_dirs(self, path):
+        """Remove path and its subdirs from cache of existing remote dirs."""
+        prefix = os.path.join(path, "")
+        with self._remote_dirs_lock:
+            self._remote_dirs = {d for d in self._remote_dirs if d != path and not d.startswith(prefix)}
+
+    def _filter_unchanged_upload(self, sftp, files, new_dirs, follow_symlinks=True):
+        """
+        Return files which differ from remote by size or mtime.
+        Remote attributes are read by one listdir per directory.
+        """
+        remote_attrs = {}
+        ret = []
+        for loc, rem in files:
+            if not follow_symlinks and os.path.islink(loc):
+                ret.append((loc, rem))
+                continue
+            dir = os.path.dirname(rem)
+            if dir not in remote_attrs:
+                remote_attrs[dir] = {}
+                if dir not in new_dirs:
+                    try:
+                        for attr in sftp.listdir_attr(dir):
+                            remote_attrs[dir][attr.filename] = attr
+                    except IOError:
+                        pass
+            attr = remote_attrs[dir].get(os.path.basename(rem), None)
+            if attr is not None and stat.S_ISREG(attr.st_mode):
+                st = os.stat(loc)
+                if attr.st_size == st.st_size and int(attr.st_mtime) == int(st.st_mtime):
+                    continue
+            ret.append((loc, rem))
+        return ret
+
+    @staticmethod
+    def _local_size(path):
+        try:
+            return os.lstat(path).st_size
+        except OSError:
+            return 0
+
+    def _run_transfers(self, sftp, priority, items, transfer):
+        """
+        Call transfer(sftp_session, item) for all items.
+        Items are processed concurrently in given session 'sftp' and
+        in free sessions of sftp pool, at most MAX_TRANSFER_SESSIONS are used.
+        Priority transfers may use sessions from priority reserve too.
+        First exception is reraised after all running transfers are finished.
+        """
+        sessions = [sftp]
+        while len(sessions) < min(len(items), self.MAX_TRANSFER_SESSIONS):
+            s = self._sftp_pool.try_acquire(priority)
+            if s is None:
+                break
+            sessions.append(s)
+
+        if len(sessions) == 1:
+            for item in items:
+                transfer(sftp, item)
+            return
+
+        queue = list(reversed(items))
+        lock = threading.Lock()
+        errors = []
+
+        def worker(s):
+            while True:
+                with lock:
+                    if len(errors) > 0 or len(queue) == 0:
+                        return
+                    item = queue.pop()
+                try:
+                    transfer(s, item)
+                except Exception as e:
+                    with lock:
+                        errors.append(e)
+                    return
+
+        threads = []
+        try:
+            for s in sessions[1:]:
+                t = threading.Thread(target=worker, args=(s,), daemon=True)
+                t.start()
+                threads.append(t)
+            worker(sftp)
+            for t in threads:
+                t.join()
+        finally:
+            for s in sessions[1:]:
+                self._sftp_pool.release(s)
+        if len(errors) > 0:
+            raise errors[0]
+
+    def _upload_file(self, sftp, loc, rem, follow_symlinks=True, keep_mtime=False):
         try:
             try:
                 sftp.remove(rem)
@@ -736,7 +1000,11 @@ class ConnectionSSH(ConnectionBase):
             if not follow_symlinks and os.path.islink(loc):
                 sftp.symlink(os.readlink(loc), rem)
             else:
+                # put writes in pipelined mode
                 sftp.put(loc, rem)
+                if keep_mtime:
+                    st = os.stat(loc)
+                    sftp.utime(rem, (st.st_atime, st.st_mtime))
         except FileNotFoundError as e:
             if e.filename is None:
                 raise OSError(errno.ENOENT, "No such remote file", rem)
@@ -748,43 +1016,20 @@ class ConnectionSSH(ConnectionBase):
             else:
                 raise
 
-    def _upload_dir(self, sftp, loc, rem, follow_symlinks=True):
-        try:
-            names = os.listdir(loc)
-            try:
-                sftp.mkdir(rem)
-            except IOError:
-                pass
-            for name in names:
-                loc_name = os.path.join(loc, name)
-                rem_name = os.path.join(rem, name)
-                if (follow_symlinks and os.path.isdir(loc_name)) or \
-                        (not follow_symlinks and not os.path.islink(loc_name) and os.path.isdir(loc_name)):
-                    self._upload_dir(sftp, loc_name, rem_name, follow_symlinks=follow_symlinks)
-                else:
-                    self._upload_file(sftp, loc_name, rem_name, follow_symlinks=follow_symlinks)
-        except FileNotFoundError as e:
-            if e.filename is None:
-                raise OSError(errno.ENOENT, "No such remote dir", rem)
-            else:
-                raise
-        except PermissionError as e:
-            if e.filename is None:
-                raise OSError(errno.EACCES, "Permission denied on remote dir", rem)
-            else:
-                raise
-
-    def download(self, paths, local_prefix, remote_prefix, priority=False, follow_symlinks=True):
+    def download(self, paths, local_prefix, remote_prefix, priority=False, follow_symlinks=True, skip_unchanged=False):
         """
         Download given relative 'paths' to remote, prefixing them by 'local_prefix' for destination and
         by 'remote_prefix' for source.
         If target exists, replace it.
+        :param bool skip_unchanged: if True, files with same size and mtime on local are not downloaded,
+            mtime of downloaded files is set to remote mtime
         :return: None
         :raises FileNotFoundError:
         :raises PermissionError:
         :raises SSHTimeoutError:
 
-        Implementation: just copy
+        Implementation: remote trees are listed first, then files are copied concurrently
+        in free sessions of sftp pool.
 
         We assume symlinks only on files (not directories).
         If it is not possible to create symlink (it can happen on Windows), file is created instead.
@@ -799,16 +1044,32 @@ class ConnectionSSH(ConnectionBase):
 
         rem = ""
         try:
+            # list remote files
+            files = []
             for path in paths:
                 loc = os.path.join(local_prefix, path)
                 rem = os.path.join(remote_prefix, path)
                 os.makedirs(os.path.dirname(loc), exist_ok=True)
-                if (follow_symlinks and stat.S_ISDIR(sftp.stat(rem).st_mode)) or \
-                        (not follow_symlinks and not stat.S_ISLNK(sftp.lstat(rem).st_mode) and
-                             stat.S_ISDIR(sftp.stat(rem).st_mode)):
-                    self._download_dir(sftp, loc, rem, follow_symlinks=follow_symlinks)
+                attr = sftp.lstat(rem)
+                mode = attr.st_mode
+                if follow_symlinks and stat.S_ISLNK(mode):
+                    mode = sftp.stat(rem).st_mode
+                if stat.S_ISDIR(mode):
+                    self._list_download_dir(sftp, loc, rem, files, follow_symlinks=follow_symlinks)
                 else:
-                    self._download_file(sftp, loc, rem, follow_symlinks=follow_symlinks)
+                    files.append((loc, rem, attr))
+
+            # skip unchanged files
+            if skip_unchanged:
+                files = [item for item in files if not self._is_local_unchanged(item[0], item[2])]
+
+            # copy files, biggest first
+            files.sort(key=lambda item: item[2].st_size, reverse=True)
+
+            def download_file(s, item):
+                self._download_file(s, item[0], item[1], follow_symlinks=follow_symlinks,
+                                    attr=item[2], keep_mtime=skip_unchanged)
+            self._run_transfers(sftp, priority, files, download_file)
         except FileNotFoundError as e:
             if e.filename is None:
                 raise OSError(errno.ENOENT, "No such remote file/dir", rem)
@@ -826,18 +1087,147 @@ class ConnectionSSH(ConnectionBase):
         finally:
             sftp_pool.release(sftp)
 
-    def _download_file(self, sftp, loc, rem, follow_symlinks=True):
+    def _remote_manifest(self, paths, remote_prefix, cache_dir=None, follow_symlinks=True):
+        """
+        Return manifest of remote paths, made by manifest module executed on remote.
+        :raises FileNotFoundError: if some path does not exist
+        :raises SSHError:
+        """
+        if self._status != ConnectionStatus.online:
+            raise SSHError
+
+        args = [self.environment.python,
+                os.path.join(self.environment.geomop_root, "JobPanel/backend/manifest.py")]
+        if not follow_symlinks:
+            args.append("-l")
+        if cache_dir is not None:
+            args.extend(["-c", cache_dir])
+        args.append(remote_prefix)
+        args.extend(paths)
+        stdout = self._exec_command(" ".join(shlex.quote(a) for a in args), timeout=self.MANIFEST_TIMEOUT)
+        try:
+            data = json.loads(stdout.decode(errors="replace"))
+        except ValueError:
+            raise SSHError
+        if len(data["missing"]) > 0:
+            raise FileNotFoundError(errno.ENOENT, "No such remote file/dir",
+                                    os.path.join(remote_prefix, data["missing"][0]))
+        return data["manifest"]
+
+    def _download_tar(self, paths, local_prefix, remote_prefix):
+        """
+        Download files in gzip compressed tar stream made on remote.
+        Symlinks are transferred as symlinks.
+        :raises SSHError:
+        """
+        if self._status != ConnectionStatus.online:
+            raise SSHError
+
+        command = "tar -czf - -C {} -- {}".format(shlex.quote(remote_prefix),
+                                                   " ".join(shlex.quote(p) for p in paths))
+        with self._ssh_lock:
+            try:
+                stdin, stdout, stderr = self._ssh.exec_command(command, timeout=self._timeout)
+            except paramiko.SSHException:
+                raise SSHError
+            except socket.timeout:
+                raise SSHTimeoutError
+        local_prefix = os.path.abspath(local_prefix)
+        try:
+            with tarfile.open(fileobj=stdout, mode="r|gz") as tar:
+                for member in tar:
+                    loc = os.path.abspath(os.path.join(local_prefix, member.name))
+                    if not loc.startswith(os.path.join(local_prefix, "")):
+                        raise SSHError
+                    if os.path.lexists(loc) and not os.path.isdir(loc):
+                        os.remove(loc)
+                    tar.extract(member, local_prefix)
+        except (tarfile.TarError, EOFError):
+            raise SSHError
+        except socket.timeout:
+            raise SSHTimeoutError
+        if stdout.channel.recv_exit_status() != 0:
+            raise SSHError
+
+    def _exec_command(self, command, timeout=None):
+        """
+        Execute command on remote and return its stdout.
+        :param timeout: timeout of waiting for output [s], default is timeout of ssh operations
+        :raises SSHError: if command fails
+        """
+        if timeout is None:
+            timeout = self._timeout
+        with self._ssh_lock:
+            try:
+                stdin, stdout, stderr = self._ssh.exec_command(command, timeout=timeout)
+            except paramiko.SSHException:
+                raise SSHError
+            except socket.timeout:
+                raise SSHTimeoutError
+        try:
+            out = stdout.read()
+        except socket.timeout:
+            raise SSHTimeoutError
+        if stdout.channel.recv_exit_status() != 0:
+            raise SSHError
+        return out
+
+    def _list_download_dir(self, sftp, loc, rem, files, follow_symlinks=True):
+        """
+        Make local dirs and append files to download from remote tree to list.
+        Attributes of files are read by one listdir per directory.
+        """
+        try:
+            os.makedirs(loc, exist_ok=True)
+            for fileattr in sftp.listdir_attr(rem):
+                loc_name = os.path.join(loc, fileattr.filename)
+                rem_name = os.path.join(rem, fileattr.filename)
+                mode = fileattr.st_mode
+                if follow_symlinks and stat.S_ISLNK(mode):
+                    mode = sftp.stat(rem_name).st_mode
+                if stat.S_ISDIR(mode):
+                    self._list_download_dir(sftp, loc_name, rem_name, files, follow_symlinks=follow_symlinks)
+                else:
+                    files.append((loc_name, rem_name, fileattr))
+        except FileNotFoundError as e:
+            if e.filename is None:
+                raise OSError(errno.ENOENT, "No such remote dir", rem)
+            else:
+                raise
+        except PermissionError as e:
+            if e.filename is None:
+                raise OSError(errno.EACCES, "Permission denied on remote dir", rem)
+            else:
+                raise
+
+    @staticmethod
+    def _is_local_unchanged(loc, attr):
+        """Return True if local file has same size and mtime as remote file with attributes 'attr'."""
+        if attr is None or not stat.S_ISREG(attr.st_mode):
+            return False
+        try:
+            st = os.lstat(loc)
+        except OSError:
+            return False
+        return stat.S_ISREG(st.st_mode) and st.st_size == attr.st_size and int(st.st_mtime) == int(attr.st_mtime)
+
+    def _download_file(self, sftp, loc, rem, follow_symlinks=True, attr=None, keep_mtime=False):
         try:
             if os.path.lexists(loc):
                 os.remove(loc)
-            if not follow_symlinks and stat.S_ISLNK(sftp.lstat(rem).st_mode):
+            if attr is None:
+                attr = sftp.lstat(rem)
+            if not follow_symlinks and stat.S_ISLNK(attr.st_mode):
                 target = sftp.readlink(rem)
                 try:
                     os.symlink(target, loc)
                 except (NotImplementedError, OSError):
                     sftp.get(rem, loc)
             else:
+                # get reads with prefetching
                 sftp.get(rem, loc)
+                if keep_mtime and stat.S_ISREG(attr.st_mode):
+                    os.utime(loc, (attr.st_atime, attr.st_mtime))
         except FileNotFoundError as e:
             if e.filename is None:
                 raise OSError(errno.ENOENT, "No such remote file", rem)
@@ -849,29 +1239,6 @@ class ConnectionSSH(ConnectionBase):
             else:
                 raise
 
-    def _download_dir(self, sftp, loc, rem, follow_symlinks=True):
-        try:
-            os.makedirs(loc, exist_ok=True)
-            for fileattr in sftp.listdir_attr(rem):
-                loc_name = os.path.join(loc, fileattr.filename)
-                rem_name = os.path.join(rem, fileattr.filename)
-                if (follow_symlinks and stat.S_ISDIR(sftp.stat(rem_name).st_mode)) or \
-                        (not follow_symlinks and not stat.S_ISLNK(fileattr.st_mode) and
-                            stat.S_ISDIR(sftp.stat(rem_name).st_mode)):
-                    self._download_dir(sftp, loc_name, rem_name, follow_symlinks=follow_symlinks)
-                else:
-                    self._download_file(sftp, loc_name, rem_name, follow_symlinks=follow_symlinks)
-        except FileNotFoundError as e:
-            if e.filename is None:
-                raise OSError(errno.ENOENT, "No such remote dir", rem)
-            else:
-                raise
-        except PermissionError as e:
-            if e.filename is None:
-                raise OSError(errno.EACCES, "Permission denied on remote dir", rem)
-            else:
-                raise
-
     def delete(self, paths, remote_prefix, priority=False):
         """
         Delete given relative 'paths' on remote, prefixing them by 'remote_prefix'.
@@ -894,6 +1261,7 @@ class ConnectionSSH(ConnectionBase):
         try:
             for path in paths:
                 full_path = os.path.join(remote_prefix, path)
+                self._forget_remote_dirs(full_path)
                 if stat.S_ISDIR(sftp.lstat(full_path).st_mode):
                     self._delete_dir(sftp, full_path)
                 else:
@@ -34,6 +34,7 @@ import subprocess
 import logging
 import re
 import time
+import threading
 
 
 class Executable(JsonData):
@@ -210,7 +211,10 @@ class ProcessExec(ProcessBase):
             Use 'ps' to get all processes running by the user, filter only given pids.
             We want to
 
-            :return: [ (process_id, process_state), ... ]
+            Status of all processes tracked by this service is obtained from single
+            process table scan shared by all ProcessExec instances (see LocalProcessPoller).
+
+            :return: {process_id: {"running": bool, "cpu_percent": float, "rss": int}, ...}
 
             TODO: Not implement until we know exactly the purpose. Possibly status of the service
             may be sufficient, i.e. no qstat call necessary unless user want so or for detailed logging.
@@ -218,36 +222,7 @@ class ProcessExec(ProcessBase):
             if pid_list is None:
                 pid_list = [self.process_id]
 
-            ret = {}
-            for pid in pid_list:
-                r = self._get_status_inner(pid)
-                ret[pid] = {"running": r}
-            return ret
-
-        def _get_status_inner(self, process_id):
-            if process_id == "":
-                return False
-            pid, create_time = process_id.split(sep="@", maxsplit=1)
-            try:
-                p = psutil.Process(int(pid))
-                if str(p.create_time()) != create_time:
-                    # already terminated
-                    return False
-                status = p.status()
-                if status == psutil.STATUS_RUNNING or status == psutil.STATUS_SLEEPING:
-                    return True
-                else:
-                    try:
-                        p.wait(timeout=0)
-                    except psutil.TimeoutExpired:
-                        pass
-                    return False
-            except psutil.NoSuchProcess:
-                # already terminated
-                return False
-            except psutil.AccessDenied:
-                # permission is denied
-                assert False
+            return local_process_poller.get_status(pid_list)
 
         # def full_state_info(self, pid_list):
         #     """
@@ -292,6 +267,271 @@ class ProcessExec(ProcessBase):
 
 
 
+class LocalProcessPoller:
+    """
+    Shared status poller of local processes.
+
+    Every requested process id ("pid@create_time") is tracked and status
+    of all tracked processes is obtained by single scan of the process table.
+    Result is cached for ttl seconds. CPU usage and resident memory are
+    summed over the process and all its descendants (the process may be
+    only a wrapper, e.g. exec_with_limit), CPU usage is computed from
+    the CPU time difference between scans.
+    Processes not requested for forget_time seconds are not tracked anymore.
+    """
+    def __init__(self, ttl=1.0, forget_time=300.0):
+        self.ttl = ttl
+        """time in seconds for which cached status is valid"""
+        self.forget_time = forget_time
+        """time in seconds after that not requested process is not tracked"""
+
+        self._tracked = {}
+        """tracked process ids, process_id -> last request time"""
+        self._cache = {}
+        """cached status, process_id -> status"""
+        self._cache_time = 0.0
+        """time of last scan"""
+        self._cache_pids = set()
+        """process ids asked in last scan"""
+        self._cpu_samples = {}
+        """process_id -> (time, CPU time) of last scan"""
+        self._lock = threading.Lock()
+        """lock for poller data, also serializes scans"""
+
+    def get_status(self, pid_list):
+        """
+        Return status of processes, process table is scanned only if cache
+        is too old or some process is not cached.
+        :param pid_list: list of process ids
+        :return: {process_id: {"running": bool, "cpu_percent": float, "rss": int}, ...}
+        """
+        with self._lock:
+            now = time.time()
+            pids = [pid for pid in pid_list if pid != ""]
+            for pid in pids:
+                self._tracked[pid] = now
+            if (now > self._cache_time + self.ttl) or not self._cache_pids.issuperset(pids):
+                self._update(now)
+
+            ret = {}
+            for pid in pid_list:
+                if pid in self._cache:
+                    ret[pid] = self._cache[pid]
+                else:
+                    ret[pid] = {"running": False, "cpu_percent": 0.0, "rss": 0}
+            return ret
+
+    def _update(self, now):
+        """Scan process table and update status of all tracked processes."""
+        for pid, t in list(self._tracked.items()):
+            if now > t + self.forget_time:
+                del self._tracked[pid]
+                self._cpu_samples.pop(pid, None)
+
+        # parents of all processes, details only for tracked processes and their descendants
+        processes = {}
+        children = {}
+        for p in psutil.process_iter(["ppid"]):
+            processes[p.pid] = p
+            children.setdefault(p.info["ppid"], []).append(p.pid)
+
+        cache = {}
+        for process_id in self._tracked:
+            status = {"running": False, "cpu_percent": 0.0, "rss": 0}
+            cache[process_id] = status
+            pid, create_time = process_id.split(sep="@", maxsplit=1)
+            info = self._info(processes.get(int(pid)))
+            if info is None or str(info["create_time"]) != create_time:
+                # already terminated
+                self._cpu_samples.pop(process_id, None)
+                continue
+            if info["status"] in [psutil.STATUS_RUNNING, psutil.STATUS_SLEEPING]:
+                status["running"] = True
+            else:
+                if info["status"] == psutil.STATUS_ZOMBIE:
+                    self._reap(int(pid))
+                self._cpu_samples.pop(process_id, None)
+                continue
+
+            # resources of process subtree
+            cpu_time = 0.0
+            rss = 0
+            stack = [int(pid)]
+            while len(stack) > 0:
+                i = stack.pop()
+                if i != int(pid):
+                    info = self._info(processes.get(i))
+                if info is None:
+                    continue
+                cpu_time += info["cpu_times"].user + info["cpu_times"].system
+                rss += info["memory_info"].rss
+                stack.extend(children.get(i, []))
+            last_time, last_cpu_time = self._cpu_samples.get(process_id, (float(create_time), 0.0))
+            if now > last_time:
+                status["cpu_percent"] = max(0.0, 100.0 * (cpu_time - last_cpu_time) / (now - last_time))
+            status["rss"] = rss
+            self._cpu_samples[process_id] = (now, cpu_time)
+
+        self._cache = cache
+        self._cache_time = now
+        self._cache_pids = set(self._tracked.keys())
+
+    @staticmethod
+    def _info(process):
+        """Return dict of process details, None if process is not accessible."""
+        if process is None:
+            return None
+        try:
+            return process.as_dict(["create_time", "status", "cpu_times", "memory_info"])
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return None
+
+    @staticmethod
+    def _reap(pid):
+        """Reap zombie process if it is our child."""
+        try:
+            psutil.Process(pid).wait(timeout=0)
+        except (psutil.TimeoutExpired, psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+
+
+local_process_poller = LocalProcessPoller()
+"""poller shared by all ProcessExec instances of this service"""
+
+
+def parse_qstat_output(output):
+    """
+    Parse output of 'qstat -fx' in single pass.
+    :param output: qstat output text
+    :return: {job_id: {"status": ServiceStatus or None, "raw": job record}, ...},
+        every job is stored under full id and under id without server part
+    """
+    from .service_base import ServiceStatus
+
+    ret = {}
+    job_id = None
+    record = []
+    status = None
+
+    def finish_job():
+        if job_id is not None:
+            data = {"status": status, "raw": "\n".join(record)}
+            ret[job_id] = data
+            ret.setdefault(job_id.split(".", maxsplit=1)[0], data)
+
+    for line in output.splitlines():
+        if line.startswith("Job Id: "):
+            finish_job()
+            job_id = line[8:].strip()
+            record = [line]
+            status = None
+        elif job_id is not None:
+            if len(line.strip()) == 0:
+                continue
+            record.append(line)
+            s = line.strip()
+            if s.startswith("job_state = "):
+                s = s[12:]
+                if s == "Q":
+                    status = ServiceStatus.queued
+                elif s == "R" or s == "E":
+                    status = ServiceStatus.running
+                elif s == "F":
+                    status = ServiceStatus.done
+    finish_job()
+    return ret
+
+
+class PbsStatusPoller:
+    """
+    Shared status poller of PBS jobs.
+
+    Every requested job id is tracked and status of all tracked jobs
+    is obtained by single qstat call. Result is cached for ttl seconds,
+    so concurrent status requests of many jobs do not overload PBS server.
+    Jobs not requested for forget_time seconds are not tracked anymore.
+    """
+    def __init__(self, ttl=5.0, forget_time=300.0):
+        self.ttl = ttl
+        """time in seconds for which cached status is valid"""
+        self.forget_time = forget_time
+        """time in seconds after that not requested job is not tracked"""
+
+        self._tracked = {}
+        """tracked job ids, job_id -> last request time"""
+        self._cache = {}
+        """cached qstat records, job_id -> record"""
+        self._cache_time = 0.0
+        """time of last qstat call"""
+        self._cache_pids = set()
+        """job ids asked in last qstat call"""
+        self._retry_time = 0.0
+        """qstat is not called before this time after its failure"""
+        self._lock = threading.Lock()
+        """lock for poller data, also serializes qstat calls"""
+
+    def get_status(self, pid_list):
+        """
+        Return status of jobs, qstat is called only if cache
+        is too old or some job is not cached. After failed qstat
+        call it is not called again for ttl seconds.
+        :param pid_list: list of job ids
+        :return: {pid: {"status": ServiceStatus or None, "raw": qstat record}, ...}
+        """
+        with self._lock:
+            now = time.time()
+            for pid in pid_list:
+                self._tracked[pid] = now
+            if now >= self._retry_time and \
+                    ((now > self._cache_time + self.ttl) or not self._cache_pids.issuperset(pid_list)):
+                self._update(now)
+
+            ret = {}
+            for pid in pid_list:
+                if pid in self._cache:
+                    ret[pid] = self._cache[pid]
+                else:
+                    ret[pid] = {"status": None, "raw": ""}
+            return ret
+
+    def _update(self, now):
+        """Call qstat for all tracked jobs and update cache."""
+        for pid, t in list(self._tracked.items()):
+            if now > t + self.forget_time:
+                del self._tracked[pid]
+        pids = sorted(self._tracked.keys())
+        output = self._qstat(pids)
+        if output is None:
+            # back off, failing qstat may take its whole timeout
+            self._retry_time = now + self.ttl
+            return
+        self._cache = parse_qstat_output(output)
+        self._cache_time = now
+        self._cache_pids = set(pids)
+
+    @staticmethod
+    def _qstat(pid_list):
+        """
+        Call qstat for given jobs, return output or None if failed.
+        Unknown jobs are only reported to stderr, so return code is ignored.
+        """
+        args = ["qstat", "-fx"]
+        args.extend(pid_list)
+        try:
+            process = subprocess.run(args,
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.DEVNULL,
+                                     universal_newlines=True,
+                                     timeout=60)
+        except (subprocess.TimeoutExpired, OSError):
+            return None
+        return process.stdout
+
+
+pbs_status_poller = PbsStatusPoller()
+"""poller shared by all ProcessPBS instances of this service"""
+
+
 class ProcessPBS(ProcessBase):
     """
     Same interface as ProcessExec.
@@ -368,52 +608,16 @@ class ProcessPBS(ProcessBase):
         return self.process_id
 
     def get_status(self, pid_list=None):
+        """
+        Get states of PBS jobs.
+        Status is read from shared poller, so all jobs are checked
+        by one qstat call per poller interval.
+        :param pid_list: list of job ids, default is job of this process
+        :return: {pid: {"status": ServiceStatus or None, "raw": qstat record}, ...}
+        """
         if pid_list is None:
             pid_list = [self.process_id]
-
-        ret = {}
-        args = ["qstat", "-fx"]
-        args.extend(pid_list)
-        try:
-            output = subprocess.check_output(args,
-                                             universal_newlines=True,
-                                             timeout=60)
-        except subprocess.TimeoutExpired:
-            return ret
-
-        # parse output
-        lines = output.splitlines()
-        for pid in pid_list:
-            # find start
-            for i in range(len(lines)):
-                if lines[i].startswith("Job Id: " + pid):
-                    ind_start = i
-                    break
-
-            # find end
-            ind_end = len(lines)
-            for i in range(ind_start + 1, len(lines)):
-                if len(lines[i].strip()) == 0:
-                    ind_end = i
-
-            # job state
-            status = None
-            for i in range(ind_start + 1, ind_end):
-                s = lines[i].strip()
-                if s.startswith("job_state = "):
-                    s = s[12:]
-                    from .service_base import ServiceStatus
-                    if s == "Q":
-                        status = ServiceStatus.queued
-                    elif s == "R" or s == "E":
-                        status = ServiceStatus.running
-                    elif s == "F":
-                        status = ServiceStatus.done
-                    break
-
-            ret[pid] = {"status": status,
-                        "raw": "\n".join(lines[ind_start:ind_end])}
-        return ret
+        return pbs_status_poller.get_status(pid_list)
 
     def kill(self):
         # todo: Spravne by se melo pockat az se proces ukonci (pomoci qstat), jako u ProcessExec.
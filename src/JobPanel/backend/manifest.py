@@ -0,0 +1,158 @@
+"""
+Manifests of file trees for incremental synchronization.
+
+Manifest is dict {relative_path: [size, mtime_ns, hash]} of all files
+in given paths. Hashes are cached in manifest file in given cache directory
+(GEOMOP internal directory of synchronized MJ or job), so only files with
+changed size or mtime are hashed again. Cache is merged on write, so
+concurrent synchronizations using the same cache do not lose entries.
+
+Module is also executed as script on remote side (see ConnectionSSH.sync_download),
+so it must depend on standard library only.
+
+Usage: manifest.py [-l] [-c cache_dir] prefix path [path ...]
+    -l  do not follow symlinks
+    -c  directory of cached manifest relative to prefix
+Manifest is printed to stdout in JSON.
+"""
+
+import hashlib
+import json
+import os
+import stat
+import sys
+import threading
+
+
+MANIFEST_FILE_NAME = "sync_manifest.json"
+"""Name of file with cached manifest, files of this name are never part of manifest"""
+
+_cache_lock = threading.Lock()
+"""lock for merging of cached manifests"""
+
+
+def file_hash(path):
+    """Return sha1 hash of file content."""
+    h = hashlib.sha1()
+    with open(path, 'rb') as fd:
+        while True:
+            data = fd.read(1024 * 1024)
+            if len(data) == 0:
+                break
+            h.update(data)
+    return h.hexdigest()
+
+
+def load_manifest(file):
+    """Load cached manifest from file, return empty dict if not available."""
+    try:
+        with open(file, 'r') as fd:
+            manifest = json.load(fd)
+        if isinstance(manifest, dict):
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {}
+
+
+def _in_roots(path, roots):
+    return any(r == "." or path == r or path.startswith(os.path.join(r, "")) for r in roots)
+
+
+def save_manifest(file, manifest, roots):
+    """
+    Merge manifest to cached manifest in file. Cached entries of files under
+    roots which are missing in manifest are removed, other entries are kept,
+    so cache is not lost if other process or thread saves it concurrently.
+    Errors are ignored, manifest is only cache.
+    """
+    tmp_file = "{}.{}.{}".format(file, os.getpid(), threading.get_ident())
+    with _cache_lock:
+        cache = load_manifest(file)
+        for key in list(cache.keys()):
+            if key not in manifest and _in_roots(key, roots):
+                del cache[key]
+        cache.update(manifest)
+        try:
+            os.makedirs(os.path.dirname(file), exist_ok=True)
+            with open(tmp_file, 'w') as fd:
+                json.dump(cache, fd)
+            os.replace(tmp_file, file)
+        except OSError:
+            try:
+                os.remove(tmp_file)
+            except OSError:
+                pass
+
+
+def make_manifest(prefix, paths, cache_dir=None, follow_symlinks=True, missing=None):
+    """
+    Make manifest of relative 'paths' prefixed by 'prefix', directories are
+    processed recursively. Symlinks are recorded by its target if not follow_symlinks.
+    :param str cache_dir: directory of cached manifest relative to prefix,
+    cache is used and updated; if None, all files are hashed
+    :param list missing: if given, paths which does not exist are appended to it
+    :return: {relative_path: [size, mtime_ns, hash]}
+    """
+    cache_file = None
+    cache = {}
+    if cache_dir is not None:
+        cache_file = os.path.join(prefix, cache_dir, MANIFEST_FILE_NAME)
+        cache = load_manifest(cache_file)
+    manifest = {}
+    roots = [os.path.normpath(p) for p in paths]
+
+    def add_file(rel_path, st):
+        if stat.S_ISLNK(st.st_mode):
+            entry = [0, st.st_mtime_ns, "link:" + os.readlink(os.path.join(prefix, rel_path))]
+        else:
+            entry = cache.get(rel_path, None)
+            if entry is None or entry[0] != st.st_size or entry[1] != st.st_mtime_ns:
+                entry = [st.st_size, st.st_mtime_ns, file_hash(os.path.join(prefix, rel_path))]
+        manifest[rel_path] = entry
+
+    def add_dir(rel_path):
+        for name in os.listdir(os.path.join(prefix, rel_path)):
+            if name == MANIFEST_FILE_NAME:
+                continue
+            add_path(name if rel_path == "." else os.path.join(rel_path, name))
+
+    def add_path(rel_path):
+        path = os.path.join(prefix, rel_path)
+        st = os.stat(path) if follow_symlinks else os.lstat(path)
+        if stat.S_ISDIR(st.st_mode):
+            add_dir(rel_path)
+        elif stat.S_ISREG(st.st_mode) or stat.S_ISLNK(st.st_mode):
+            add_file(rel_path, st)
+
+    for rel_path in roots:
+        try:
+            add_path(rel_path)
+        except FileNotFoundError:
+            if missing is not None:
+                missing.append(rel_path)
+
+    if cache_file is not None:
+        save_manifest(cache_file, manifest, roots)
+    return manifest
+
+
+def changed_paths(source, target):
+    """Return sorted paths from source manifest which are missing or have different content in target."""
+    return sorted(path for path, entry in source.items()
+                  if path not in target or target[path][2] != entry[2])
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    follow = True
+    cache = None
+    if len(args) > 0 and args[0] == "-l":
+        follow = False
+        args = args[1:]
+    if len(args) > 1 and args[0] == "-c":
+        cache = args[1]
+        args = args[2:]
+    missing = []
+    manifest = make_manifest(args[0], args[1:], cache_dir=cache, follow_symlinks=follow, missing=missing)
+    json.dump({"manifest": manifest, "missing": missing}, sys.stdout)
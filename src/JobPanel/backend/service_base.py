@@ -4,6 +4,7 @@ from .json_data import JsonData, ClassFactory
 from .environment import Environment
 from .connection import ConnectionLocal, ConnectionSSH
 from .executor import ProcessExec, ProcessPBS, ProcessDocker
+from .state_journal import StateJournal
 
 # import in code
 #from .service_proxy import ServiceProxy
@@ -100,6 +101,8 @@ def call_action(obj, action, data, result=None):
     def save_result(res):
         if result is not None:
             result.append(res)
+        if isinstance(obj, ServiceBase):
+            obj.wake()
 
     try:
         action_method = getattr(obj, action)
@@ -240,8 +243,12 @@ class ServiceBase(JsonData):
         self._child_services_lock = threading.Lock()
         """Lock for _child_services"""
 
+        self._wake_event = threading.Event()
+        """Event for waking up service loop, set when request, answer or action result arrives"""
+
         self._repeater = ar.AsyncRepeater(self.repeater_address, self.parent_address,
-                                          repeater_max_client_id, self.requested_listen_port)
+                                          repeater_max_client_id, self.requested_listen_port,
+                                          message_event=self._wake_event)
         listen_port = self._repeater.listen_port
         if listen_port is not None:
             if self.listen_address_substitute[0] != "":
@@ -262,10 +269,15 @@ class ServiceBase(JsonData):
         self._process_class_factory = ClassFactory([ProcessExec, ProcessPBS, ProcessDocker])
         """process class factory for process start/status/kill"""
 
+        self._config_journal = None
+        """journal of config file"""
+
 
-    def save_config(self):
+    def save_config(self, compact=False):
         """
-        Save config to file.
+        Save config to file, only changes from the last save are appended
+        to the journal of the config file (see state_journal).
+        :param compact: write whole config and empty journal
         :return:
         """
         if len(self.config_file_name) == 0:
@@ -274,9 +286,9 @@ class ServiceBase(JsonData):
         file = os.path.join(self.get_analysis_workspace(),
                             self.workspace,
                             self.config_file_name)
-        os.makedirs(os.path.dirname(file), exist_ok=True)
-        with open(file, 'w') as fd:
-            json.dump(self.serialize(), fd, indent=4, sort_keys=True)
+        if self._config_journal is None or self._config_journal.file != file:
+            self._config_journal = StateJournal(file)
+        self._config_journal.save(self.serialize(), compact=compact)
 
     def _set_status_done(self):
         """
@@ -285,13 +297,14 @@ class ServiceBase(JsonData):
         """
         self.status = ServiceStatus.done
         self.done_time = time.time()
-        self.save_config()
+        self.save_config(compact=True)
         self._closing = True
 
     def run(self):
         """
         Runs service loop.
         Loop running until self._closing is not set.
+        Loop pass is performed at least every 0.1 s or immediately after wake event.
         :return:
         """
         time.sleep(self.wait_before_run)
@@ -303,12 +316,13 @@ class ServiceBase(JsonData):
         # Service processing loop.
         while not self._closing:
             #logging.info("Loop")
+            self._wake_event.clear()
             self.run_body()
 
-            # sleep, not too much
+            # wait for event, not too much
             remaining_time = 0.1 - (time.time() - last_time)
             if remaining_time > 0:
-                time.sleep(remaining_time)
+                self._wake_event.wait(remaining_time)
             last_time = time.time()
 
         self.run_after()
@@ -404,6 +418,14 @@ class ServiceBase(JsonData):
         """
         pass
 
+    def wake(self):
+        """
+        Wake up service processing loop, next pass is performed without waiting.
+        Method is thread safe.
+        :return:
+        """
+        self._wake_event.set()
+
     def _check_connections(self):
         for con in self._connections.values():
             con.get_status()
@@ -3,6 +3,7 @@ from . import config_builder
 from .json_data import JsonData, JsonDataNoConstruct
 from .executor import ProcessDocker
 from .path_converter import if_win_win2lin_conv_path
+from .state_journal import load_state
 from JobPanel.services.backend_service import MJReport
 from JobPanel.services.multi_job_service import MJStatus
 from JobPanel.ui.data.mj_data import MultiJobState
@@ -15,7 +16,6 @@ import threading
 import time
 import logging
 import os
-import json
 import sys
 import random
 import psutil
@@ -61,12 +61,8 @@ class ServiceFrontend(ServiceBase):
                             config_file_name)
         service_data = None
         try:
-            with open(file, 'r') as fd:
-                try:
-                    service_data = json.load(fd)
-                except ValueError:
-                    pass
-        except OSError:
+            service_data = load_state(file)
+        except (OSError, ValueError):
             pass
 
         if service_data is not None:
@@ -286,12 +282,8 @@ class ServiceFrontend(ServiceBase):
                             config_file_name)
         service_data = None
         try:
-            with open(file, 'r') as fd:
-                try:
-                    service_data = json.load(fd)
-                except ValueError:
-                    pass
-        except OSError:
+            service_data = load_state(file)
+        except (OSError, ValueError):
             pass
 
         if service_data is not None:
@@ -1,6 +1,7 @@
 from .service_base import ServiceStatus, call_action
 from .connection import ConnectionStatus, SSHError
 from .json_data import JsonData, JsonDataNoConstruct
+from .state_journal import StateReader, journal_file
 
 import time
 import logging
@@ -100,6 +101,8 @@ class ServiceProxy(JsonData):
         """Config downloaded from service config file"""
         self._download_config_false_time = 0.0
         """Time of unsuccessful attempt of download config"""
+        self._config_reader = None
+        """Incremental reader of downloaded config"""
 
         self._stop_running_offline_counter = 0
         """Counter for determine time to kill service"""
@@ -241,7 +244,8 @@ class ServiceProxy(JsonData):
         self._connection.upload(files,
                                 self._connection._local_service.get_analysis_workspace(),
                                 self._connection.environment.geomop_analysis_workspace,
-                                follow_symlinks=False)
+                                follow_symlinks=False,
+                                skip_unchanged=True)
 
         # 4.
         delegator_proxy.call("request_process_start", process_config, self._results_process_start)
@@ -374,31 +378,53 @@ class ServiceProxy(JsonData):
     def download_config(self):
         """
         Download config file from remote.
+        The journal of config file is downloaded always, the config file
+        only if it was changed, only new changes are read from the journal.
+        If the journal does not match the config file, the config file is
+        downloaded again whole, it could be skipped as unchanged
+        (same size and mtime in seconds) after quick compactions.
         :return:
         """
         if self._connection._status != ConnectionStatus.online:
             return False
+        config_file = os.path.join(self.workspace, self.config_file_name)
         try:
             # todo: presunout stahovani do vlakna, takto muze zaseknout hlavni smycku sluzby
+            try:
+                # journal first, it is checked against config file by reader
+                self._connection.download(
+                    [journal_file(config_file)],
+                    self._connection._local_service.get_analysis_workspace(),
+                    self._connection.environment.geomop_analysis_workspace,
+                    priority=True)
+            except FileNotFoundError:
+                pass
             self._connection.download(
-                [os.path.join(self.workspace, self.config_file_name)],
+                [config_file],
                 self._connection._local_service.get_analysis_workspace(),
                 self._connection.environment.geomop_analysis_workspace,
-                priority=True)
+                priority=True, skip_unchanged=True)
         except (SSHError, FileNotFoundError, PermissionError):
             return False
         file = os.path.join(
             self._connection._local_service.get_analysis_workspace(),
-            self.workspace,
-            self.config_file_name)
-        try:
-            with open(file, 'r') as fd:
-                try:
-                    self._downloaded_config = json.load(fd)
-                except ValueError:
-                    return False
-        except OSError:
+            config_file)
+        if self._config_reader is None or self._config_reader.file != file:
+            self._config_reader = StateReader(file)
+        config = self._config_reader.read()
+        if self._config_reader.mismatch:
+            try:
+                self._connection.download(
+                    [config_file],
+                    self._connection._local_service.get_analysis_workspace(),
+                    self._connection.environment.geomop_analysis_workspace,
+                    priority=True)
+            except (SSHError, FileNotFoundError, PermissionError):
+                return False
+            config = self._config_reader.read()
+        if config is None:
             return False
+        self._downloaded_config = config
         return True
 
     def stop(self):
@@ -0,0 +1,243 @@
+"""
+Journaled storage of service state.
+
+State (JSON data) is stored as a snapshot file and an append-only journal
+file (snapshot file name + JOURNAL_SUFFIX). Each save appends a single line
+with changes of the state against the previous save. The journal is
+compacted (new snapshot is written and the journal is truncated) when it
+grows over the snapshot size or when it is too old.
+
+The first line of the journal identifies the snapshot the changes apply to
+(digest of the snapshot file), so a reader never applies changes to
+a different snapshot. Snapshot without journal is a valid state, so state
+files written by plain json.dump can be read too.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+
+JOURNAL_SUFFIX = ".journal"
+"""suffix of journal file name"""
+
+COMPACT_MIN_SIZE = 64 * 1024
+"""journal smaller than this is never compacted for size [B]"""
+
+COMPACT_PERIOD = 600
+"""maximal age of non empty journal [s]"""
+
+DIFF_DEPTH = 2
+"""changes in dicts nested deeper are stored as whole values"""
+
+
+def journal_file(file):
+    """Return journal file name of the state file."""
+    return file + JOURNAL_SUFFIX
+
+
+def _digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _write_atomic(file, data):
+    tmp_file = "{0}.{1}.tmp".format(file, os.getpid())
+    with open(tmp_file, 'wb') as fd:
+        fd.write(data)
+    os.replace(tmp_file, file)
+
+
+def diff(old, new, depth=DIFF_DEPTH, path=None):
+    """
+    Return list of changes transforming old state to new state.
+    Changes are ["s", path, value] (set) and ["d", path] (delete),
+    path is list of keys.
+    """
+    if path is None:
+        path = []
+    if not (isinstance(old, dict) and isinstance(new, dict)) or depth == 0:
+        if old != new:
+            return [["s", path, new]]
+        return []
+    changes = []
+    for k in old:
+        if k not in new:
+            changes.append(["d", path + [k]])
+    for k, v in new.items():
+        if k not in old:
+            changes.append(["s", path + [k], v])
+        else:
+            changes.extend(diff(old[k], v, depth - 1, path + [k]))
+    return changes
+
+
+def apply_changes(state, changes):
+    """
+    Apply changes made by diff to state, return new state.
+    State is modified in place, if possible.
+    """
+    for change in changes:
+        path = change[1]
+        if len(path) == 0:
+            state = change[2]
+            continue
+        d = state
+        for k in path[:-1]:
+            d = d[k]
+        if change[0] == "s":
+            d[path[-1]] = change[2]
+        else:
+            d.pop(path[-1], None)
+    return state
+
+
+class StateJournal:
+    """
+    Writer of journaled state.
+    Data passed to save must not be modified later, they are kept
+    for computation of next changes.
+    """
+    def __init__(self, file, compact_period=COMPACT_PERIOD):
+        self.file = file
+        """snapshot file"""
+        self.compact_period = compact_period
+        """maximal age of non empty journal [s]"""
+        self._state = None
+        """last saved state, None if files were not written yet"""
+        self._snapshot_size = 0
+        """size of snapshot file"""
+        self._journal_size = 0
+        """size of journal file"""
+        self._journal_time = 0.0
+        """time of the first change in journal"""
+
+    def save(self, data, compact=False):
+        """
+        Save state, only changes against the last save are written.
+        :param data: JSON serializable state
+        :param compact: write snapshot and empty journal
+        :raises OSError:
+        """
+        if compact or self._state is None:
+            self.compact(data)
+            return
+        changes = diff(self._state, data)
+        if len(changes) == 0:
+            return
+        line = (json.dumps(changes, separators=(',', ':'), sort_keys=True) + "\n").encode()
+        if self._journal_size > max(COMPACT_MIN_SIZE, self._snapshot_size) or \
+                (self._journal_size > 0 and time.time() > self._journal_time + self.compact_period):
+            self.compact(data)
+            return
+        with open(journal_file(self.file), 'ab') as fd:
+            fd.write(line)
+        if self._journal_size == 0:
+            self._journal_time = time.time()
+        self._journal_size += len(line)
+        self._state = data
+
+    def compact(self, data):
+        """
+        Write whole state to snapshot and start new journal.
+        :raises OSError:
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(self.file)), exist_ok=True)
+        snapshot = json.dumps(data, separators=(',', ':'), sort_keys=True).encode()
+        header = {"snapshot": _digest(snapshot), "time": time.time()}
+        # snapshot first, reader check journal header against it
+        _write_atomic(self.file, snapshot)
+        _write_atomic(journal_file(self.file), (json.dumps(header) + "\n").encode())
+        self._state = data
+        self._snapshot_size = len(snapshot)
+        self._journal_size = 0
+
+
+class StateReader:
+    """
+    Incremental reader of journaled state. Snapshot is read only if it
+    was changed, from journal only new changes are applied.
+    """
+    def __init__(self, file):
+        self.file = file
+        """snapshot file"""
+        self._state = None
+        """current state"""
+        self._header = None
+        """header of journal matching current state"""
+        self._n_applied = 0
+        """number of journal lines applied to state"""
+        self._snapshot_stat = None
+        """(size, mtime) of read snapshot"""
+        self.mismatch = False
+        """True if the last read found journal of another snapshot"""
+
+    def read(self):
+        """
+        Read state changes.
+        :return: current state, None if state can't be read
+        """
+        self.mismatch = False
+        try:
+            with open(journal_file(self.file), 'rb') as fd:
+                lines = fd.read().split(b"\n")
+        except OSError:
+            lines = []
+        # last item is not terminated line, it is incomplete
+        lines = lines[:-1]
+        header = None
+        if len(lines) > 0:
+            try:
+                header = json.loads(lines[0].decode())
+            except ValueError:
+                pass
+
+        try:
+            stat = os.stat(self.file)
+            snapshot_stat = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            snapshot_stat = None
+        if header is None or header != self._header or snapshot_stat != self._snapshot_stat:
+            # new snapshot
+            self._header = None
+            self._n_applied = 0
+            self._snapshot_stat = snapshot_stat
+            try:
+                with open(self.file, 'rb') as fd:
+                    snapshot = fd.read()
+                self._state = json.loads(snapshot.decode())
+            except (OSError, ValueError):
+                self._state = None
+                self._snapshot_stat = None
+                return None
+            if header is None:
+                return self._state
+            if header.get("snapshot") != _digest(snapshot):
+                # journal belongs to another snapshot
+                self.mismatch = True
+                return self._state
+            self._header = header
+            self._n_applied = 1
+
+        for line in lines[self._n_applied:]:
+            try:
+                changes = json.loads(line.decode())
+            except ValueError:
+                break
+            self._state = apply_changes(self._state, changes)
+            self._n_applied += 1
+        return self._state
+
+
+def load_state(file):
+    """
+    Return state stored in file and its journal.
+    :raises OSError: if state can't be read
+    :raises ValueError: if snapshot is not valid JSON
+    """
+    state = StateReader(file).read()
+    if state is None:
+        # get original exception
+        with open(file, 'r') as fd:
+            return json.load(fd)
+    return state
@@ -1,4 +1,5 @@
 from gm_base.global_const import GEOMOP_INTERNAL_DIR_NAME
+from JobPanel.backend.state_journal import load_state
 
 import json
 import os
@@ -259,6 +260,10 @@ class JobState:
         """Job run time from start in second"""
         self.status = TaskStatus.none
         """job status"""
+        self.cpu_percent = 0.0
+        """CPU usage of running job in percent of one CPU"""
+        self.rss = 0
+        """resident memory of running job [B]"""
         if install:
             self.status = TaskStatus.installation
 
@@ -288,11 +293,13 @@ class JobsState:
         """Job data serialization"""       
         file = os.path.join(conf_dir, GEOMOP_INTERNAL_DIR_NAME, "jobs_states.json")
         try:
-            with open(file, "r") as json_file:
-                data = json.load(json_file)
-                for job in data:
-                    obj = JobState(job['name'])
-                    obj.__dict__=job
-                    self.jobs.append(obj)                
+            data = load_state(file)
+            if isinstance(data, dict):
+                # jobs states by job id
+                data = [data[k] for k in sorted(data, key=lambda k: (len(k), k))]
+            for job in data:
+                obj = JobState(job['name'])
+                obj.__dict__.update(job)
+                self.jobs.append(obj)
         except:
             pass
@@ -2,7 +2,6 @@ import sys
 import os
 import logging
 import traceback
-import json
 import time
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
@@ -10,6 +9,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath
 from JobPanel.backend.service_base import ServiceBase, LongRequest, ServiceStatus
 from JobPanel.backend.json_data import JsonData, JsonDataNoConstruct
 from JobPanel.backend.service_proxy import ServiceProxy
+from JobPanel.backend.state_journal import StateJournal, load_state
 from JobPanel.services.multi_job_service import JobReport, JobStatus, MJStatus
 from JobPanel.data.states import TaskStatus
 from JobPanel.backend.connection import (ConnectionStatus, SSHError, SSHAuthenticationError, SSHWorkspaceError,
@@ -61,6 +61,16 @@ class MJInfo(JsonData):
         self._jobs_report_time = 0.0
         """Last time request_get_jobs_report sent or report retrieved from proxy._downloaded_config"""
 
+        self._jobs_states_journal = None
+        """journal of jobs states file"""
+
+        self._jobs_report_epoch = None
+        """epoch of jobs report sequence of MJ service"""
+        self._jobs_report_seq = 0
+        """last seen sequence number of jobs report changes"""
+        self._running_jobs = set()
+        """ids of running jobs, their run interval has to be updated"""
+
 
 class MJReport(JsonData):
     """
@@ -217,19 +227,19 @@ class Backend(ServiceBase):
                 else:
                     jobs_report = res["data"]
                     mj.n_jobs = jobs_report["n_jobs"]
+                    if jobs_report["epoch"] != mj._jobs_report_epoch:
+                        mj._jobs_report_epoch = jobs_report["epoch"]
+                        mj._jobs_report_seq = 0
+                    mj._jobs_report_seq = max(mj._jobs_report_seq, jobs_report["seq"])
                     new_jobs_report = JsonData.construct_dict(JobReport(), jobs_report["reports"])
                     self._update_jobs_report(mj, new_jobs_report)
 
             if time.time() > mj._jobs_report_time + 2:
                 if mj.proxy._online:
-                    # send request
-                    job_id_list = []
-                    for i in range(1, mj.n_jobs + 1):
-                        id = str(i)
-                        if (id not in mj._jobs_report) or \
-                                (mj._jobs_report[id].status not in [JobStatus.done, JobStatus.error]):
-                            job_id_list.append(id)
-                    mj.proxy.call("request_get_jobs_report", job_id_list, mj._results_get_jobs_report)
+                    # send request, only changes since last seen sequence number are returned
+                    mj.proxy.call("request_get_jobs_report_changes",
+                                  {"epoch": mj._jobs_report_epoch, "seq": mj._jobs_report_seq},
+                                  mj._results_get_jobs_report)
                 else:
                     # get data from config file
                     conf = mj.proxy._downloaded_config
@@ -257,10 +267,19 @@ class Backend(ServiceBase):
                 if (v.status in [JobStatus.done, JobStatus.error]) and (v.name not in mj.job_log_planed_to_download):
                     mj.files_to_download.append(os.path.join(v.name, GEOMOP_INTERNAL_DIR_NAME, "job_service.log"))
                     mj.job_log_planed_to_download.append(v.name)
-
-            # We need update run_interval
-            if v.status in [JobStatus.running, JobStatus.downloading_result]:
-                changed = True
+            elif v.status == mj._jobs_report[k].status:
+                # resource usage of running job
+                mj._jobs_report[k].cpu_percent = v.cpu_percent
+                mj._jobs_report[k].rss = v.rss
+
+            if mj._jobs_report[k].status in [JobStatus.running, JobStatus.downloading_result]:
+                mj._running_jobs.add(k)
+            else:
+                mj._running_jobs.discard(k)
+
+        # We need update run_interval
+        if len(mj._running_jobs) > 0:
+            changed = True
         if changed:
             self._save_jobs_states(mj)
             mj.jobs_report_save_counter += 1
@@ -272,7 +291,7 @@ class Backend(ServiceBase):
         :param mj:
         :return:
         """
-        jobs_states = []
+        jobs_states = {}
         for k, v in mj._jobs_report.items():
             # status
             status = TaskStatus.none
@@ -299,17 +318,20 @@ class Backend(ServiceBase):
                  "insert_time": v.insert_time,
                  "queued_time": v.queued_time,
                  "start_time": v.start_time,
-                 "run_interval": run_interval}
-            jobs_states.append(d)
+                 "run_interval": run_interval,
+                 "cpu_percent": v.cpu_percent,
+                 "rss": v.rss}
+            jobs_states[k] = d
 
-        # save to file
+        # save to file, only changed states are appended to journal
         file = os.path.join(self.get_analysis_workspace(),
                             mj.proxy.workspace,
                             GEOMOP_INTERNAL_DIR_NAME,
                             "jobs_states.json")
+        if mj._jobs_states_journal is None or mj._jobs_states_journal.file != file:
+            mj._jobs_states_journal = StateJournal(file)
         try:
-            with open(file, 'w') as fd:
-                json.dump(jobs_states, fd, indent=4, sort_keys=True)
+            mj._jobs_states_journal.save(jobs_states)
         except Exception as e:
             logging.error("Jobs states saving error: {0}".format(e))
 
@@ -567,12 +589,15 @@ class Backend(ServiceBase):
 
         con = mj.proxy._connection
         if (con is not None) and (con._status == ConnectionStatus.online):
+            mj_dir = os.path.basename(os.path.normpath(mj.proxy.workspace))
             try:
-                con.download(
-                    [os.path.basename(os.path.normpath(mj.proxy.workspace))],
+                con.sync_download(
+                    [mj_dir],
                     os.path.join(self.get_analysis_workspace(), mj.proxy.workspace, ".."),
                     os.path.join(con.environment.geomop_analysis_workspace, mj.proxy.workspace, ".."),
-                    follow_symlinks=False)
+                    follow_symlinks=False,
+                    compress=True,
+                    cache_dir=os.path.join(mj_dir, GEOMOP_INTERNAL_DIR_NAME))
             except (SSHError, FileNotFoundError, PermissionError):
                 return "Error in downloading MJ data."
         else:
@@ -652,8 +677,7 @@ if __name__ == "__main__":
 
     try:
         input_file = os.path.join(GEOMOP_INTERNAL_DIR_NAME, "backend_service.conf")
-        with open(input_file, "r") as f:
-            config = json.load(f)
+        config = load_state(input_file)
 
         # set log level
         if "log_all" in config and config["log_all"]:
@@ -6,7 +6,6 @@ import sys
 import os
 import logging
 import threading
-import json
 import traceback
 import psutil
 import subprocess
@@ -17,6 +16,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath
 
 from JobPanel.backend import service_base
 from JobPanel.backend.executor import Executable, ExecArgs
+from JobPanel.backend.state_journal import load_state
 from gm_base.global_const import GEOMOP_INTERNAL_DIR_NAME
 
 
@@ -149,8 +149,7 @@ def job_main():
     input_file = os.path.join(GEOMOP_INTERNAL_DIR_NAME, "job_service.conf")
     if len(sys.argv) >  1:
         input_file = sys.argv[1]
-    with open(input_file, "r") as f:
-        config = json.load(f)
+    config = load_state(input_file)
 
     # set log level
     if "log_all" in config and config["log_all"]:
@@ -1,22 +1,29 @@
 import sys
 import os
 import logging
-import json
 import traceback
 import enum
 import shutil
 import time
+import random
+import collections
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
 
 from JobPanel.backend.service_base import ServiceBase, ServiceStatus, LongRequest
 from JobPanel.backend.json_data import JsonData, ClassFactory, JsonDataNoConstruct
-from JobPanel.backend.connection import ConnectionStatus, SSHError
+from JobPanel.backend.connection import ConnectionStatus, SSHError, ConnectionLocal
+from JobPanel.backend.executor import local_process_poller
+from JobPanel.backend.state_journal import load_state
 from Analysis.pipeline.pipeline_processor import Pipelineprocessor
 from Analysis.pipeline import *
 from gm_base.global_const import GEOMOP_INTERNAL_DIR_NAME
 
 
+RESOURCES_PERIOD = 5.0
+"""period of sampling resource usage of running local jobs [s]"""
+
+
 class MJStatus(enum.IntEnum):
     """
     State of a multi job.
@@ -41,6 +48,16 @@ class JobStatus(enum.IntEnum):
     stopped = 7
 
 
+class DispatchMode(enum.IntEnum):
+    """
+    Mode of dispatching jobs.
+    """
+    throttled = 1
+    """At most one job is started per 10 passes of service loop."""
+    immediate = 2
+    """All free job slots are filled in every pass of service loop."""
+
+
 class JobInfo:
     """
     Job info struct.
@@ -65,6 +82,10 @@ class JobReport(JsonData):
         self.queued_time = 0.0
         self.start_time = 0.0
         self.done_time = 0.0
+        self.cpu_percent = 0.0
+        """CPU usage of job process and its descendants in percent of one CPU"""
+        self.rss = 0
+        """resident memory of job process and its descendants [B]"""
 
         super().__init__(config)
 
@@ -80,6 +101,37 @@ class JobReport(JsonData):
     #         return NotImplemented
 
 
+class DispatchStats(JsonData):
+    """
+    Crate for job dispatch metrics.
+    Dispatch latency is time between moment when job could be started
+    (job is ready and job slot is free) and its start.
+    """
+    def __init__(self, config={}):
+        self.n_dispatched = 0
+        """number of dispatched jobs"""
+        self.latency_sum = 0.0
+        """sum of dispatch latencies"""
+        self.latency_max = 0.0
+        """maximal dispatch latency"""
+
+        super().__init__(config)
+
+    def add(self, latency):
+        """Add dispatch latency of one job."""
+        self.n_dispatched += 1
+        self.latency_sum += latency
+        if latency > self.latency_max:
+            self.latency_max = latency
+
+    @property
+    def latency_mean(self):
+        """Mean dispatch latency."""
+        if self.n_dispatched == 0:
+            return 0.0
+        return self.latency_sum / self.n_dispatched
+
+
 class MultiJob(ServiceBase):
     def __init__(self, config):
         self.pipeline = {"python_script": "",
@@ -101,6 +153,12 @@ class MultiJob(ServiceBase):
         self.reuse_mj = ""
         """If not empty, base computation on this MJ."""
 
+        self.dispatch_mode = DispatchMode.immediate
+        """mode of dispatching jobs"""
+
+        self.dispatch_stats = DispatchStats()
+        """job dispatch metrics"""
+
         super().__init__(config)
 
         # JsonData dict workaround
@@ -116,6 +174,17 @@ class MultiJob(ServiceBase):
         self._last_config_saved = 0.0
 
         self._counter = 0
+        self._slots_full_time = 0.0
+        """last time when all job slots were occupied"""
+
+        self._jobs_report_epoch = "{:016x}".format(random.getrandbits(64))
+        """identifier of jobs report sequence, changed when service is restarted"""
+        self._jobs_report_seq = 0
+        """sequence number of the last jobs report change"""
+        self._jobs_report_changes = collections.OrderedDict()
+        """job id => sequence number of its last report change, ordered by sequence number"""
+        self._resources_time = 0.0
+        """last time of sampling resource usage of jobs"""
 
     def _do_work(self):
         if self.status == ServiceStatus.done:
@@ -131,14 +200,19 @@ class MultiJob(ServiceBase):
         # running
         elif self.mj_status == MJStatus.running:
             self.check_jobs()
+            if time.time() > self._resources_time + RESOURCES_PERIOD:
+                self.sample_jobs_resources()
+                self._resources_time = time.time()
+            if self._n_running_jobs >= self.max_n_jobs:
+                self._slots_full_time = time.time()
             if self._pipeline_processor.is_run():
-                self._counter += 1
-                if self._counter >= 10:
-                    if self._n_running_jobs < self.max_n_jobs:
-                        runner = self._pipeline_processor.get_next_job()
-                        if runner is not None:
-                            self.run_job(runner)
-                    self._counter = 0
+                if self.dispatch_mode == DispatchMode.immediate:
+                    self.dispatch_jobs()
+                else:
+                    self._counter += 1
+                    if self._counter >= 10:
+                        self.dispatch_jobs(1)
+                        self._counter = 0
             else:
                 if len(self._jobs) == 0:
                     assert self._n_running_jobs == 0
@@ -160,6 +234,25 @@ class MultiJob(ServiceBase):
             self._config_changed = False
             self._last_config_saved = time.time()
 
+    def dispatch_jobs(self, max_jobs=None):
+        """
+        Start ready jobs while free job slots are available.
+        :param max_jobs: maximal number of started jobs, None means unlimited
+        :return: number of started jobs
+        """
+        n = 0
+        while self._n_running_jobs < self.max_n_jobs and (max_jobs is None or n < max_jobs):
+            runner = self._pipeline_processor.get_next_job()
+            if runner is None:
+                break
+            now = time.time()
+            self.dispatch_stats.add(now - max(runner.create_time, self._slots_full_time))
+            self.run_job(runner)
+            n += 1
+        if n > 0:
+            self._config_changed = True
+        return n
+
     def run_pipeline(self):
         # run script
         try:
@@ -324,6 +417,17 @@ class MultiJob(ServiceBase):
         job_report.name = runner.work_dir
         job_report.insert_time = time.time()
         self.jobs_report[str(job_id)] = job_report
+        self._jobs_report_changed(str(job_id))
+
+    def _jobs_report_changed(self, job_id):
+        """
+        Record change of job report.
+        :param job_id: job id (str)
+        :return:
+        """
+        self._jobs_report_seq += 1
+        self._jobs_report_changes[job_id] = self._jobs_report_seq
+        self._jobs_report_changes.move_to_end(job_id)
 
     def check_jobs(self):
         """
@@ -333,6 +437,7 @@ class MultiJob(ServiceBase):
         for job_id in list(self._jobs.keys()):
             job_info = self._jobs[job_id]
             job_report = self.jobs_report[str(job_id)]
+            report_state = (job_report.status, job_report.queued_time, job_report.start_time, job_report.done_time)
 
             # starting
             if job_info.status == JobStatus.starting:
@@ -440,6 +545,38 @@ class MultiJob(ServiceBase):
                     job_report.done_time = time.time()
                     self._config_changed = True
 
+            if report_state != (job_report.status, job_report.queued_time, job_report.start_time,
+                                job_report.done_time):
+                self._jobs_report_changed(str(job_id))
+
+    def sample_jobs_resources(self):
+        """
+        Sample CPU and memory usage of running jobs started on this machine,
+        status of all jobs is obtained by single process table scan.
+        :return:
+        """
+        jobs = {}
+        for job_id, job_info in self._jobs.items():
+            if job_info.status != JobStatus.running:
+                continue
+            proxy = self._child_services.get(job_info.child_id)
+            # only local processes have id "pid@create_time"
+            if (proxy is None) or (not isinstance(proxy._connection, ConnectionLocal)) or \
+                    ("@" not in proxy.process_id):
+                continue
+            jobs[proxy.process_id] = str(job_id)
+        if len(jobs) == 0:
+            return
+
+        status = local_process_poller.get_status(list(jobs.keys()))
+        for process_id, job_id in jobs.items():
+            s = status[process_id]
+            if s["running"]:
+                job_report = self.jobs_report[job_id]
+                job_report.cpu_percent = s["cpu_percent"]
+                job_report.rss = s["rss"]
+                self._jobs_report_changed(job_id)
+
     @LongRequest
     def request_download_job_result(self, job_id):
         """
@@ -454,9 +591,10 @@ class MultiJob(ServiceBase):
             return False
         try:
             # output files
-            con.download(self._jobs[job_id].runner.output_files,
-                         os.path.join(loc_an_work, self._jobs[job_id].job_dir),
-                         os.path.join(rem_an_work, self._jobs[job_id].job_dir))
+            con.sync_download(self._jobs[job_id].runner.output_files,
+                              os.path.join(loc_an_work, self._jobs[job_id].job_dir),
+                              os.path.join(rem_an_work, self._jobs[job_id].job_dir),
+                              cache_dir=GEOMOP_INTERNAL_DIR_NAME)
 
             # log file
             con.download([os.path.join(self._jobs[job_id].job_dir, GEOMOP_INTERNAL_DIR_NAME, "job_service.log")],
@@ -478,6 +616,26 @@ class MultiJob(ServiceBase):
                 reports[id] = self.jobs_report[id].serialize()
         return {"reports": reports, "n_jobs": len(self.jobs_report)}
 
+    def request_get_jobs_report_changes(self, data):
+        """
+        Return reports of jobs changed since given sequence number.
+        All reports are returned if epoch is different from current
+        epoch (service was restarted or data are from another service).
+        :param data: {"epoch": epoch, "seq": last seen sequence number}
+        :return: {"epoch": epoch, "seq": current sequence number, "reports": reports, "n_jobs": n_jobs}
+        """
+        reports = {}
+        if data["epoch"] != self._jobs_report_epoch:
+            for id, job_report in self.jobs_report.items():
+                reports[id] = job_report.serialize()
+        else:
+            for id, seq in reversed(self._jobs_report_changes.items()):
+                if seq <= data["seq"]:
+                    break
+                reports[id] = self.jobs_report[id].serialize()
+        return {"epoch": self._jobs_report_epoch, "seq": self._jobs_report_seq,
+                "reports": reports, "n_jobs": len(self.jobs_report)}
+
     def request_stop(self, data):
         if self.mj_status != MJStatus.stopping:
             self.mj_status = MJStatus.stopping
@@ -494,8 +652,7 @@ if __name__ == "__main__":
 
     try:
         input_file = os.path.join(GEOMOP_INTERNAL_DIR_NAME, "mj_service.conf")
-        with open(input_file, "r") as f:
-            config = json.load(f)
+        config = load_state(input_file)
 
         # set log level
         if "log_all" in config and config["log_all"]:
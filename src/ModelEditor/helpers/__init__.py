@@ -8,3 +8,4 @@ from .subyaml.line_analyzer import LineAnalyzer
 from .subyaml.change_analyzer import ChangeAnalyzer
 from .subyaml.structure_analyzer import StructureAnalyzer
 from .subyaml.node_analyzer import NodeAnalyzer
+from .incremental_update import IncrementalUpdater
@@ -0,0 +1,265 @@
+"""Incremental update of the data node tree."""
+
+from gm_base.geomop_util import Position
+from gm_base.model_data import DataNode, Loader, NotificationHandler
+from gm_base.model_data.autoconversion import AutoConverter, ScalarConverter
+
+from .subyaml.structure_analyzer import StructureAnalyzer
+
+
+_OTHER_LINE_BREAKS = '\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029'
+"""line breaks of str.splitlines or YAML, documents containing them are reloaded fully"""
+
+
+class IncrementalUpdater:
+    """
+    Updates the loaded, autoconverted and validated node tree after
+    the document is changed.
+
+    Only the smallest block (record key with its value written on whole lines)
+    containing all changed lines is loaded again, the new node replaces
+    the original one and it is autoconverted and validated. Positions and
+    notifications after the block are shifted. If the change affects the
+    surrounding structure (key of the block, indentation, anchors, flow style,
+    syntax errors, ...) the update is refused and a full update is needed.
+    """
+
+    def __init__(self, validator, notification_handler):
+        """Initializes the updater with the validator and NotificationHandler."""
+        self.validator = validator
+        self.notification_handler = notification_handler
+
+    def update(self, old_document, new_document, root):
+        """
+        Updates the tree `root` loaded from `old_document` to `new_document`.
+
+        :return: the new node of the reloaded block, `root` if documents
+            are equal or None if a full update is needed
+        """
+        if old_document == new_document:
+            return root
+        if root is None or root.implementation != DataNode.Implementation.mapping:
+            return None
+        if any(notification.name == 'SyntaxFatalError'
+               for notification in self.notification_handler.notifications):
+            return None
+        for char in _OTHER_LINE_BREAKS:
+            if char in old_document or char in new_document:
+                return None
+        old_lines = old_document.split('\n')
+        new_lines = new_document.split('\n')
+
+        # changed lines range
+        prefix = 0
+        max_common = min(len(old_lines), len(new_lines))
+        while prefix < max_common and old_lines[prefix] == new_lines[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < max_common - prefix and \
+                old_lines[-suffix - 1] == new_lines[-suffix - 1]:
+            suffix += 1
+        old_changed_end = len(old_lines) - suffix
+        delta = len(new_lines) - len(old_lines)
+
+        for node, begin, end in reversed(self._enclosing_blocks(
+                old_lines, root, prefix, old_changed_end)):
+            new_end = self._block_end(new_lines, begin)
+            if new_end != end + delta:
+                continue
+            new_node, notifications = self._load_block(new_lines, node, begin, new_end)
+            if new_node is None:
+                return None
+            if not self._replace_node(node, new_node, notifications,
+                                      begin, end, delta, new_lines):
+                return None
+            return new_node
+        return None
+
+    def _enclosing_blocks(self, lines, root, begin, end):
+        """
+        Returns list of (node, begin line, end line) of blocks containing
+        line range [begin, end), from the largest to the smallest.
+        """
+        blocks = []
+        parent = root
+        while parent.implementation == DataNode.Implementation.mapping and \
+                parent.origin == DataNode.Origin.structure:
+            if any(child.origin in (DataNode.Origin.duplicit, DataNode.Origin.redefination)
+                   for child in parent.children):
+                break
+            enclosing = None
+            for child in parent.children:
+                if child.origin != DataNode.Origin.structure or child.is_flow or \
+                        child.key.span is None or child.span is None:
+                    continue
+                block_begin = child.key.span.start.line - 1
+                if block_begin > begin:
+                    continue
+                block_end = self._block_end(lines, block_begin, child.key.span.start.column - 1)
+                if block_end is not None and end <= block_end and \
+                        self._node_in_block(lines, child, block_end):
+                    enclosing = (child, block_begin, block_end)
+                    break
+            if enclosing is None:
+                break
+            blocks.append(enclosing)
+            parent = enclosing[0]
+        return blocks
+
+    @staticmethod
+    def _indentation(line):
+        """Returns the indentation of the line, or None for blank and comment lines."""
+        content = line.lstrip(' ')
+        if content == '' or content.startswith('#'):
+            return None
+        return len(line) - len(content)
+
+    @classmethod
+    def _block_end(cls, lines, begin, column=None):
+        """
+        Returns the index of the first line after the block that starts
+        with record key at line `begin`. The key has to be the first
+        token on the line (at `column` if specified). Returns None if
+        the block is not followed by any content.
+        """
+        if begin >= len(lines):
+            return None
+        indent = cls._indentation(lines[begin])
+        if indent is None or (column is not None and indent != column):
+            return None
+        for i in range(begin + 1, len(lines)):
+            line_indent = cls._indentation(lines[i])
+            if line_indent is None or line_indent > indent:
+                continue
+            content = lines[i][line_indent:]
+            if line_indent == indent and (content == '-' or content.startswith('- ')):
+                continue
+            return i
+        return None
+
+    def _node_in_block(self, lines, node, end):
+        """Returns True if the node ends in the block ending before line `end`."""
+        next_start = Position(end + 1, self._indentation(lines[end]) + 1)
+        return node.span.end <= next_start
+
+    def _load_block(self, lines, node, begin, end):
+        """
+        Loads the block of lines [begin, end), returns the new node and its
+        notifications. The node is None if the block is not a single record
+        key equal to the key of `node`.
+        """
+        indent = self._indentation(lines[begin])
+        block_lines = []
+        for line in lines[begin:end]:
+            line_indent = len(line) - len(line.lstrip(' '))
+            block_lines.append(line[min(indent, line_indent):])
+        handler = NotificationHandler()
+        loader = Loader(handler)
+        block_root = loader.load('\n'.join(block_lines) + '\n')
+        if block_root is None or loader.anchors or \
+                block_root.implementation != DataNode.Implementation.mapping or \
+                len(block_root.children) != 1:
+            return None, None
+        notifications = handler.notifications
+        if any(notification.name == 'SyntaxFatalError' for notification in notifications):
+            return None, None
+        new_node = block_root.children[0]
+        if new_node.key.value != node.key.value or \
+                new_node.origin != DataNode.Origin.structure:
+            return None, None
+
+        # shift positions from block to document
+        block_end = Position(len(block_lines) + 1, 1)
+        next_start = Position(end + 1, self._indentation(lines[end]) + 1)
+        for position in self._positions([new_node], notifications):
+            if position == block_end:
+                position.line = next_start.line
+                position.column = next_start.column
+            else:
+                position.line += begin
+                position.column += indent
+        if new_node.key.span.start != node.key.span.start or \
+                not new_node.span.end <= next_start:
+            return None, None
+        return new_node, notifications
+
+    def _replace_node(self, node, new_node, notifications, begin, end, delta, lines):
+        """
+        Replaces `node` of block [begin, end) in the tree by `new_node`
+        with its loading `notifications`, shifts the positions after the block,
+        and autoconverts and validates the new node. Returns False if a full
+        update is needed.
+        """
+        parent = node.parent
+        input_type = parent.input_type
+        if input_type is None or input_type.get('base_type') != 'Record' or \
+                node.key.value not in input_type['keys']:
+            return False
+        child_input_type = input_type['keys'][node.key.value]['type']
+
+        # remove notifications of the block
+        block_start = Position(begin + 1, 1)
+        block_end = Position(end + 1, self._indentation(lines[end + delta]) + 1)
+        kept_spans = []
+        ancestor = parent
+        while ancestor is not None:
+            kept_spans.append(ancestor.notification_span)
+            ancestor = ancestor.parent
+        removed = []
+        for notification in self.notification_handler.notifications:
+            span = notification.span
+            if span is None or span.start is None or span.end is None:
+                continue
+            if block_start <= span.start and span.end <= block_end and \
+                    not any(kept is not None and kept.start == span.start and
+                            kept.end == span.end for kept in kept_spans):
+                removed.append(notification)
+        self.notification_handler.discard(removed)
+
+        # shift positions after the block
+        if delta != 0:
+            root = parent
+            while root.parent is not None:
+                root = root.parent
+            for position in self._positions(
+                    [root], self.notification_handler.notifications, skip=node):
+                if position.line > end:
+                    position.line += delta
+
+        for notification in notifications:
+            self.notification_handler.report(notification)
+        parent.set_child(new_node)
+        ScalarConverter._replace_empty(parent, input_type)
+        new_node = parent.get_child(node.key.value)
+        AutoConverter._autoconvert(parent, new_node, child_input_type)
+        if parent.get_child(node.key.value) is not new_node:
+            return False
+        self.validator.validate_subtree(new_node, child_input_type)
+        StructureAnalyzer.add_subtree_info(lines, new_node, self.notification_handler)
+        return True
+
+    @staticmethod
+    def _positions(nodes, notifications, skip=None):
+        """Returns all distinct positions of node subtrees and notifications."""
+        positions = {}
+
+        def add_span(span):
+            if span is not None:
+                for position in (span.start, span.end):
+                    if position is not None:
+                        positions[id(position)] = position
+
+        stack = list(nodes)
+        while stack:
+            node = stack.pop()
+            if node is skip:
+                continue
+            add_span(node.span)
+            add_span(node.delimiters)
+            for value in (node.key, node.anchor, node.type):
+                if value is not None:
+                    add_span(value.span)
+            stack.extend(node.children)
+        for notification in notifications:
+            add_span(notification.span)
+        return positions.values()
@@ -64,6 +64,12 @@ class StructureAnalyzer:
         if root.implementation != DataNode.Implementation.scalar:
             cls._analyze_node(lines, root, notification_handler)
 
+    @classmethod
+    def add_subtree_info(cls, lines, node, notification_handler):
+        """Add border information about nodes of the subtree, lines are document lines"""
+        if node.implementation != DataNode.Implementation.scalar:
+            cls._analyze_node(lines, node, notification_handler)
+
     @classmethod
     def _analyze_node(cls, lines, node, notification_handler):
         """Node analysis is performed recursively"""
@@ -16,13 +16,17 @@ class InfoTextGenerator:
     _input_types = {}
 
     @classmethod
-    def init(cls, json_text):
-        """Initializes the class with format information."""
-        data = json.loads(json_text)
-        assert 'ist_nodes' in data
-        for item in data['ist_nodes']:
-            if 'id' in item:
-                cls._input_types[item['id']] = item
+    def init(cls, json_text=None, ist_nodes=None):
+        """Initializes the class with format information.
+
+        Already parsed IST nodes by id (see :py:func:`gm_base.model_data.format.load_format`) can be
+        passed instead of `json_text`.
+        """
+        if ist_nodes is None:
+            data = json.loads(json_text)
+            assert 'ist_nodes' in data
+            ist_nodes = {item['id']: item for item in data['ist_nodes'] if 'id' in item}
+        cls._input_types.update(ist_nodes)
 
     @classmethod
     def get_info_text(cls, record_id=None, selected_key=None, abstract_id=None, selected_item=None,
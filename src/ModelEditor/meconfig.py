@@ -11,7 +11,7 @@ from copy import deepcopy
 
 import gm_base.config as base_cfg
 from ModelEditor.data import Transformator, TransformationFileFormatError
-from ModelEditor.helpers import AutocompleteHelper, StructureAnalyzer
+from ModelEditor.helpers import AutocompleteHelper, StructureAnalyzer, IncrementalUpdater
 from gm_base.geomop_shortcuts import shortcuts
 from ModelEditor.helpers import keyboard_shortcuts_definition as shortcuts_definition
 from ModelEditor.ist import InfoTextGenerator
@@ -20,7 +20,7 @@ from ModelEditor.util import constants
 from gm_base.geomop_util.logging import LOGGER_PREFIX
 from gm_base.geomop_util import Serializable
 from gm_base.geomop_analysis import Analysis, InvalidAnalysis
-from gm_base.model_data import (export_con, Loader, Validator, get_root_input_type_from_json,
+from gm_base.model_data import (export_con, Loader, Validator, load_format, clear_type_plans,
                         autoconvert, notification_handler, Notification)
 from gm_base.model_data.import_json import parse_con, fix_tags, rewrite_comments, fix_intendation
 
@@ -259,6 +259,10 @@ class MEConfig:
     """loader of YAML files"""
     validator = Validator(notification_handler)
     """data validator"""
+    incremental_updater = IncrementalUpdater(validator, notification_handler)
+    """updater of changed blocks of node tree"""
+    updated_document = None
+    """document of the last complete update, base for incremental update"""
     root_input_type = None
     """input type of the whole tree, parsed from format"""
     resource_dir = os.path.join(
@@ -266,6 +270,8 @@ class MEConfig:
     """path to a folder containing ME resources"""
     format_dir = os.path.join(resource_dir, '..', '..', 'gm_base', 'resources', 'ist')
     """path to a folder containing IST files"""
+    format_cache_dir = os.path.join(base_cfg.__config_dir__, 'format_cache')
+    """path to a folder containing pickled parsed IST files"""
     transformation_dir = os.path.join(resource_dir, 'transformation')
     """path to a folder containing transformation files"""
     stylesheet_dir = os.path.join(resource_dir, 'css')
@@ -581,8 +587,16 @@ class MEConfig:
         return True
 
     @classmethod
-    def update(cls):
-        """reread yaml text and update node tree"""
+    def update(cls, incremental=False):
+        """
+        reread yaml text and update node tree
+
+        If incremental is True, only the changed block of the document
+        is reread if possible (see :py:class:`IncrementalUpdater`).
+        """
+        if incremental and cls._update_incremental():
+            return
+        cls.updated_document = None
         cls.notification_handler.clear()
         cls.root = cls.loader.load(cls.document)
         cls.autocomplete_helper.clear_anchors()
@@ -593,8 +607,38 @@ class MEConfig:
             return
         cls.root = autoconvert(cls.root, cls.root_input_type)
         cls.validator.validate(cls.root, cls.root_input_type)
+        cls._check_flow123d_version()
+
+        # handle parameters
+        # if (Analysis.current is not None and
+        #         Analysis.current.is_abs_path_in_analysis_dir(cls.curr_file)):
+        #     Analysis.current.merge_params(cls.validator.params)
 
-        # flow123d_version notifications
+        StructureAnalyzer.add_node_info(cls.document, cls.root, cls.notification_handler)
+        cls.notifications = cls.notification_handler.notifications
+        cls.updated_document = cls.document
+
+    @classmethod
+    def _update_incremental(cls):
+        """
+        Update node tree by changed block of the document, return False
+        if the full update is needed.
+        """
+        if cls.updated_document is None or cls.root is None or \
+                cls.root_input_type is None or len(cls.loader.anchors) > 0:
+            return False
+        node = cls.incremental_updater.update(cls.updated_document, cls.document, cls.root)
+        if node is None:
+            return False
+        if node.absolute_path == '/flow123d_version':
+            cls._check_flow123d_version()
+        cls.updated_document = cls.document
+        cls.notifications = cls.notification_handler.notifications
+        return True
+
+    @classmethod
+    def _check_flow123d_version(cls):
+        """report flow123d_version notifications"""
         try:
             node = cls.root.get_node_at_path('/flow123d_version')
         except LookupError:
@@ -606,14 +650,6 @@ class MEConfig:
                 ntf.span = node.span
                 cls.notification_handler.report(ntf)
 
-        # handle parameters
-        # if (Analysis.current is not None and
-        #         Analysis.current.is_abs_path_in_analysis_dir(cls.curr_file)):
-        #     Analysis.current.merge_params(cls.validator.params)
-
-        StructureAnalyzer.add_node_info(cls.document, cls.root, cls.notification_handler)
-        cls.notifications = cls.notification_handler.notifications
-
     @classmethod
     def update_format(cls):
         """reread json format file and update node tree"""
@@ -626,11 +662,15 @@ class MEConfig:
             cls.curr_format_file = sorted(cls.format_files, reverse=True)[0]
             text = cls.get_curr_format_text()
         try:
-            cls.root_input_type = get_root_input_type_from_json(text)
+            root_input_type, ist_nodes = load_format(text, cls.format_cache_dir)
         except Exception as e:
             cls._report_error("Can't open format file", e)
         else:
-            InfoTextGenerator.init(text)
+            if root_input_type is not cls.root_input_type:
+                # plans of the previous format are not needed any more
+                clear_type_plans()
+            cls.root_input_type = root_input_type
+            InfoTextGenerator.init(ist_nodes=ist_nodes)
             cls.autocomplete_helper.create_options(cls.root_input_type)
             cls.update()
 
@@ -117,7 +117,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self._reload_icon.setVisible(True)
         self._reload_icon.update()
         self.editor.setUpdatesEnabled(False)
-        cfg.update()
+        cfg.update(incremental=True)
         self.editor.setUpdatesEnabled(True)
         self.editor.reload()
         self.tree.reload()
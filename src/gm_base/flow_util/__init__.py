@@ -4,3 +4,4 @@
 
 from . import analysis
 from .yaml_support import YamlSupportRemote, ObservedQuantitiesValueType
+from .file_hash import FileHasher
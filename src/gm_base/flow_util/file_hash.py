@@ -0,0 +1,185 @@
+"""File hashing service.
+
+Files are hashed in binary mode by large chunks (or memory mapped),
+multiple files are hashed in parallel threads (hashlib releases GIL
+for big updates) and computed digests are cached by (path, size,
+mtime), so unchanged input files (meshes) are not hashed again.
+The cache may be stored to a file.
+
+Digests have form "algorithm:hexdigest". Digests without the prefix
+were computed by the legacy algorithm (SHA-512 of the text lines).
+"""
+
+import concurrent.futures
+import hashlib
+import json
+import mmap
+import os
+import threading
+import time
+
+
+HASH_ALGORITHM = "blake2b"
+"""algorithm of new digests"""
+
+LEGACY_ALGORITHM = "sha512-text"
+"""algorithm of digests without the algorithm prefix"""
+
+CHUNK_SIZE = 1 << 20
+"""size of read chunk"""
+
+MMAP_SIZE = 64 << 20
+"""minimal size of memory mapped file"""
+
+CACHE_VERSION = 1
+"""version of the cache file format"""
+
+RACY_TIME = 2.0
+"""files modified in this time before hashing are not cached,
+their later change may not change mtime"""
+
+
+def digest_algorithm(digest):
+    """Return algorithm of the digest."""
+    if ":" in digest:
+        return digest.split(":", 1)[0]
+    return LEGACY_ALGORITHM
+
+
+def _legacy_hash(file):
+    """SHA-512 of text lines encoded to utf-8 (newlines are normalized)."""
+    hash = hashlib.sha512()
+    with open(file, 'r') as file_d:
+        for line in file_d:
+            hash.update(bytes(line, "utf-8"))
+    return hash.hexdigest()
+
+
+def _binary_hash(file, algorithm, use_mmap):
+    """Return digest of the file content."""
+    hash = hashlib.new(algorithm)
+    with open(file, 'rb') as file_d:
+        size = os.fstat(file_d.fileno()).st_size
+        if use_mmap and size >= MMAP_SIZE:
+            with mmap.mmap(file_d.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                hash.update(data)
+        else:
+            buffer = bytearray(CHUNK_SIZE)
+            view = memoryview(buffer)
+            while True:
+                n = file_d.readinto(buffer)
+                if n == 0:
+                    break
+                hash.update(view[:n])
+    return "{0}:{1}".format(algorithm, hash.hexdigest())
+
+
+class FileHasher:
+    """
+    Hashing of files with cache of digests.
+    """
+
+    def __init__(self, cache_file=None, use_mmap=True, threads=4):
+        self._cache_file = cache_file
+        """file of persistent cache, cache is kept in memory only if None"""
+        self._use_mmap = use_mmap
+        """memory map big files"""
+        self._threads = threads
+        """maximal number of hashing threads"""
+        self._cache = {}
+        """{real path: [size, mtime_ns, digest]}"""
+        self._changed = False
+        """cache was changed after load or save"""
+        self._lock = threading.Lock()
+        if cache_file is not None:
+            self.load()
+
+    def load(self):
+        """Load persistent cache, invalid cache file is ignored."""
+        try:
+            with open(self._cache_file, 'r') as fd:
+                d = json.load(fd)
+            if d["version"] == CACHE_VERSION:
+                with self._lock:
+                    self._cache = d["files"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def save(self):
+        """Save persistent cache if it was changed, return list of errors."""
+        err = []
+        if self._cache_file is None or not self._changed:
+            return err
+        with self._lock:
+            d = dict(version=CACHE_VERSION, files=dict(self._cache))
+            self._changed = False
+        tmp_file = "{0}.{1}.tmp".format(self._cache_file, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(self._cache_file), exist_ok=True)
+            with open(tmp_file, 'w') as fd:
+                json.dump(d, fd)
+            os.replace(tmp_file, self._cache_file)
+        except OSError as e:
+            err.append("Can't save file hash cache: {0}".format(e))
+        return err
+
+    def clear(self):
+        """Clear cached digests."""
+        with self._lock:
+            self._cache = {}
+            self._changed = True
+
+    def file_hash(self, file, algorithm=HASH_ALGORITHM):
+        """
+        Compute digest of the file, the cached digest is returned if the
+        file size and modification time were not changed.
+
+        :return: (list of errors, digest)
+        """
+        err = []
+        if algorithm == LEGACY_ALGORITHM:
+            try:
+                return err, _legacy_hash(file)
+            except (RuntimeError, IOError) as e:
+                err.append("Can't open file: {0}".format(e))
+                return err, hashlib.sha512().hexdigest()
+        try:
+            path = os.path.realpath(file)
+            stat = os.stat(path)
+            with self._lock:
+                cached = self._cache.get(path)
+            if cached is not None and cached[0] == stat.st_size and \
+                    cached[1] == stat.st_mtime_ns and digest_algorithm(cached[2]) == algorithm:
+                return err, cached[2]
+            digest = _binary_hash(path, algorithm, self._use_mmap)
+        except (RuntimeError, IOError) as e:
+            err.append("Can't open file: {0}".format(e))
+            return err, "{0}:{1}".format(algorithm, hashlib.new(algorithm).hexdigest())
+        if time.time() - stat.st_mtime_ns / 1e9 >= RACY_TIME:
+            with self._lock:
+                self._cache[path] = [stat.st_size, stat.st_mtime_ns, digest]
+                self._changed = True
+        return err, digest
+
+    def file_hashes(self, files, algorithm=HASH_ALGORITHM):
+        """
+        Compute digests of files in parallel threads.
+
+        :return: (list of errors, {file: digest})
+        """
+        err = []
+        hashes = {}
+        if len(files) > 1 and self._threads > 1:
+            with concurrent.futures.ThreadPoolExecutor(min(self._threads, len(files))) as executor:
+                results = list(executor.map(lambda file: self.file_hash(file, algorithm), files))
+        else:
+            results = [self.file_hash(file, algorithm) for file in files]
+        for file, (e, digest) in zip(files, results):
+            err.extend(e)
+            hashes[file] = digest
+        err.extend(self.save())
+        return err, hashes
+
+
+file_hasher = FileHasher()
+"""default file hasher with cache kept in memory"""
@@ -1,7 +1,8 @@
 import json
-import hashlib
 from enum import IntEnum
 
+from .file_hash import file_hasher, digest_algorithm, HASH_ALGORITHM
+
 
 class ObservedQuantitiesValueType(IntEnum):
     """Observed Quantities Value Type"""
@@ -90,14 +91,14 @@ class YamlSupportRemote:
         return err
 
     @staticmethod
-    def file_hash(file):
-        """Compute hash from file."""
-        err = []
-        hash = hashlib.sha512()
-        try:
-            with open(file, 'r') as file_d:
-                for line in file_d:
-                    hash.update(bytes(line, "utf-8"))
-        except (RuntimeError, IOError) as e:
-            err.append("Can't open file: {0}".format(e))
-        return err, hash.hexdigest()
+    def file_hash(file, algorithm=HASH_ALGORITHM):
+        """
+        Compute hash from file. Use algorithm of stored digest
+        (:func:`hash_algorithm`) to verify it.
+        """
+        return file_hasher.file_hash(file, algorithm)
+
+    @staticmethod
+    def hash_algorithm(digest):
+        """Return algorithm of stored digest."""
+        return digest_algorithm(digest)
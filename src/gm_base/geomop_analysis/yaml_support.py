@@ -2,10 +2,15 @@ import codecs
 import os
 import re
 
-from gm_base.flow_util import YamlSupportRemote, ObservedQuantitiesValueType
+import gm_base.config as base_cfg
+from gm_base.flow_util import YamlSupportRemote, ObservedQuantitiesValueType, FileHasher
 from gm_base.model_data import Loader, Validator, notification_handler, get_root_input_type_from_json, autoconvert
 
 RE_PARAM = re.compile('<([a-zA-Z][a-zA-Z0-9_]*)>')
+FORMAT_CACHE_DIR = os.path.join(base_cfg.__config_dir__, 'format_cache')
+"""directory of pickled parsed format files"""
+FILE_HASH_CACHE = os.path.join(base_cfg.__config_dir__, 'file_hash_cache.json')
+"""persistent cache of file digests"""
 
 
 class YamlSupportLocal(YamlSupportRemote):
@@ -14,9 +19,19 @@ class YamlSupportLocal(YamlSupportRemote):
     and input files from .yaml files.
     """
 
+    _file_hasher = None
+    """file hasher with persistent cache shared by instances"""
+
     def __init__(self):
         super().__init__()
 
+    @classmethod
+    def _get_file_hasher(cls):
+        """Returns file hasher with persistent cache."""
+        if cls._file_hasher is None:
+            cls._file_hasher = FileHasher(FILE_HASH_CACHE)
+        return cls._file_hasher
+
     @staticmethod
     def _get_root_input_type():
         """Returns root input type."""
@@ -39,7 +54,7 @@ class YamlSupportLocal(YamlSupportRemote):
             err.append("Can't open format file '" + curr_format_file + "' (" + str(err) + ")")
             return None, err
         try:
-            root_input_type = get_root_input_type_from_json(text)
+            root_input_type = get_root_input_type_from_json(text, FORMAT_CACHE_DIR)
         except Exception as e:
             err.append("Can't open format file (" + str(e) + ")")
             return None, err
@@ -250,17 +265,14 @@ class YamlSupportLocal(YamlSupportRemote):
 
         crawl(root)
 
-        # .yaml file hash
-        e, self._yaml_file_hash = self.file_hash(yaml_file)
+        # .yaml and input files hashes, unchanged files are not hashed again
+        file_paths = [os.path.join(dir_name, os.path.normpath(file)) for file in self._input_files]
+        e, hashes = self._get_file_hasher().file_hashes([yaml_file] + file_paths)
         err.extend(e)
-
-        # input files hashes
+        self._yaml_file_hash = hashes[yaml_file]
         self._input_files_hashes = {}
-        for file in self._input_files:
-            file_path = os.path.join(dir_name, os.path.normpath(file))
-            e, hash = self.file_hash(file_path)
-            err.extend(e)
-            self._input_files_hashes[file] = hash
+        for file, file_path in zip(self._input_files, file_paths):
+            self._input_files_hashes[file] = hashes[file_path]
 
         return err
 
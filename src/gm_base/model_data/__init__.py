@@ -7,7 +7,7 @@ from .data_node import DataNode, ScalarDataNode, MappingDataNode, SequenceDataNo
 from .yaml import Loader
 from .export_con import export_con
 from .autoconversion import autoconvert
-from .format import get_root_input_type_from_json
+from .format import get_root_input_type_from_json, load_format
 from .notifications import Notification, NotificationHandler, notification_handler
-from .validation import Validator
+from .validation import Validator, clear_type_plans
 
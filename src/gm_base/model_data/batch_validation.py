@@ -0,0 +1,219 @@
+"""
+usage:
+    python3 -m gm_base.model_data.batch_validation [-h] [-f FORMAT] [-j JOBS]
+    [-o OUTPUT] yaml_file [yaml_file ...]
+
+Parameters::
+
+    -h, --help
+        show this help message and exit
+    -f FORMAT, --format FORMAT
+        Format file (JSON) or name of the format in resources/ist,
+        the newest format is used by default
+    -j JOBS, --jobs JOBS
+        Number of worker processes, number of CPUs by default
+    -o OUTPUT, --output OUTPUT
+        Output file, standard output by default
+    yaml_file
+        Flow123d YAML input files
+
+Description:
+    Headless validation of many Flow123d YAML input files. The format file
+    is loaded once, the files are loaded, autoconverted and validated
+    in a pool of processes. Results are written as JSON lines as soon
+    as each file is finished: a line for every notification, a line with
+    the result and validation time of every file and a final summary line.
+    Exit code is 1 if any file is not valid.
+"""
+
+import argparse
+import codecs
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from .yaml import Loader
+from .autoconversion import autoconvert
+from .format import get_root_input_type_from_json
+from .notifications import Notification, notification_handler
+from .validation import Validator, clear_type_plans
+
+
+FORMAT_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "resources", "ist")
+"""directory of format files distributed with the package"""
+
+_root_input_type = None
+"""root input type of the format used by the worker process"""
+
+
+def get_format_file(format_name=None):
+    """
+    Returns the path of the format file. `format_name` is either a path
+    or a format name from `FORMAT_DIR`; the newest format is used if None.
+    """
+    if format_name is None:
+        format_files = [file_name[:-5] for file_name in os.listdir(FORMAT_DIR)
+                        if file_name[-5:].lower() == ".json"]
+        format_name = sorted(format_files, reverse=True)[0]
+    if os.path.isfile(format_name):
+        return format_name
+    return os.path.join(FORMAT_DIR, format_name + ".json")
+
+
+def read_document(file_name):
+    """Reads the YAML document the same way as the editor does."""
+    try:
+        with codecs.open(file_name, 'r', 'utf-8') as file_d:
+            return file_d.read().expandtabs(tabsize=2)
+    except UnicodeDecodeError:
+        with open(file_name, 'r') as file_d:
+            return file_d.read().expandtabs(tabsize=2)
+
+
+def notification_to_dict(notification):
+    """Returns JSON serializable description of the notification."""
+    data = dict(
+        code=notification.code,
+        name=notification.name,
+        severity=notification.severity.name,
+        message=notification.message)
+    span = notification.span
+    if span is not None and span.start is not None and span.end is not None:
+        data['start'] = [span.start.line, span.start.column]
+        data['end'] = [span.end.line, span.end.column]
+    return data
+
+
+def validate_document(document, root_input_type):
+    """
+    Loads, autoconverts and validates the document.
+
+    :return: (valid, list of notifications)
+    """
+    notification_handler.clear()
+    loader = Loader(notification_handler)
+    validator = Validator(notification_handler)
+    root = loader.load(document)
+    root = autoconvert(root, root_input_type)
+    validator.validate(root, root_input_type)
+    notifications = notification_handler.notifications
+    notification_handler.clear()
+    valid = not any(notification.severity.value >= Notification.Severity.error.value
+                    for notification in notifications)
+    return valid, notifications
+
+
+def validate_file(file_name, root_input_type=None):
+    """
+    Validates the YAML file with root input type (of the worker process
+    if None). Returns JSON serializable result of the file.
+    """
+    if root_input_type is None:
+        root_input_type = _root_input_type
+    start = time.perf_counter()
+    result = dict(file=file_name)
+    try:
+        document = read_document(file_name)
+    except (RuntimeError, IOError) as err:
+        result.update(valid=False, error="Can't open .yaml file: {0}".format(err),
+                      notifications=[])
+    else:
+        try:
+            valid, notifications = validate_document(document, root_input_type)
+        except Exception as err:
+            result.update(valid=False, error="Validation failed: {0}".format(err),
+                          notifications=[])
+        else:
+            result.update(valid=valid, notifications=[
+                notification_to_dict(notification) for notification in notifications])
+    result['time'] = time.perf_counter() - start
+    return result
+
+
+def _init_worker(format_text):
+    """Parses the format in the worker unless it is inherited from the parent."""
+    global _root_input_type
+    if _root_input_type is None:
+        _root_input_type = get_root_input_type_from_json(format_text)
+
+
+def validate_files(format_file, files, jobs=None):
+    """
+    Validates YAML files in `jobs` processes (number of CPUs if None).
+    The format file is parsed once and shared by the workers.
+
+    Results of :py:func:`validate_file` are yielded in order of completion.
+    """
+    global _root_input_type
+    with open(format_file, 'r') as file_d:
+        format_text = file_d.read()
+    _root_input_type = get_root_input_type_from_json(format_text)
+    clear_type_plans()
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+    jobs = min(jobs, len(files))
+    if jobs <= 1:
+        for file_name in files:
+            yield validate_file(file_name)
+        return
+    with multiprocessing.Pool(jobs, _init_worker, (format_text,)) as pool:
+        for result in pool.imap_unordered(validate_file, files):
+            yield result
+
+
+def write_results(results, output):
+    """
+    Writes results as JSON lines to `output` as they come. Returns number
+    of files that are not valid.
+    """
+    start = time.perf_counter()
+    n_files = 0
+    n_invalid = 0
+    for result in results:
+        n_files += 1
+        if not result['valid']:
+            n_invalid += 1
+        for notification in result['notifications']:
+            line = dict(type='notification', file=result['file'])
+            line.update(notification)
+            output.write(json.dumps(line) + '\n')
+        line = dict(type='file', file=result['file'], valid=result['valid'],
+                    notifications=len(result['notifications']),
+                    time=round(result['time'], 6))
+        if 'error' in result:
+            line['error'] = result['error']
+        output.write(json.dumps(line) + '\n')
+        output.flush()
+    output.write(json.dumps(dict(type='summary', files=n_files, invalid=n_invalid,
+                                 time=round(time.perf_counter() - start, 6))) + '\n')
+    output.flush()
+    return n_invalid
+
+
+def main(argv=None):
+    """Launches the batch validation cli, returns the exit code."""
+    parser = argparse.ArgumentParser(
+        description='Validate Flow123d YAML input files')
+    parser.add_argument('-f', '--format', default=None,
+                        help='Format file (JSON) or name of the format in resources/ist')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='Number of worker processes')
+    parser.add_argument('-o', '--output', default=None,
+                        help='Output file, standard output by default')
+    parser.add_argument('yaml_file', nargs='+', help='Flow123d YAML input files')
+    args = parser.parse_args(argv)
+
+    format_file = get_format_file(args.format)
+    results = validate_files(format_file, args.yaml_file, args.jobs)
+    if args.output is None:
+        n_invalid = write_results(results, sys.stdout)
+    else:
+        with open(args.output, 'w') as output:
+            n_invalid = write_results(results, output)
+    return 1 if n_invalid else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,6 +6,7 @@ Contains classes for representing the tree structure of config files.
 .. codeauthor:: Tomas Krizek <tomas.krizek1@tul.cz>
 """
 
+from bisect import bisect_right
 from enum import Enum
 from gm_base.geomop_util.util import TextValue
 
@@ -17,6 +18,12 @@ class DataNode:
     The complete tree is represented by its root node.
     """
 
+    generation = 0
+    """counter of tree modifications (children, parent or key change),
+    cached paths and position indexes are valid for one generation"""
+    _path = None
+    _path_generation = -1
+
     class Implementation(Enum):
         """Implementation type of :py:class:`DataNode`.
 
@@ -45,6 +52,9 @@ class DataNode:
         json_dict = 5
 
     def __init__(self, key=None, parent=None):
+        self._parent = None
+        self._children = None
+        self._key = None
         self.ref = None
         """reference to another :py:class:`DataNode`"""
         self.implementation = None
@@ -92,6 +102,9 @@ class DataNode:
         """ 
         cls = self.__class__
         result = cls.__new__(cls)
+        result._parent = None
+        result._children = None
+        result._key = None
         if parent is None:
             result.parent = self.parent
         else:
@@ -130,10 +143,56 @@ class DataNode:
             return None
         return self.value.dcopy()        
 
+    @property
+    def parent(self):
+        """parent :py:class:`DataNode`"""
+        return self._parent
+
+    @parent.setter
+    def parent(self, value):
+        self._parent = value
+        DataNode.generation += 1
+
+    @property
+    def children(self):
+        """list of children nodes"""
+        return self._children
+
+    @children.setter
+    def children(self, value):
+        if not isinstance(value, _ChildList):
+            value = _ChildList(value)
+        self._children = value
+        DataNode.generation += 1
+
+    @property
+    def key(self):
+        """key (name) of this node (:py:class:`TextValue <util.util.TextValue>`)"""
+        return self._key
+
+    @key.setter
+    def key(self, value):
+        parent = self._parent
+        if parent is not None and self._key is not None and \
+                parent.get_child(self._key.value) is self:
+            parent._children.version += 1
+        self._key = value
+        DataNode.generation += 1
+
     @property
     def absolute_path(self):
-        """the absolute path to this node"""
-        return self.generate_absolute_path()
+        """the absolute path to this node, cached until the tree is modified"""
+        if self._path_generation != DataNode.generation:
+            if self.parent is None:
+                self._path = "/"
+            else:
+                parent_path = self.parent.absolute_path
+                if parent_path == "/":
+                    self._path = "/" + str(self.key.value)
+                else:
+                    self._path = parent_path + "/" + str(self.key.value)
+            self._path_generation = DataNode.generation
+        return self._path
 
     @property
     def start(self):
@@ -335,9 +394,144 @@ class DataNode:
         )
 
 
+class _ChildList(list):
+    """
+    List of children nodes. Its modifications are counted in `version`,
+    so indexes of the parent node stay valid when the list is modified directly.
+    """
+
+    version = 0
+
+    def _modified(self):
+        self.version += 1
+        DataNode.generation += 1
+
+
+def _modifying(name):
+    """Returns list method `name` that marks the list modified."""
+    method = getattr(list, name)
+
+    def modifying_method(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        self._modified()
+        return result
+    modifying_method.__name__ = name
+    modifying_method.__doc__ = method.__doc__
+    return modifying_method
+
+
+for _name in ['append', 'extend', 'insert', 'pop', 'remove', 'clear', 'sort', 'reverse',
+              '__setitem__', '__delitem__', '__iadd__', '__imul__']:
+    setattr(_ChildList, _name, _modifying(_name))
+
+
 class CompositeDataNode(DataNode):
     """Class defines the common behaviour of both Sequence an Mapping nodes."""
 
+    _child_index = None
+    _child_index_version = -1
+    _position_index = None
+    _position_index_generation = -1
+
+    def _get_child_index(self):
+        """Returns dict of children positions by key (first child with the key)."""
+        children = self.children
+        if self._child_index is None or self._child_index_version != children.version:
+            index = {}
+            for i, child in enumerate(children):
+                index.setdefault(child.key.value, i)
+            self._child_index = index
+            self._child_index_version = children.version
+        return self._child_index
+
+    def get_child(self, key):
+        """Return a child node for the given key.
+
+        :return: child node of given key
+        :rtype: :py:class:`DataNode` or ``None``
+        """
+        try:
+            i = self._get_child_index().get(key)
+        except TypeError:  # unhashable key
+            return super(CompositeDataNode, self).get_child(key)
+        if i is None:
+            return None
+        return self.children[i]
+
+    def set_child(self, node, allows_duplicit=True):
+        """Set the given node as child of this node.
+
+        If the key already exists, replace the original child node.
+
+        :param: :py:class:`DataNode` to be set as a child
+        """
+        node.parent = self
+        index = self._get_child_index()
+        children = self.children
+        i = index.get(node.key.value)
+        if i is not None:
+            child = children[i]
+            if allows_duplicit:
+                children[i] = node
+                self._child_index_version = children.version
+                return
+            if child.key.span is None:
+                child.key.value += '_red{0}'.format(str(len(children)))
+                child.origin = DataNode.Origin.redefination
+                child.key.span = node.key.span.dcopy()
+            else:
+                child.key.value += '_dup{0}'.format(str(len(children)))
+                child.origin = DataNode.Origin.duplicit
+            child.hidden = True
+            DataNode.generation += 1
+            index.setdefault(child.key.value, i)
+
+        # the key does not exists, create a new child node
+        index[node.key.value] = len(children)
+        children.append(node)
+        self._child_index_version = children.version
+
+    def _get_position_index(self):
+        """
+        Returns index of children by their spans: children sorted by start,
+        their starts and the running maximum of their ends.
+        """
+        if self._position_index is None or \
+                self._position_index_generation != DataNode.generation:
+            items = []
+            for i, child in enumerate(self.children):
+                if child.span is None:
+                    continue
+                start = child.start
+                items.append(((start.line, start.column), i, child))
+            items.sort(key=lambda item: item[:2])
+            starts = []
+            max_ends = []
+            max_end = None
+            for start, i, child in items:
+                end = (child.end.line, child.end.column)
+                if max_end is None or max_end < end:
+                    max_end = end
+                starts.append(start)
+                max_ends.append(max_end)
+            self._position_index = (items, starts, max_ends)
+            self._position_index_generation = DataNode.generation
+        return self._position_index
+
+    def _get_children_at_position(self, position):
+        """Returns children whose span contains position, in children order."""
+        items, starts, max_ends = self._get_position_index()
+        pos = (position.line, position.column)
+        found = []
+        i = bisect_right(starts, pos) - 1
+        while i >= 0 and max_ends[i] >= pos:
+            child = items[i][2]
+            if pos <= (child.end.line, child.end.column):
+                found.append(items[i][1:])
+            i -= 1
+        found.sort(key=lambda item: item[0])
+        return [child for i, child in found]
+
     def __str__(self):
         text = super(CompositeDataNode, self).__str__()
         children_keys = [str(child.key.value) for child in self.children]
@@ -368,7 +562,7 @@ class CompositeDataNode(DataNode):
         node = None
         if self.start <= position <= self.end:
             node = self
-            for child in self.children:
+            for child in self._get_children_at_position(position):
                 descendant = child.get_node_at_position(position)
                 if descendant is not None:
                     if descendant.origin is not DataNode.Origin.ac_transposition or \
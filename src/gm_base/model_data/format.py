@@ -3,13 +3,82 @@ Contains format specification class and methods to parse it from JSON.
 
 .. codeauthor:: Tomas Krizek <tomas.krizek1@tul.cz>
 """
+import hashlib
 import json
+import os
+import pickle
 import re
 
 
-def get_root_input_type_from_json(data):
+FORMAT_CACHE_VERSION = 1
+"""version of the pickled format files, increase it when parsed input types change"""
+
+_formats = {}
+"""memoized parsed formats {hash of JSON text: (root input type, IST nodes by id)}"""
+
+
+def get_root_input_type_from_json(data, cache_dir=None):
     """Return the root input type from JSON formatted string."""
-    return parse_format(json.loads(data))
+    return load_format(data, cache_dir)[0]
+
+
+def load_format(data, cache_dir=None):
+    """
+    Returns (root input type, IST nodes by id) from JSON formatted string.
+
+    Parsed formats are memoized by hash of the text, so all callers share
+    the same input type graph. If `cache_dir` is set, the parsed graph is
+    also pickled there and loaded instead of parsing the JSON next time.
+    """
+    digest = hashlib.sha1(data.encode('utf-8')).hexdigest()
+    format_ = _formats.get(digest)
+    if format_ is None:
+        cache_file = None
+        if cache_dir is not None:
+            cache_file = os.path.join(cache_dir, digest + '.pickle')
+            format_ = _read_format_cache(cache_file)
+        if format_ is None:
+            # parse_format replaces ids in the data by references, IST nodes are kept intact
+            ist_nodes = {item['id']: item for item in json.loads(data)['ist_nodes']
+                         if 'id' in item}
+            format_ = (parse_format(json.loads(data)), ist_nodes)
+            if cache_file is not None:
+                _write_format_cache(cache_file, format_)
+        _formats[digest] = format_
+    return format_
+
+
+def clear_formats():
+    """Clears memoized parsed formats."""
+    _formats.clear()
+
+
+def _read_format_cache(file_name):
+    """Returns the pickled format or None if the file is missing or not valid."""
+    try:
+        with open(file_name, 'rb') as file_d:
+            version, format_ = pickle.load(file_d)
+    except (OSError, EOFError, pickle.UnpicklingError, ValueError, TypeError,
+            AttributeError, ImportError, IndexError):
+        return None
+    if version != FORMAT_CACHE_VERSION:
+        return None
+    return format_
+
+
+def _write_format_cache(file_name, format_):
+    """Pickles the format, the cache is optional, so failures are ignored."""
+    tmp_file = '{0}.{1}.tmp'.format(file_name, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        with open(tmp_file, 'wb') as file_d:
+            pickle.dump((FORMAT_CACHE_VERSION, format_), file_d, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, file_name)
+    except (OSError, pickle.PicklingError, RecursionError):
+        try:
+            os.remove(tmp_file)
+        except OSError:
+            pass
 
 
 def parse_format(data):
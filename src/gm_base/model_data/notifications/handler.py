@@ -31,5 +31,11 @@ class NotificationHandler:
             return
         self._notifications.append(notification)
 
+    def discard(self, notifications):
+        """Removes the given notifications from the buffer."""
+        ids = set(id(notification) for notification in notifications)
+        self._notifications = [notification for notification in self._notifications
+                               if id(notification) not in ids]
+
 
 notification_handler = NotificationHandler()
@@ -5,3 +5,4 @@ Module for data structure validation
 """
 
 from .validator import Validator
+from .plan import TypePlan, get_type_plan, clear_type_plans
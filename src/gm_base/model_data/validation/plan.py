@@ -0,0 +1,125 @@
+"""Input types compiled for validation"""
+
+from functools import partial
+
+from . import checks
+from ..format import SCALAR
+
+
+_SCALAR_CHECKS = {
+    'Integer': checks.check_integer,
+    'Double': checks.check_double,
+    'Bool': checks.check_bool,
+    'String': checks.check_string,
+    'Selection': checks.check_selection,
+    'FileName': checks.check_filename
+}
+"""checks of scalar values by base type"""
+
+
+class TypePlan:
+    """
+    Input type compiled for validation.
+
+    Values used by validation are extracted from the input type dict once,
+    scalar values are checked by compiled closures, and plans of subtypes
+    are linked, so validation is a walk over plans without dict lookups.
+    """
+
+    def __init__(self, input_type):
+        self.input_type = input_type
+        """compiled input type"""
+        self.base_type = input_type['base_type']
+        """base type of input type"""
+        self.name = input_type.get('name')
+        """name of input type"""
+        self.is_scalar = self.base_type in SCALAR
+        """input type is scalar"""
+        self.check = None
+        """check of scalar value, raises `Notification`"""
+        self.options = None
+        """options of record keys or selection"""
+        self.keys = None
+        """{key: (plan, obligatory)} of record"""
+        self.implementations = None
+        """{name: input type} of abstract implementations"""
+        self.default_descendant = None
+        """default descendant input type of abstract"""
+        self.subtype = None
+        """plan of array items"""
+        self.min = None
+        """minimal number of array items"""
+        self.max = None
+        """maximal number of array items"""
+
+    def _compile(self, plans):
+        """Extracts validation data from input type, subtypes are compiled to `plans`."""
+        input_type = self.input_type
+        if self.is_scalar:
+            self.check = _compile_scalar_check(input_type)
+            if self.base_type == 'Selection':
+                self.options = input_type['values']
+        elif self.base_type == 'Record':
+            self.options = input_type['keys'].keys()
+            self.keys = {}
+            for key, key_type in input_type['keys'].items():
+                try:
+                    obligatory = key_type['default']['type'] == 'obligatory'
+                except KeyError:
+                    obligatory = False
+                self.keys[key] = (_get_type_plan(key_type['type'], plans), obligatory)
+        elif self.base_type == 'Abstract':
+            self.implementations = input_type.get('implementations', {})
+            self.default_descendant = input_type.get('default_descendant')
+        elif self.base_type == 'Array':
+            self.subtype = _get_type_plan(input_type['subtype'], plans)
+            self.min = input_type['min']
+            self.max = input_type['max']
+
+
+_plans = {}
+"""
+cache of compiled plans {id(input_type): plan}, it keeps input types alive,
+so it has to be cleared by :py:func:`clear_type_plans` when format is changed
+"""
+
+
+def get_type_plan(input_type):
+    """
+    Returns compiled plan of input type. Plans are cached by input type
+    identity, so all users of a parsed format share them.
+    """
+    plan = _plans.get(id(input_type))
+    if plan is None or plan.input_type is not input_type:
+        plans = {}
+        plan = _get_type_plan(input_type, plans)
+        compiled = set()
+        while len(compiled) < len(plans):
+            for key, new_plan in list(plans.items()):
+                if key not in compiled:
+                    new_plan._compile(plans)
+                    compiled.add(key)
+        _plans.update(plans)
+    return plan
+
+
+def clear_type_plans():
+    """Clears the cache of compiled plans."""
+    _plans.clear()
+
+
+def _get_type_plan(input_type, plans):
+    """Returns plan from cache or registers a new plan to `plans` for compilation."""
+    plan = _plans.get(id(input_type))
+    if plan is not None and plan.input_type is input_type:
+        return plan
+    plan = plans.get(id(input_type))
+    if plan is None:
+        plan = TypePlan(input_type)
+        plans[id(input_type)] = plan
+    return plan
+
+
+def _compile_scalar_check(input_type):
+    """Returns check of scalar value of the input type."""
+    return partial(_SCALAR_CHECKS[input_type['base_type']], input_type=input_type)
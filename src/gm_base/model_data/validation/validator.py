@@ -5,9 +5,9 @@
 from ..notifications import Notification
 from gm_base.geomop_util import TextValue, Span, Parameter
 
-from . import checks
+from .plan import get_type_plan
 from ..data_node import DataNode
-from ..format import is_scalar, is_param
+from ..format import is_param
 
 
 class Validator:
@@ -18,6 +18,7 @@ class Validator:
         self.notification_handler = notification_handler
         self.valid = True
         self.params = []
+        self._param_names = set()
 
     def validate(self, node, input_type):
         """
@@ -31,6 +32,18 @@ class Validator:
         """
         self.valid = True
         self.params = []
+        self._param_names = set()
+        self._validate_node(node, input_type)
+        return self.valid
+
+    def validate_subtree(self, node, input_type):
+        """
+        Performs data validation of node that replaced a subtree of already
+        validated data. Unlike :py:meth:`validate`, found parameters are kept.
+
+        Returns True when the node was correctly validated, False otherwise.
+        """
+        self.valid = True
         self._validate_node(node, input_type)
         return self.valid
 
@@ -40,52 +53,54 @@ class Validator:
 
         Method verifies node recursively. All descendant nodes are checked.
         """
+        self._validate_plan(node, get_type_plan(input_type))
+
+    def _validate_plan(self, node, plan):
+        """Validates node with compiled plan of its input type."""
         if node is None:
             raise Notification.from_name('ValidationError', 'Invalid node (None)')
+        input_type = plan.input_type
         # parameters
         # TODO: enable parameters in unknown IST?
-        if hasattr(node, 'value'):
-            match = is_param(node.value)
-            if match:
-                # extract parameters
-                new_param = Parameter(match.group(1))
-                exists = False
-                for param in self.params:
-                    if param.name == new_param.name:
-                        exists = True
-                        break
-                if not exists:
-                    self.params.append(new_param)
-                node.input_type = input_type
-                # assume parameters are correct, do not validate further
-                return
-
-        if input_type['base_type'] != 'Abstract' and hasattr(node, 'type') \
-                and node.type is not None and 'implemented_abstract_record' not in input_type:
+        match = is_param(getattr(node, 'value', None))
+        if match:
+            # extract parameters
+            name = match.group(1)
+            if name not in self._param_names:
+                self._param_names.add(name)
+                self.params.append(Parameter(name))
+            node.input_type = input_type
+            # assume parameters are correct, do not validate further
+            return
+
+        if plan.base_type != 'Abstract' and node.type is not None \
+                and 'implemented_abstract_record' not in input_type:
             notification = Notification.from_name('UselessTag', node.type.value)
             notification.span = node.type.span
             self.notification_handler.report(notification)
 
         node.input_type = input_type
-        if is_scalar(input_type):
-            self._validate_scalar(node, input_type)
-        elif input_type['base_type'] == 'Record':
-            self._validate_record(node, input_type)
-        elif input_type['base_type'] == 'Abstract':
-            self._validate_abstract(node, input_type)
-        elif input_type['base_type'] == 'Array':
-            self._validate_array(node, input_type)
+        if plan.is_scalar:
+            self._validate_scalar(node, plan)
+        elif plan.base_type == 'Record':
+            self._validate_record(node, plan)
+        elif plan.base_type == 'Abstract':
+            self._validate_abstract(node, plan)
+        elif plan.base_type == 'Array':
+            self._validate_array(node, plan)
         else:
             notification = Notification.from_name('InputTypeNotSupported',
-                                                  input_type['base_type'])
+                                                  plan.base_type)
             self._report_notification(notification)
 
-    def _validate_scalar(self, node, input_type):
+    def _validate_scalar(self, node, plan):
         """Validates a Scalar node."""
-        if input_type['base_type'] == 'Selection':
-            node.options = input_type['values']
+        if plan.options is not None:
+            node.options = plan.options
         try:
-            checks.check_scalar(node, input_type)
+            if node.implementation != DataNode.Implementation.scalar:
+                raise Notification.from_name('ValidationTypeError', 'Scalar')
+            plan.check(node.value)
         except Notification as notification:
             if notification.name in ['InvalidSelectionOption', 'ValueTooBig', 'ValueTooSmall',
                                      'ValidationTypeError']:
@@ -94,19 +109,21 @@ class Validator:
                 notification.span = get_node_key(node).notification_span
             self._report_notification(notification)
 
-    def _validate_record(self, node, input_type):
+    def _validate_record(self, node, plan):
         """Validates a Record node."""
         if not node.implementation == DataNode.Implementation.mapping:
             notification = Notification.from_name('ValidationTypeError', 'Record')
             notification.span = get_node_key(node).notification_span
             self._report_notification(notification)
             return
-        keys = node.children_keys
-        node.options = input_type['keys'].keys()
-        keys.extend(input_type['keys'].keys())
-        for key in set(keys):
-            if node.origin == DataNode.Origin.error:
-                continue            
+        node.options = plan.options
+        if node.origin == DataNode.Origin.error:
+            return
+        children_keys = node.children_keys
+        present_keys = set(children_keys)
+        keys = dict.fromkeys(children_keys)
+        keys.update(dict.fromkeys(plan.keys))
+        for key in keys:
             child = node.get_child(key)
             if child is not None and \
                 child.origin==DataNode.Origin.duplicit:
@@ -120,23 +137,33 @@ class Validator:
                 notification.span = child.key.span
                 self._report_notification(notification)
                 continue
-            try:
-                checks.check_record_key(node.children_keys, key, input_type)
-            except Notification as notification:
-                if notification.name == 'UnknownRecordKey':
+            key_plan = plan.keys.get(key)
+            if key_plan is None:
+                # if key is not found in specifications, it is considered to be valid
+                if key != 'fatal_error':
+                    notification = Notification.from_name('UnknownRecordKey', key, plan.name)
                     notification.span = child.notification_span
-                else:
-                    notification.span = get_node_key(node).notification_span
+                    self._report_notification(notification)
+            elif key_plan[1] and key not in present_keys:
+                notification = Notification.from_name('MissingObligatoryKey', key, plan.name)
+                notification.span = get_node_key(node).notification_span
                 self._report_notification(notification)
-            else:
-                if child is not None:
-                    child_input_type = input_type['keys'][key]['type']
-                    self._validate_node(child, child_input_type)
+            elif child is not None:
+                self._validate_plan(child, key_plan[0])
 
-    def _validate_abstract(self, node, input_type):
+    def _validate_abstract(self, node, plan):
         """Validates an AbtractRecord node."""
         try:
-            concrete_type = checks.get_abstractrecord_type(node, input_type)
+            if node.type is None:
+                concrete_type = plan.default_descendant
+            else:
+                try:
+                    concrete_type = plan.implementations[node.type.value]
+                except KeyError:
+                    raise Notification.from_name('InvalidAbstractType', node.type.value,
+                                                 plan.name)
+            if concrete_type is None:
+                raise Notification.from_name('MissingAbstractType')
         except Notification as notification:
             if notification.name == 'InvalidAbstractType':
                 notification.span = node.type.span
@@ -149,24 +176,30 @@ class Validator:
                 node.type = TextValue()
                 node.type.value = concrete_type.get('name')
                 node.type.span = Span(node.span.start, node.span.start)
-            concrete_type['implemented_abstract_record'] = input_type
+            concrete_type['implemented_abstract_record'] = plan.input_type
             node.input_type = concrete_type
-            self._validate_record(node, concrete_type)
+            self._validate_record(node, get_type_plan(concrete_type))
 
-    def _validate_array(self, node, input_type):
+    def _validate_array(self, node, plan):
         """Validates an Array node."""
         if not node.implementation == DataNode.Implementation.sequence:
             notification = Notification.from_name('ValidationTypeError', 'Array')
             notification.span = get_node_key(node).notification_span
             self._report_notification(notification)
             return
-        try:
-            checks.check_array(node.children, input_type)
-        except Notification as notification:
+        n_items = len(node.children)
+        if n_items < plan.min:
+            notification = Notification.from_name('NotEnoughItems', plan.min, plan.max)
+        elif n_items > plan.max:
+            notification = Notification.from_name('TooManyItems', plan.min, plan.max)
+        else:
+            notification = None
+        if notification is not None:
             notification.span = get_node_key(node).notification_span
             self._report_notification(notification)
+        subtype = plan.subtype
         for child in node.children:
-            self._validate_node(child, input_type['subtype'])
+            self._validate_plan(child, subtype)
 
     def _report_notification(self, notification):
         """Reports a notification."""
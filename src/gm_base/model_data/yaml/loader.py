@@ -16,13 +16,54 @@ from .resolver import resolve_scalar_tag
 from ..data_node import DataNode, ScalarDataNode, SequenceDataNode, MappingDataNode
 
 
+LIBYAML_AVAILABLE = getattr(pyyaml, '__with_libyaml__', False)
+"""True if pyyaml is built with the libyaml C parser."""
+
+_LINE_BREAKS = '\n\r\x85\u2028\u2029'
+
+
+def parse_events(document, use_libyaml=True):
+    """
+    Returns the iterator of parsing events of the document.
+
+    The libyaml C parser is used if available, events are parsed eagerly,
+    if the C parser fails the pure python parser is used instead, so errors
+    and events preceding them are reported exactly as before. Libyaml appends
+    a line break to the document without one, the marks past the end
+    of the document are moved back to its end, as the python parser reports them.
+    """
+    if not use_libyaml or not LIBYAML_AVAILABLE or '\ufeff' in document:
+        return pyyaml.parse(document)
+    try:
+        events = list(pyyaml.parse(document, Loader=pyyaml.CLoader))
+    except pyyaml.YAMLError:
+        return pyyaml.parse(document)
+    if len(document) > 0 and document[-1] not in _LINE_BREAKS and len(events) > 0:
+        end_line = events[-1].end_mark.line - 1
+        last_break = max(document.rfind(char) for char in _LINE_BREAKS)
+        end_mark = pyyaml.Mark(None, len(document), end_line,
+                               len(document) - last_break - 1, None, None)
+        for event in reversed(events):
+            if event.end_mark.line <= end_line:
+                break
+            event.end_mark = end_mark
+            if event.start_mark.line > end_line:
+                event.start_mark = end_mark
+    return iter(events)
+
+
 class Loader:
     """Generates DataNode structure from YAML document."""
-    def __init__(self, notification_handler=None):
-        """Initializes the loader with NotificationHandler."""
+    def __init__(self, notification_handler=None, use_libyaml=True):
+        """
+        Initializes the loader with NotificationHandler.
+        If use_libyaml, the faster libyaml parser is used when available.
+        """
         self._event = None
         self._event_generator = iter([])
         self._document = None
+        self._lines = None
+        self.use_libyaml = use_libyaml
         self._iterate_events = True
         self._fatal_error_node = None
         self.anchors = {}
@@ -38,14 +79,15 @@ class Loader:
         self._iterate_events = True
         self.anchors = {}
         self._document = document
-        self._event_generator = pyyaml.parse(self._document)
+        self._lines = None
+        self._event_generator = parse_events(self._document, self.use_libyaml)
 
         self._next_parse_event()  # StreamStartEvent
         self._next_parse_event()  # DocumentStartEvent
         self._next_parse_event()  # first actual event
 
         root = self._create_node()
-        if self._fatal_error_node:
+        if self._fatal_error_node and root is not None:
             if root.implementation != DataNode.Implementation.scalar:
                 # pylint: disable=no-member
                 root.set_child(self._fatal_error_node, False)
@@ -125,7 +167,9 @@ class Loader:
         Used to get the span of node properties like anchors or tags.
         """
         # set document to start at start_mark
-        lines = self._document.splitlines()
+        if self._lines is None:
+            self._lines = self._document.splitlines()
+        lines = self._lines
         line_index = start_mark.line
         line = lines[line_index]
         line = line[start_mark.column:]  # first line offset
@@ -4,10 +4,14 @@ Supported operations:
 - closest to point
 - intersecting box
 
-Implementation:
-- linear search with usage of numpy arrays
-Possible improvements using some trees.
+Implementations:
+- AABB_Lookup: linear search with usage of numpy arrays
+- AABB_RTree: dynamic R-tree, logarithmic queries for large number of boxes
+
+Both classes provide the same interface, use 'make_lookup' to create
+the lookup for the selected backend.
 """
+import heapq
 import numpy as np
 #import numpy.linalg as la
 
@@ -85,4 +89,285 @@ class AABB_Lookup:
                             box[2: 4] < boxes[:, 0:2],
                             boxes[:, 2:4] < box[0:2])
         not_intersect = np.logical_or(not_intersect[:,0], not_intersect[:,1])
-        return np.where( np.logical_not(not_intersect) )[0]
\ No newline at end of file
+        return np.where( np.logical_not(not_intersect) )[0]
+
+
+
+class _RTreeNode:
+    """
+    Node of the AABB_RTree. Boxes of the entries are stored in a preallocated numpy array
+    in order to test all entries of the node at once.
+    Entries are object IDs in the leaf nodes and child nodes otherwise.
+    """
+    __slots__ = ['is_leaf', 'boxes', 'entries', 'parent']
+
+    def __init__(self, is_leaf, max_entries):
+        self.is_leaf = is_leaf
+        self.boxes = np.empty((max_entries + 1, 4))
+        self.entries = []
+        self.parent = None
+
+    @property
+    def size(self):
+        return len(self.entries)
+
+    def bbox(self):
+        boxes = self.boxes[:len(self.entries), :]
+        return np.concatenate((boxes[:, 0:2].min(axis=0), boxes[:, 2:4].max(axis=0)))
+
+    def append(self, box, entry):
+        self.boxes[len(self.entries), :] = box
+        self.entries.append(entry)
+        if not self.is_leaf:
+            entry.parent = self
+
+    def remove(self, i_entry):
+        """
+        Remove entry at given position, the last entry is moved to its place.
+        """
+        last = len(self.entries) - 1
+        self.boxes[i_entry, :] = self.boxes[last, :]
+        self.entries[i_entry] = self.entries[last]
+        self.entries.pop()
+
+
+
+class AABB_RTree:
+    """
+    Dynamic R-tree with the same interface as AABB_Lookup.
+
+    Objects are inserted into the leaf with the least enlargement of its box (Guttman),
+    overfull nodes are split into halves along the axis with the largest spread of the box centers.
+    Removing an object just shrinks boxes of the nodes on the path to the root, empty nodes
+    are removed. Queries return sorted IDs, so the results are identical to the AABB_Lookup.
+    """
+    def __init__(self, max_entries=16, **kwargs):
+        """
+        :param max_entries: Maximal number of entries of a node.
+        :param kwargs: Ignored parameters of the AABB_Lookup.
+        """
+        self.max_entries = max_entries
+        self.root = _RTreeNode(True, max_entries)
+        # Object ID -> leaf node containing the object.
+        self.obj_leaf = {}
+
+    @property
+    def n_boxes(self):
+        return len(self.obj_leaf)
+
+    def add_object(self, id, box):
+        """
+        Add a new object as set of boxes. Any original box with same ID is replaced.
+        :param id: Object ID.
+        :param box: np array [min_x, min_y, max_x, max_y]
+        :return: None
+        """
+        if id in self.obj_leaf:
+            self.rm_object(id)
+        box = np.array(box, dtype=float)
+        leaf = self._choose_leaf(box)
+        leaf.append(box, id)
+        self.obj_leaf[id] = leaf
+        self._adjust_tree(leaf)
+
+    def rm_object(self, id):
+        leaf = self.obj_leaf.pop(id, None)
+        if leaf is None:
+            return
+        for i, entry_id in enumerate(leaf.entries):
+            if entry_id == id:
+                leaf.remove(i)
+                break
+        self._condense_tree(leaf)
+
+    def closest_candidates(self, point):
+        """
+        Return IDs of boxes that may contain boxes closest to the given point
+        in L2 norm.
+        :param point: np array [x,y]
+        :return: List of IDs.
+        """
+        if not self.obj_leaf:
+            return np.array([], dtype=int)
+        point = np.array(point, dtype=float)
+        point_box = np.concatenate((point, point))
+        c_boxes = self._boxes(self._search(lambda boxes: self._intersect_mask(boxes, point_box)))
+        if c_boxes.shape[0] == 0:
+            i_closest = self._nearest(point)
+            c_boxes = self._boxes([i_closest])
+        # Max distance of closest boxes
+        l_inf_max = np.max(np.maximum(point - c_boxes[:, 0:2], c_boxes[:, 2:4] - point))
+        l2_max = np.sqrt(2) * l_inf_max
+        return self._search(lambda boxes: self._inf_dists(boxes, point) < l2_max)
+
+    def intersect_candidates(self, box):
+        """
+        :param box: np array [min_x, min_y, max_x, max_y]
+        :return: List of ids of boxes that intersect with given box.
+        """
+        return self._search(lambda boxes: self._intersect_mask(boxes, box))
+
+    @staticmethod
+    def _inf_dists(boxes, point):
+        """
+        L-inf distance of the point to the boxes, nonpositive for boxes containing the point.
+        Distance of a node box is lower bound for distances of its entries.
+        """
+        return np.max(np.maximum(boxes[:, 0:2] - point, point - boxes[:, 2:4]), axis=1)
+
+    @staticmethod
+    def _intersect_mask(boxes, box):
+        not_intersect = np.logical_or(
+                            box[2: 4] < boxes[:, 0:2],
+                            boxes[:, 2:4] < box[0:2])
+        return np.logical_not(np.logical_or(not_intersect[:, 0], not_intersect[:, 1]))
+
+    def _search(self, mask_fn):
+        """
+        Collect objects for which the 'mask_fn' is true. The 'mask_fn' is applied to
+        the boxes of every visited node, so it have to be true also for every
+        node box containing a box for which it is true.
+        :param mask_fn: function: boxes array (n, 4) -> bool array (n,)
+        :return: sorted numpy array of IDs
+        """
+        result = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if not node.entries:
+                continue
+            idx = np.where(mask_fn(node.boxes[:node.size, :]))[0]
+            if node.is_leaf:
+                result.extend(node.entries[i] for i in idx)
+            else:
+                stack.extend(node.entries[i] for i in idx)
+        result.sort()
+        return np.array(result, dtype=int)
+
+    def _nearest(self, point):
+        """
+        Best first search for the object with the smallest L-inf distance to the point.
+        Ties are resolved by the smallest ID.
+        """
+        heap = [(-np.inf, 0, 0, self.root)]
+        counter = 1
+        while heap:
+            dist, is_obj, key, node = heapq.heappop(heap)
+            if is_obj:
+                return key
+            dists = self._inf_dists(node.boxes[:node.size, :], point)
+            for dist, entry in zip(dists, node.entries):
+                if node.is_leaf:
+                    heapq.heappush(heap, (dist, 1, entry, None))
+                else:
+                    heapq.heappush(heap, (dist, 0, counter, entry))
+                    counter += 1
+        assert False, "Nearest object not found."
+
+    def _boxes(self, ids):
+        boxes = np.empty((len(ids), 4))
+        for i, id in enumerate(ids):
+            leaf = self.obj_leaf[id]
+            boxes[i, :] = leaf.boxes[leaf.entries.index(id), :]
+        return boxes
+
+    def _choose_leaf(self, box):
+        node = self.root
+        while not node.is_leaf:
+            boxes = node.boxes[:node.size, :]
+            union_size = np.maximum(boxes[:, 2:4], box[2:4]) - np.minimum(boxes[:, 0:2], box[0:2])
+            area = self._area(boxes)
+            enlargement = union_size[:, 0] * union_size[:, 1] - area
+            i_min = enlargement.argmin()
+            if enlargement[i_min] == 0.0:
+                # Box is contained in some entries, take the smallest one.
+                i_min = np.where(enlargement == 0.0, area, np.inf).argmin()
+            node = node.entries[i_min]
+        return node
+
+    @staticmethod
+    def _area(boxes):
+        return (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+    def _split(self, node):
+        """
+        Move half of the entries of the overfull node into a new sibling node.
+        :return: The new node.
+        """
+        n = node.size
+        boxes = node.boxes[:n, :]
+        centers = (boxes[:, 0:2] + boxes[:, 2:4]) / 2
+        axis = np.argmax(np.max(centers, axis=0) - np.min(centers, axis=0))
+        order = np.argsort(centers[:, axis], kind='stable')
+        entries = node.entries
+        boxes = boxes.copy()
+        node.entries = []
+        sibling = _RTreeNode(node.is_leaf, self.max_entries)
+        for k, i in enumerate(order):
+            target = node if k < n // 2 else sibling
+            target.append(boxes[i], entries[i])
+            if node.is_leaf:
+                self.obj_leaf[entries[i]] = target
+        return sibling
+
+    def _adjust_tree(self, node):
+        """
+        Split overfull nodes and update boxes on the path from the 'node' to the root.
+        """
+        split_node = self._split(node) if node.size > self.max_entries else None
+        while node.parent is not None:
+            parent = node.parent
+            i_node = parent.entries.index(node)
+            box = node.bbox()
+            if split_node is None and np.all(parent.boxes[i_node, :] == box):
+                # Boxes of the ancestors are not changed.
+                return
+            parent.boxes[i_node, :] = box
+            if split_node is not None:
+                parent.append(split_node.bbox(), split_node)
+                split_node = self._split(parent) if parent.size > self.max_entries else None
+            node = parent
+        if split_node is not None:
+            new_root = _RTreeNode(False, self.max_entries)
+            new_root.append(node.bbox(), node)
+            new_root.append(split_node.bbox(), split_node)
+            self.root = new_root
+
+    def _condense_tree(self, node):
+        """
+        Remove empty nodes and shrink boxes on the path from the 'node' to the root.
+        """
+        while node.parent is not None:
+            parent = node.parent
+            i_node = parent.entries.index(node)
+            if node.size == 0:
+                parent.remove(i_node)
+            else:
+                parent.boxes[i_node, :] = node.bbox()
+            node = parent
+        # Shorten the tree.
+        while not self.root.is_leaf and self.root.size <= 1:
+            if self.root.size == 0:
+                self.root = _RTreeNode(True, self.max_entries)
+            else:
+                self.root = self.root.entries[0]
+                self.root.parent = None
+
+
+
+lookup_backends = {
+    'linear': AABB_Lookup,
+    'rtree': AABB_RTree
+}
+default_backend = 'rtree'
+
+def make_lookup(backend=None, **kwargs):
+    """
+    Create a box lookup object.
+    :param backend: Name of the implementation, one of 'lookup_backends' keys, 'default_backend' for None.
+    :param kwargs: Parameters passed to the lookup constructor.
+    :return: AABB_Lookup or AABB_RTree instance
+    """
+    if backend is None:
+        backend = default_backend
+    return lookup_backends[backend](**kwargs)
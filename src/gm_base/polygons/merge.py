@@ -1,3 +1,4 @@
+import numpy as np
 import gm_base.polygons.polygons as polygons
 from gm_base.polygons.decomp import PolygonChange, in_vtx, out_vtx, right_side, left_side
 
@@ -153,11 +154,53 @@ def intersect_single(decomp, other, merge_tol=1e-10):
 
 
 
-def intersect_decompositions(decomps):
+def _map_to_array(id_map, size, identity=False):
+    """
+    Convert map of object IDs (dict new_id -> orig_id, None values for no preimage)
+    into integer array indexed by new IDs, -1 for no preimage.
+    :param identity: Unlisted IDs map to themselves, otherwise to -1.
+    """
+    if identity:
+        array = np.arange(size, dtype=int)
+    else:
+        array = np.full(size, -1, dtype=int)
+    items = [(new_id, orig_id) for new_id, orig_id in id_map.items() if orig_id is not None]
+    if items:
+        new_ids, orig_ids = np.array(items, dtype=int).T
+        array[new_ids] = orig_ids
+    return array
+
+
+def _compose_maps(outer_map, inner_map):
+    """
+    Composition of maps in array representation, i.e. inner_map[outer_map[id]].
+    """
+    valid = np.logical_and(outer_map >= 0, outer_map < len(inner_map))
+    composed = np.full(len(outer_map), -1, dtype=int)
+    composed[valid] = inner_map[outer_map[valid]]
+    return composed
+
+
+def _intersect_pair(decomp, other):
+    """
+    Intersect two decompositions, 'decomp' is modified.
+    Can be called in other process, both decompositions are passed through pickle.
+    :return: (decomp, maps_self, maps_other), maps in array representation
+    """
+    decomp, maps_self, maps_other = intersect_single(decomp, other)
+    sizes = [shapes._next_id + 1 for shapes in decomp.decomp.shapes]
+    maps_self = [_map_to_array(map, size, identity=True) for map, size in zip(maps_self, sizes)]
+    maps_other = [_map_to_array(map, size) for map, size in zip(maps_other, sizes)]
+    return decomp, maps_self, maps_other
+
+
+def intersect_decompositions(decomps, pool=None):
     """
     Intersection of a list of decompositions. Segments and polygons are subdivided.
 
     :param decomps: List of PolygonDecomposition objects to itersect.
+    :param pool: Optional executor (e.g. concurrent.futures.ProcessPoolExecutor) used to
+    intersect independent pairs of decompositions in parallel.
     :return: (common_decomp, poly_maps)
     common_decomp - resulting merged/intersected decomposition.
     poly_maps - List of maps, one for every input decomposition. For single decomp the map
@@ -165,32 +208,65 @@ def intersect_decompositions(decomps):
     map_Nd - is a dict mapping IDs of sommon_decomp objects to IDs of decomp objects.
     Objects of common_decomp that have no preimage in decomp are omitted.
 
-    TODO: For larger number of intersectiong decompositions, it would be better to
-    use a binary tree reduction instead of linear pass to have n log(n) complexity of map updating.
+    Decompositions are merged by a binary tree reduction, so every input map is updated
+    only log(n) times. Maps are kept as integer arrays indexed by object IDs during the
+    reduction, -1 marks objects without a preimage.
     """
-    common_decomp = polygons.PolygonDecomposition()
-    all_maps = []
+    # Reduction items: (decomp, [maps of input decompositions merged into the decomp])
+    # Leafs are copies of the input decompositions, input decompositions are not modified.
+    items = []
     for decomp in decomps:
-        print("frac : {} #pt: {} #seg: {} #wires: {} #poly: {}".format(
-            len(all_maps),
-            len(common_decomp.points),
-            len(common_decomp.segments),
-            len(common_decomp.decomp.wires),
-            len(common_decomp.polygons)))
-        common_decomp, common_maps, decomp_maps = intersect_single(common_decomp, decomp)
-        decomp_maps = [ { key: val for key,val in map.items() if val is not None} for map in decomp_maps ]
-        for one_decomp_maps in all_maps:
-            for one_dim_map, common_map in zip(one_decomp_maps, common_maps):
-                for new_id, orig_id in common_map.items():
-                    if orig_id in one_dim_map:
-                        assert new_id not in one_dim_map or new_id == orig_id
-                        one_dim_map[new_id] = one_dim_map[orig_id]
-
-        all_maps.append(decomp_maps)
+        common_decomp, common_maps, decomp_maps = _intersect_pair(polygons.PolygonDecomposition(), decomp)
+        items.append( (common_decomp, [decomp_maps]) )
+
+    while len(items) > 1:
+        print("level: #decomps: {} #pt: {} #seg: {} #poly: {}".format(
+            len(items),
+            sum(len(decomp.points) for decomp, maps in items),
+            sum(len(decomp.segments) for decomp, maps in items),
+            sum(len(decomp.polygons) for decomp, maps in items)))
+        # Segments of the smaller decomposition are added into the larger one.
+        pairs = []
+        for i in range(0, len(items) - 1, 2):
+            a_item, b_item = items[i], items[i + 1]
+            swap = len(b_item[0].segments) > len(a_item[0].segments)
+            pairs.append( (b_item, a_item, swap) if swap else (a_item, b_item, swap) )
+        if pool is None:
+            results = [ _intersect_pair(a_decomp, b_decomp) for (a_decomp, a_maps), (b_decomp, b_maps), swap in pairs]
+        else:
+            futures = [ pool.submit(_intersect_pair, a_decomp, b_decomp)
+                        for (a_decomp, a_maps), (b_decomp, b_maps), swap in pairs]
+            results = [ future.result() for future in futures]
+
+        new_items = []
+        for ((a_decomp, a_maps), (b_decomp, b_maps), swap), (decomp, maps_self, maps_other) in zip(pairs, results):
+            a_maps = [ [_compose_maps(map_self, map) for map_self, map in zip(maps_self, one_decomp_maps)]
+                       for one_decomp_maps in a_maps]
+            b_maps = [ [_compose_maps(map_other, map) for map_other, map in zip(maps_other, one_decomp_maps)]
+                       for one_decomp_maps in b_maps]
+            # Keep order of the input decompositions.
+            new_items.append( (decomp, b_maps + a_maps if swap else a_maps + b_maps) )
+        if len(items) % 2 == 1:
+            new_items.append(items[-1])
+        items = new_items
+
+    if not items:
+        return polygons.PolygonDecomposition(), []
+    common_decomp, array_maps = items[0]
+
+    all_maps = []
+    for decomp, decomp_maps in zip(decomps, array_maps):
+        dict_maps = []
+        for dim, map in enumerate(decomp_maps):
+            new_ids = np.array(list(common_decomp.decomp.shapes[dim].keys()), dtype=int)
+            orig_ids = map[new_ids]
+            has_orig = orig_ids >= 0
+            dict_maps.append(dict(zip(new_ids[has_orig].tolist(), orig_ids[has_orig].tolist())))
+        all_maps.append(dict_maps)
 
         # check
         for dim in range(3):
-            orig_id_set = { val for val in decomp_maps[dim].values()}
+            orig_id_set = { val for val in dict_maps[dim].values()}
             for obj_id in decomp.decomp.shapes[dim].keys():
                 assert obj_id in orig_id_set, "dim:{} id:{}".format(dim, obj_id)
 
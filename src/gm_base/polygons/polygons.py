@@ -9,18 +9,10 @@ from gm_base.polygons.decomp import PolygonChange
 # - Still we may get points closer then tolerance for an edge crossing very acute angle.
 # - not sure about wire.contains_point
 
-# TODO: Performance improvement
-# - O(n^2) complexity of intersections is due to: snap_point and _add_line_seg_intersections
-# The first needs to find closest edge to the point, in fact any edge _ahave potentialy very bad complexity O(Nlog(N)) with number of segments
-# - add_line linear with number of segments
+# Performance:
+# - snap_point and _add_line_seg_intersections use R-tree lookups (aabb_lookup.AABB_RTree) of points and segments,
+#   so they are logarithmic with number of segments for reasonably distributed segments.
 # - other operations are at most linear with number of segments per wire or point
-#
-# Libraries:
-# - scipy.KDtree - only for points, problematic use for lines must use fixed division of lines
-# - smartquadtree - seems to be also point based but support iterationg over close pairs
-# See:
-# - http://blog.notdot.net/2009/11/Damn-Cool-Algorithms-Spatial-indexing-with-Quadtrees-and-Hilbert-Curves
-# - https://stackoverflow.com/questions/36135161/efficient-quadtree-implementation-in-python
 
 
 in_vtx = left_side = 1
@@ -55,12 +47,14 @@ class PolygonDecomposition:
 
     """
 
-    def __init__(self):
+    def __init__(self, lookup_backend=None):
         """
         Constructor.
+        :param lookup_backend: Implementation of the points and segments lookup,
+        see aabb_lookup.make_lookup.
         """
-        self.points_lookup = aabb_lookup.AABB_Lookup()
-        self.segments_lookup = aabb_lookup.AABB_Lookup()
+        self.points_lookup = aabb_lookup.make_lookup(lookup_backend)
+        self.segments_lookup = aabb_lookup.make_lookup(lookup_backend)
         self.decomp = decomp.Decomposition()
         self.tolerance = 0.01
 
@@ -403,6 +397,40 @@ class PolygonDecomposition:
         return [seg    for seg, change, side in self._add_line_new_segments(a_pt, b_pt, line_div)]
 
 
+    def add_lines(self, lines):
+        """
+        Add many lines at once. Mutual intersections of the new lines are computed together
+        (see lines_intersections), every line is divided by its intersection points and the parts
+        are added through add_line_for_points, so intersections with already existing segments
+        and snapping are treated as in add_line.
+        :param lines: array (n, 2, 2), end points of the lines
+        :return: List of lists of segments, subdivided segments of every line.
+        Empty list for lines degenerated to a point.
+        """
+        lines = np.array(lines, dtype=float).reshape(-1, 2, 2)
+        i_lines, j_lines, t_i, t_j = self.lines_intersections(lines)
+
+        # Add all points first, an intersection point is shared by both lines.
+        line_points = [ [(0.0, self.add_point(a)), (1.0, self.add_point(b))] for a, b in lines ]
+        isec_xy = lines[i_lines, 0, :] + t_i[:, None] * (lines[i_lines, 1, :] - lines[i_lines, 0, :])
+        for i, j, ti, tj, xy in zip(i_lines, j_lines, t_i, t_j, isec_xy):
+            mid_pt = self.add_point(xy)
+            line_points[i].append((ti, mid_pt))
+            line_points[j].append((tj, mid_pt))
+
+        line_segments = []
+        for pts in line_points:
+            pts.sort(key=lambda t_pt: t_pt[0])
+            segments = []
+            start_pt = pts[0][1]
+            for t, pt in pts[1:]:
+                if pt == start_pt:
+                    continue
+                segments.extend(self.add_line_for_points(start_pt, pt))
+                start_pt = pt
+            line_segments.append(segments)
+        return line_segments
+
     def _point_on_segment(self, seg, t):
         if t < self.tolerance:
             mid_pt = seg.vtxs[out_vtx]
@@ -541,6 +569,71 @@ class PolygonDecomposition:
         else:
             return (None, None)
 
+    @staticmethod
+    def lines_intersections(lines, max_pairs=2**18):
+        """
+        Find all intersections of given lines. Uses sweep along X axis: lines are sorted by
+        minimal X coordinate and only pairs with overlapping X ranges are tested. Candidate pairs
+        are processed vectorized in chunks of about max_pairs pairs, so the memory is bounded
+        even if most of X ranges overlap. Parallel lines are not considered intersecting.
+        :param lines: array (n, 2, 2), end points of the lines
+        :param max_pairs: number of candidate pairs processed at once, a single line
+        with more candidates is processed at once
+        :return: (i, j, t_i, t_j) arrays of indices of intersecting pairs of lines and
+        parameters of the intersection on both lines.
+        """
+        n_lines = lines.shape[0]
+        x_min = np.min(lines[:, :, 0], axis=1)
+        x_max = np.max(lines[:, :, 0], axis=1)
+        y_min = np.min(lines[:, :, 1], axis=1)
+        y_max = np.max(lines[:, :, 1], axis=1)
+
+        # Candidates of 'i': lines following 'i' in the sweep order that start before end of 'i'.
+        order = np.argsort(x_min, kind='stable')
+        sorted_x_min = x_min[order]
+        i_pos = np.arange(n_lines)
+        end_pos = np.searchsorted(sorted_x_min, x_max[order], side='right')
+        counts = np.maximum(end_pos - i_pos - 1, 0)
+        cum_counts = np.cumsum(counts)
+
+        results = []
+        begin = 0
+        while begin < n_lines:
+            # lines [begin, end) have at most max_pairs candidates together, at least one line is taken
+            n_done = cum_counts[begin - 1] if begin > 0 else 0
+            end = max(np.searchsorted(cum_counts, n_done + max_pairs, side='right'), begin + 1)
+            chunk_counts = counts[begin:end]
+            i_pair = np.repeat(i_pos[begin:end], chunk_counts)
+            first = np.cumsum(chunk_counts) - chunk_counts
+            j_pair = i_pair + 1 + np.arange(len(i_pair)) - np.repeat(first, chunk_counts)
+            i_pair, j_pair = order[i_pair], order[j_pair]
+            y_overlap = np.logical_and(y_min[i_pair] <= y_max[j_pair], y_min[j_pair] <= y_max[i_pair])
+            results.append(PolygonDecomposition._pairs_intersections(
+                lines, i_pair[y_overlap], j_pair[y_overlap]))
+            begin = end
+        if len(results) == 0:
+            empty = np.zeros(0)
+            return empty.astype(int), empty.astype(int), empty, empty
+        return tuple(np.concatenate(arrays) for arrays in zip(*results))
+
+    @staticmethod
+    def _pairs_intersections(lines, i_pair, j_pair):
+        """
+        Intersections of pairs of lines, see lines_intersections.
+        :return: (i, j, t_i, t_j) of intersecting pairs
+        """
+        a_i = lines[i_pair, 0, :]
+        a_j = lines[j_pair, 0, :]
+        d_i = lines[i_pair, 1, :] - a_i
+        d_j = lines[j_pair, 1, :] - a_j
+        diff = a_j - a_i
+        denom = d_i[:, 0] * d_j[:, 1] - d_i[:, 1] * d_j[:, 0]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t_i = (diff[:, 0] * d_j[:, 1] - diff[:, 1] * d_j[:, 0]) / denom
+            t_j = (diff[:, 0] * d_i[:, 1] - diff[:, 1] * d_i[:, 0]) / denom
+        isec = (denom != 0.0) & (0.0 <= t_i) & (t_i <= 1.0) & (0.0 <= t_j) & (t_j <= 1.0)
+        return i_pair[isec], j_pair[isec], t_i[isec], t_j[isec]
+
     ################################
     # Serialization methods - should move into polygon_io
 
@@ -620,6 +713,80 @@ class PolygonDecomposition:
 
 
 
+    def __getstate__(self):
+        """
+        Pickle support. Default pickling fails on circular references of objects hashed by their IDs,
+        so all links between objects are stored as IDs and restored in __setstate__.
+        Used to transfer decompositions between processes (see merge.intersect_decompositions).
+        """
+        def seg_side_id(seg_side):
+            seg, side = seg_side
+            return None if seg is None else (seg.id, side)
+
+        decomp = self.decomp
+        points = [ (pt.id, pt.xy, seg_side_id(pt.segment), None if pt.poly is None else pt.poly.id)
+                   for pt in decomp.points.values()]
+        segments = [ (seg.id, seg.point_ids(), [w.id for w in seg.wire], [seg_side_id(n) for n in seg.next])
+                     for seg in decomp.segments.values()]
+        wires = [ (w.id, None if w.parent is None else w.parent.id, w.polygon.id, seg_side_id(w.segment))
+                  for w in decomp.wires.values()]
+        polygons = [ (poly.id, poly.outer_wire.id) for poly in decomp.polygons.values()]
+        next_ids = [shapes._next_id for shapes in [decomp.points, decomp.segments, decomp.wires, decomp.polygons]]
+        return dict(points=points, segments=segments, wires=wires, polygons=polygons, next_ids=next_ids,
+                    tolerance=self.tolerance,
+                    lookup_types=(type(self.points_lookup), type(self.segments_lookup)))
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.tolerance = state['tolerance']
+        points_lookup_type, segments_lookup_type = state['lookup_types']
+        self.points_lookup = points_lookup_type()
+        self.segments_lookup = segments_lookup_type()
+
+        # Create objects, the root wire and the outer polygon already exist.
+        d = self.decomp
+        for id, parent_id, poly_id, seg_side in state['wires']:
+            if parent_id is not None:
+                d.wires.append(decomp.Wire(), id)
+        for id, wire_id in state['polygons']:
+            if id != d.outer_polygon.id:
+                d.polygons.append(decomp.Polygon(d.wires[wire_id]), id)
+        for id, xy, seg_side, poly_id in state['points']:
+            d.points.append(decomp.Point(xy, None), id)
+        for id, point_ids, wire_ids, next in state['segments']:
+            seg = decomp.Segment([d.points[pt_id] for pt_id in point_ids])
+            d.segments.append(seg, id)
+            d.pt_to_seg[point_ids] = seg
+
+        # Set links.
+        def seg_side_obj(seg_side):
+            if seg_side is None:
+                return (None, None)
+            seg_id, side = seg_side
+            return (d.segments[seg_id], side)
+
+        for id, parent_id, poly_id, seg_side in state['wires']:
+            wire = d.wires[id]
+            wire.polygon = d.polygons[poly_id]
+            wire.segment = seg_side_obj(seg_side)
+            if parent_id is not None:
+                wire.set_parent(d.wires[parent_id])
+        for id, xy, seg_side, poly_id in state['points']:
+            pt = d.points[id]
+            if poly_id is None:
+                pt.segment = seg_side_obj(seg_side)
+            else:
+                pt.set_polygon(d.polygons[poly_id])
+            self.points_lookup.add_object(pt.id, aabb_lookup.make_aabb([pt.xy], margin=self.tolerance))
+        for id, point_ids, wire_ids, next in state['segments']:
+            seg = d.segments[id]
+            seg.wire = [d.wires[wire_id] for wire_id in wire_ids]
+            seg.next = [seg_side_obj(seg_side) for seg_side in next]
+            self.segments_lookup.add_object(seg.id, aabb_lookup.make_aabb([pt.xy for pt in seg.vtxs], margin=self.tolerance))
+
+        for shapes, next_id in zip([d.points, d.segments, d.wires, d.polygons], state['next_ids']):
+            shapes._next_id = next_id
+
     def set_wire_parents(self):
         """
         Used in  deep_copy and deserialize.
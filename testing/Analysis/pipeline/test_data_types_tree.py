@@ -118,3 +118,67 @@ def test_tuple():
     assert var3[0].value == 1
     assert var4[0].value == 5
     assert var3[1].value == var4[1].value
+
+
+class _Predicate:
+    def __init__(self, func):
+        self._func = func
+
+    def _get_bool(self, item):
+        return self._func(item)
+
+    def _get_key(self, item):
+        return self._func(item)
+
+    def _get_adapted_item(self, item):
+        return self._func(item)
+
+
+def test_column_sequence():
+    subtype = Tuple(Float(), Struct(name=String(), value=Int(), point=Tuple(Float(), Float())))
+    seq = ColumnSequence(subtype, {"0": [3.0, 1.0, 2.0], "1.name": ["c", "a", "b"],
+                                   "1.value": [3, 1, 2], "1.point.0": [0.5, 1.5, 2.5],
+                                   "1.point.1": [0.0, 0.0, 1.0]})
+    plain = Sequence(subtype)
+    for item in seq:
+        plain.add_item(item)
+
+    # columns, items
+    assert len(seq) == 3
+    assert seq.column("1.value").dtype.kind == 'i'
+    assert seq.head()[1].name == "c"
+    assert seq.tail()[1].point[0] == 2.5
+    assert seq.get_item(3) is None
+    assert seq._is_set()
+    assert seq._get_settings_script() == plain._get_settings_script()
+
+    # _match_type()
+    assert seq._match_type(plain)
+    assert plain._match_type(seq)
+    assert Struct(data=seq)._match_type(Struct(data=Sequence(subtype)))
+    assert not seq._match_type(Sequence(Tuple(Float(), Struct(name=String(), time=Float()))))
+
+    # select(), sort(), each()
+    selected = seq.select(_Predicate(lambda item: item[1].value > 1))
+    assert isinstance(selected, ColumnSequence)
+    assert [item[1].name.value for item in selected] == ["c", "b"]
+    ordered = seq.sort(_Predicate(lambda item: item[0].value))
+    assert [item[1].value.value for item in ordered] == [1, 2, 3]
+    assert list(ordered.column("1.point.0")) == [1.5, 2.5, 0.5]
+    adapted = seq.each(_Predicate(lambda item: item[1].point))
+    assert type(adapted) is Sequence
+    assert adapted.tail()[1] == 1.0
+
+    # add_item(), duplicate()
+    copy = seq.duplicate()
+    seq.add_item(Tuple(Float(4.0), Struct(name=String("d"), value=Int(4),
+                                          point=Tuple(Float(), Float(1.0)))))
+    assert len(seq) == 4
+    assert len(copy) == 3
+    assert seq.tail()[1].point[0].value is None
+    assert not seq._is_set()
+    try:
+        seq.add_item(Tuple(Float(5.0), Int(5)))
+        assert False, "Raise type exception fail"
+    except Exception as err:
+        assert str(err)[:27] == 'Not supported ensemble type'
@@ -394,3 +394,46 @@ def test_flow_data_types():
     assert data.solute_result.balance.tail()[1].quantity == "B"
     assert len(data.solute_result.fields._list) == 11
     assert data.solute_result.fields.tail().vtk_data == "transport_dg/transport_dg-000010.vtu"
+
+
+def test_observation_type(tmpdir):
+    observed_quantities = {"pressure": ObservedQuantitiesValueType.scalar,
+                           "region_id": ObservedQuantitiesValueType.integer,
+                           "velocity": ObservedQuantitiesValueType.vector}
+    file = tmpdir.join("observe.yaml")
+    file.write("points:\n"
+               "  - name: p0\n"
+               "    observe_point: [0, 0, 1]\n"
+               "  - name: p1\n"
+               "    observe_point: [1, 0, 1]\n"
+               "data:\n"
+               "  - time: 0\n"
+               "    pressure: [1.5, 2.5]\n"
+               "    region_id: [1, 2]\n"
+               "    velocity: [[1, 2, 3], [4, 5, 6]]\n"
+               "  - time: 1\n"
+               "    pressure: [3.5, 4.5]\n"
+               "    region_id: [1, 2]\n"
+               "    velocity: [[7, 8, 9], [10, 11, 12]]\n")
+    points, data = ObservationType.parse_data_from_file(str(file), observed_quantities)
+    points_type, data_type = ObservationType.create_type(observed_quantities)
+    assert points._match_type(points_type)
+    assert data._match_type(data_type)
+    assert len(points) == 2
+    assert points.tail().name == "p1"
+    assert points.tail().point[0] == 1.0
+    assert len(data) == 2
+    assert data.tail()[0] == 1.0
+    assert data.tail()[1].tail().name == "p1"
+    assert data.tail()[1].tail().pressure == 4.5
+    assert data.tail()[1].tail().region_id == 2
+    assert data.tail()[1].tail().velocity[2] == 12.0
+
+    # selected points and quantities
+    points, data = ObservationType.parse_data_from_file(
+        str(file), observed_quantities, ["p1"], ["velocity"])
+    points_type, data_type = ObservationType.create_type(
+        {"velocity": ObservedQuantitiesValueType.vector})
+    assert data._match_type(data_type)
+    assert len(points) == 1
+    assert data.head()[1].tail().velocity[0] == 4.0
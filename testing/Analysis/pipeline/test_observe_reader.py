@@ -0,0 +1,56 @@
+from gm_base.flow_util import ObservedQuantitiesValueType
+from Analysis.pipeline.observe_reader import read_observe_file
+import numpy as np
+import pytest
+import yaml
+
+
+def write_observe_file(file, n_points, n_frames):
+    data = {
+        "points": [{"name": "p{0}".format(i), "init_point": [i, 0, 0], "snap_dim": 3,
+                    "observe_point": [i, 0.5, 1]} for i in range(n_points)],
+        "data": [{"time": 0.5 * t,
+                  "pressure": [t + 0.25 * i for i in range(n_points)],
+                  "region_id": [i for i in range(n_points)],
+                  "velocity": [[t, i, 1.0] for i in range(n_points)],
+                  "tensor": [[[t, i, 2], [3, 4, 5], [6, 7, float("nan")]] for i in range(n_points)]}
+                 for t in range(n_frames)]}
+    with open(file, "w") as file_d:
+        yaml.safe_dump(data, file_d, sort_keys=False)
+
+
+@pytest.mark.parametrize("use_libyaml", [True, False])
+def test_read_observe_file(tmpdir, use_libyaml):
+    observed_quantities = {"pressure": ObservedQuantitiesValueType.scalar,
+                           "region_id": ObservedQuantitiesValueType.integer,
+                           "velocity": ObservedQuantitiesValueType.vector,
+                           "tensor": ObservedQuantitiesValueType.tensor}
+    file = str(tmpdir.join("flow_observe.yaml"))
+    write_observe_file(file, 4, 40)
+
+    data = read_observe_file(file, observed_quantities, use_libyaml=use_libyaml)
+    assert data.names == ["p0", "p1", "p2", "p3"]
+    assert data.points.shape == (4, 3)
+    assert data.points[2].tolist() == [2.0, 0.5, 1.0]
+    assert data.times.shape == (40,)
+    assert data.times[-1] == 19.5
+    assert data.values["pressure"].shape == (40, 4, 1)
+    assert data.values["pressure"][39, 3, 0] == 39.75
+    assert data.values["region_id"].dtype == np.int64
+    assert data.values["region_id"][5, :, 0].tolist() == [0, 1, 2, 3]
+    assert data.values["velocity"][7, 1].tolist() == [7.0, 1.0, 1.0]
+    assert data.values["tensor"].shape == (40, 4, 9)
+    assert data.values["tensor"][3, 2, :3].tolist() == [3.0, 2.0, 2.0]
+    assert np.isnan(data.values["tensor"][3, 2, 8])
+
+    # selected points and quantities
+    data = read_observe_file(file, observed_quantities, ["p3", "p1", "unknown"], ["velocity"],
+                             use_libyaml=use_libyaml)
+    assert data.names == ["p3", "p1"]
+    assert list(data.values) == ["velocity"]
+    assert data.values["velocity"][10, :, 1].tolist() == [3.0, 1.0]
+
+    # missing quantity
+    with pytest.raises(ValueError):
+        read_observe_file(file, {"flux": ObservedQuantitiesValueType.scalar},
+                          use_libyaml=use_libyaml)
@@ -20,7 +20,8 @@ this_source_dir = os.path.dirname(os.path.realpath(__file__))
 
 
 @pytest.mark.slow
-def test_run_pipeline(request, change_dir_back):
+@pytest.mark.parametrize("n_workers", [None, 1, 8])
+def test_run_pipeline(request, change_dir_back, n_workers):
     def clear_backup():
         shutil.rmtree("backup", ignore_errors=True)
         shutil.rmtree("action_3_0", ignore_errors=True)
@@ -44,7 +45,7 @@ def test_run_pipeline(request, change_dir_back):
     foreach = ForEach(Inputs=[gen], WrappedAction=workflow)
     pipeline=Pipeline(ResultActions=[foreach])
     pipeline._inicialize()
-    pp = Pipelineprocessor(pipeline)
+    pp = Pipelineprocessor(pipeline, n_workers=n_workers)
     errs = pp.validate()
     
     assert len(errs)==0
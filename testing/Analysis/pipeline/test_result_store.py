@@ -0,0 +1,112 @@
+from Analysis.pipeline.data_types_tree import *
+from Analysis.pipeline.flow_data_types import *
+from Analysis.pipeline.connector_actions import *
+from Analysis.pipeline.generator_actions import *
+from Analysis.pipeline.pipeline import *
+from Analysis.pipeline.convertors import *
+from Analysis.pipeline.generic_tree import *
+from Analysis.pipeline.result_store import StoreFormat
+import Analysis.pipeline.result_store as result_store
+import Analysis.pipeline.action_types as action
+import io
+import os
+import pytest
+
+
+def balance_data(n):
+    regions = ["a", "b"]
+    quantities = ["water_volume"]
+    balance = BalanceType.create_type(regions, quantities)
+    for i in range(n):
+        data = BalanceType.create_iner_test_data(regions, quantities)
+        data.flux = i * 0.5
+        balance.add_item(Tuple(Float(i * 0.5), data))
+    return balance
+
+
+@pytest.mark.parametrize("value", [
+    Int(), Int(-5), Int(2**80), Float(), Float(1.5), Float(float("inf")), Bool(), Bool(False),
+    String(), String("text"), MeshType("mesh.msh"), SimulationTime(2.0),
+    Enum(["a", "b"]), Enum(["a", "b"], "b"),
+    Struct(), Struct(a=Int(1), b=Tuple(Float(1.0), String("x"))),
+    Ensemble(Int()), Sequence(Int(), Int(1), Int(2), Int(2**70)),
+    Sequence(Struct(a=Float()), Struct(a=Float(1.0)), Struct(a=Float())),
+    Sequence(Struct(name=String(), point=Tuple(Float(), Float(), Float())),
+             Struct(name=String("p1"), point=Tuple(Float(1), Float(2), Float(3))),
+             Struct(name=String("p2"), point=Tuple(Float(4), Float(5), Float(6)))),
+    Sequence(Sequence(Int()), Sequence(Int(), Int(1)), Sequence(Int(), Int(2), Int(3))),
+    balance_data(100)
+])
+def test_round_trip(value):
+    data = result_store.dumps(value)
+    restored = result_store.loads(data)
+    assert type(restored) is type(value)
+    assert restored._get_settings_script() == value._get_settings_script()
+
+
+def test_columns():
+    balance = balance_data(1000)
+    data = result_store.dumps(balance)
+    assert len(data) < len("\n".join(balance._get_settings_script())) / 5
+    items = list(result_store.iter_items(io.BytesIO(data)))
+    assert len(items) == 1000
+    assert items[10][1].flux == 5.0
+    assert items[10][1].region == "a"
+    assert items[999][0] == 499.5
+
+    with pytest.raises(result_store.StoreError):
+        result_store.loads(data[:-1])
+    with pytest.raises(result_store.StoreError):
+        result_store.dumps(Struct(a=Input(0)))
+
+
+def test_column_sequence():
+    subtype = balance_data(0).subtype
+    plain = balance_data(100)
+    columns = ColumnSequence(subtype)
+    for item in plain:
+        columns.add_item(item)
+    data = result_store.dumps(Struct(balance=columns, empty=ColumnSequence(subtype)))
+    assert data == result_store.dumps(Struct(balance=plain, empty=Sequence(subtype)))
+    restored = result_store.loads(data)
+    assert type(restored.balance) is Sequence
+    assert restored.balance._get_settings_script() == columns._get_settings_script()
+
+
+def test_store_restore(tmpdir):
+    action.__action_counter__ = 0
+    vg = VariableGenerator(Variable=Struct(balance=balance_data(10)))
+    connector = Connector(Inputs=[vg])
+    connector.set_config(Convertor=Convertor(Input(0)))
+    pipeline = Pipeline(ResultActions=[connector], StoreFormat=StoreFormat.binary)
+    pipeline._inicialize()
+    assert len(pipeline.validate()) == 0
+    assert "StoreFormat='binary'" in "\n".join(pipeline._get_settings_script())
+
+    path = str(tmpdir)
+    os.makedirs(os.path.join(path, "store"))
+    os.makedirs(os.path.join(path, "restore"))
+    for store_format in StoreFormat.formats:
+        pipeline._set_store_format(store_format)
+        assert connector._store_format == store_format
+        vg._update()
+        connector._update()
+        connector._store_results(path)
+        name = "{0}_{1}".format(connector.name, connector._store_id)
+        os.replace(os.path.join(path, "store", name), os.path.join(path, "restore", name))
+        with open(os.path.join(path, "restore", name), "rb") as file_d:
+            assert result_store.is_binary(file_d) == (store_format == StoreFormat.binary)
+
+        output = connector._output
+        connector._output = None
+        vg._restore_id = vg._store_id
+        connector._restore_id = connector._store_id
+        connector._restore_results(path)
+        assert connector._restore_id is not None
+        assert connector._output._get_settings_script() == output._get_settings_script()
+    # format is set only to actions of the pipeline
+    assert action.BaseActionType._store_format == StoreFormat.text
+
+    pipeline = Pipeline(ResultActions=[connector], StoreFormat="xml")
+    pipeline._inicialize()
+    assert len(pipeline._check_params()) == 1
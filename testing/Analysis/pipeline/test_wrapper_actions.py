@@ -7,6 +7,7 @@ from Analysis.pipeline.pipeline import *
 from Analysis.pipeline.pipeline_processor import *
 import Analysis.pipeline.action_types as action
 from .pomfce import *
+import json
 import shutil
 import pytest
 
@@ -91,6 +92,51 @@ def test_calibration_termination_criteria():
     assert tt(t, m) == 3
 
 
+def test_calibration_evaluation_cache(tmpdir):
+    output = Struct(y1=Float(1.5), y2=Float(-0.25))
+    cache = CalibrationEvaluationCache()
+
+    # practically identical points share one record
+    cache.add_output(np.array([0.1 + 0.2, 1.0]), output)
+    assert np.array([0.3, 1.0]) in cache
+    assert np.array([0.3, 1.1]) not in cache
+    assert cache.get_output([0.3, 1.0]) is output
+    assert len(cache) == 1
+
+    cache.add_jac([0.3, 1.0], np.eye(2))
+    assert np.all(cache.get_jac([0.1 + 0.2, 1.0]) == np.eye(2))
+    assert cache.get_jac([0.3, 1.1]) is None
+
+    # persistence
+    file = os.path.join(str(tmpdir), "cache")
+    cache.set_store_file(file)
+    cache.add_output([2.0, 3.0], Struct(y1=Float(2.5), y2=Float(3.5)))
+
+    cache2 = CalibrationEvaluationCache()
+    assert cache2.load(file) == 2
+    assert cache2.get_output([0.3, 1.0]).y2.value == -0.25
+    assert cache2.get_output([2.0, 3.0]).y1.value == 2.5
+    assert cache2.load(os.path.join(str(tmpdir), "missing")) == 0
+
+    # points within tolerance share one record
+    cache3 = CalibrationEvaluationCache(tolerances=[0.01, 0.0])
+    cache3.add_output([0.3001, 1.0], output)
+    assert cache3.get_output([0.3032, 1.0]) is output
+    assert [0.32, 1.0] not in cache3
+    assert [0.3001, 1.0 + 1e-6] not in cache3
+    assert len(cache3) == 1
+
+    # points are persisted, outputs are not evaluated
+    file3 = os.path.join(str(tmpdir), "cache3")
+    cache3.set_store_file(file3)
+    with open(file3, 'a') as fd:
+        fd.write(json.dumps({"x": [5.0, 5.0], "output": "Struct(y1=Float(1.0))"}) + "\n")
+    cache4 = CalibrationEvaluationCache(tolerances=[0.01, 0.0])
+    assert cache4.load(file3) == 1
+    assert cache4.get_output([0.3, 1.0]).y1.value == 1.5
+    assert [5.0, 5.0] not in cache4
+
+
 @pytest.mark.skip
 def test_calibration(request, change_dir_back):
     def clear_backup():
@@ -190,3 +236,110 @@ def test_calibration(request, change_dir_back):
 
     # test residual
     assert cal._output.result.residual.value < 0.01
+
+
+def test_calibration_diff(request, change_dir_back):
+    def clear_backup():
+        shutil.rmtree("backup", ignore_errors=True)
+    request.addfinalizer(clear_backup)
+
+    os.chdir(this_source_dir)
+
+    action.__action_counter__ = 0
+    gen = VariableGenerator(
+        Variable=(
+            Struct(
+                observations=Struct(
+                    y1=Float(1.0),
+                    y2=Float(5.0)
+                )
+            )
+        )
+    )
+    w = Workflow()
+    f = FunctionAction(
+        Inputs=[
+            w.input()
+        ],
+        Params=["x1", "x2"],
+        Expressions=["y1 = 2 * x1 + 2", "y2 = 2 * x2 + 3"]
+    )
+    w.set_config(
+        OutputAction=f,
+        InputAction=f
+    )
+    cal = Calibration(
+        Inputs=[
+            gen
+        ],
+        WrappedAction=w,
+        Parameters=[
+            CalibrationParameter(
+                name="x1",
+                group="pokus",
+                bounds=(-10.0, 10.0),
+                init_value=1.0
+            ),
+            CalibrationParameter(
+                name="x2",
+                group="pokus",
+                bounds=(-10.0, 10.0),
+                init_value=1.0
+            )
+        ],
+        Observations=[
+            CalibrationObservation(
+                name="y1",
+                group="tunel",
+                weight=1.0
+            ),
+            CalibrationObservation(
+                name="y2",
+                group="tunel",
+                weight=1.0
+            )
+        ],
+        AlgorithmParameters=[
+            CalibrationAlgorithmParameter(
+                group="pokus",
+                diff_inc_rel=0.01,
+                diff_inc_abs=0.0
+            )
+        ],
+        TerminationCriteria=CalibrationTerminationCriteria(
+            n_max_steps=5
+        ),
+        MinimizationMethod="DIFF",
+        BoundsType=CalibrationBoundsType.hard,
+        CacheTolerance=1e-6
+    )
+    p = Pipeline(
+        ResultActions=[cal]
+    )
+
+    pp = Pipelineprocessor(p)
+    err = pp.validate()
+    assert len(err) == 0
+    assert "CacheTolerance=1e-06" in "\n".join(cal._get_settings_script())
+    assert np.allclose(cal._cache_tolerances(), [2e-5, 2e-5])
+
+
+    # run pipeline
+    pp.run()
+    i = 0
+
+    while pp.is_run():
+        time.sleep(0.1)
+
+        i += 1
+        assert i < 3000, "Timeout"
+
+    # every point is evaluated just once
+    assert cal._scipy_model_eval_num == len(cal._scipy_cache)
+    # points within tolerance share evaluation
+    x = cal._scipy_iterations[-1][0]
+    x_cell = np.array(cal._scipy_cache.key(x)) * 2e-5
+    assert cal._scipy_cache.get_output(x_cell + 0.8e-5) is cal._scipy_cache.get_output(x)
+
+    # test residual, initial value is 9.0
+    assert cal._output.result.residual.value < 9.0
@@ -0,0 +1,267 @@
+from JobPanel.backend.async_repeater import AsyncRepeater
+from JobPanel.backend.connection import ConnectionLocal
+import JobPanel.backend.async_repeater as ar
+
+import pytest
+
+import threading
+import time
+
+
+def make_tree(levels):
+    """
+    Create chain of repeaters [] -> [1] -> [1, 1] ..., return list of repeaters
+    after all connections are established.
+    """
+    events = [threading.Event() for i in range(levels)]
+    repeaters = [AsyncRepeater([], message_event=events[0])]
+    repeaters[0].run()
+    for level in range(1, levels):
+        parent = repeaters[-1]
+        child_id, remote_port = parent.add_child(ConnectionLocal())
+        child = AsyncRepeater(parent.repeater_address + [child_id], ("localhost", remote_port),
+                              message_event=events[level])
+        child.run()
+        repeaters.append(child)
+
+        # answer to the connect request
+        answers = []
+        for i in range(100):
+            answers = parent.get_answers(child_id)
+            if len(answers) > 0:
+                break
+            time.sleep(0.05)
+        assert answers[0].id == 0
+        assert answers[0].on_answer["action"] == "on_answer_connect"
+    return repeaters, events
+
+
+def close_tree(repeaters):
+    for repeater in reversed(repeaters):
+        repeater.close()
+
+
+class EchoService:
+    """Service answering requests in separate thread."""
+    def __init__(self, repeater, event):
+        self.repeater = repeater
+        self.event = event
+        self.closing = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.closing:
+            self.event.wait(0.1)
+            self.event.clear()
+            for request in self.repeater.get_requests():
+                self.repeater.send_answer(request.id, {"data": request.request["data"]})
+
+    def close(self):
+        self.closing = True
+        self.thread.join()
+
+
+def round_trips(root, event, n_requests, window):
+    """
+    Send n_requests to [1, 1] with at most window requests in flight,
+    return list of answers.
+    """
+    answers = []
+    sent = 0
+    while len(answers) < n_requests:
+        while sent < n_requests and sent - len(answers) < window:
+            root.send_request([1, 1], {"action": "echo", "data": sent}, sent)
+            sent += 1
+        event.wait(1)
+        event.clear()
+        answers.extend(root.get_answers(1))
+    return answers
+
+
+def test_request_tree():
+    repeaters, events = make_tree(3)
+    service = EchoService(repeaters[2], events[2])
+    try:
+        answers = round_trips(repeaters[0], events[0], 50, 10)
+        assert sorted(answer.on_answer for answer in answers) == list(range(50))
+        for answer in answers:
+            assert answer.answer == {"data": answer.on_answer}
+            assert answer.request["data"] == answer.on_answer
+            assert answer.sender == [1, 1]
+
+        # unknown recipient
+        repeaters[0].send_request([1, 5], {"action": "echo", "data": None}, None)
+        answers = []
+        while len(answers) == 0:
+            events[0].wait(1)
+            answers = repeaters[0].get_answers(1)
+        assert answers[0].answer["error"] == "Unknown recipient"
+        assert answers[0].answer["recipient"] == [1, 5]
+
+        # removed child
+        repeaters[0].remove_child(1)
+        for i in range(100):
+            repeaters[0].discard_closed_childs()
+            if 1 not in repeaters[0].clients:
+                break
+            time.sleep(0.01)
+        assert 1 not in repeaters[0].clients
+    finally:
+        service.close()
+        close_tree(repeaters)
+
+
+class Owner:
+    """Owner of the protocol collecting received messages."""
+    def __init__(self):
+        self.messages = []
+
+    def _message_received(self, protocol, msg):
+        self.messages.append(msg)
+
+
+def test_frames():
+    data = {"reports": {str(i): {"status": 3, "time": i * 0.5} for i in range(1000)}}
+    frame = ar._pack_message(5, [1], [2, 3], data)
+    assert len(frame) < len(ar._encode(data, 0)) / 5
+    msg = ar._unpack_message(frame)
+    assert (msg.id, msg.sender, msg.recipient) == (5, [1], [2, 3])
+    assert msg.data == data
+
+    # forwarding keeps encoded data
+    forwarded = ar._unpack_message(ar._unpack_message(frame).forward([3]))
+    assert forwarded.recipient == [3]
+    assert forwarded._payload == msg._payload
+    assert forwarded.data == data
+
+    # frames split at any position
+    small = ar._pack_message(6, [], [], {"data": None})
+    stream = frame + small + frame
+    owner = Owner()
+    protocol = ar._FrameProtocol(owner)
+    for i in range(0, len(stream), 1000):
+        protocol.data_received(stream[i:i + 1000])
+    assert [m.id for m in owner.messages] == [5, 6, 5]
+    assert owner.messages[1].data == {"data": None}
+    assert owner.messages[2].data == data
+    assert len(protocol._received_data) == 0
+
+
+MSGPACK_DATA = b"\x81\xa4data\xc0"
+"""{"data": None} encoded by msgpack"""
+
+
+def test_codec_agreement(monkeypatch):
+    monkeypatch.setattr(ar, "_CODECS", ["msgpack"])
+    protocol = ar._FrameProtocol(Owner())
+    peer_hello = ar._hello_frame()
+    protocol.data_received(peer_hello)
+    assert protocol.flags == ar._FLAG_MSGPACK
+    assert protocol.owner.messages == []
+
+    # peer without msgpack
+    monkeypatch.setattr(ar, "_CODECS", [])
+    protocol = ar._FrameProtocol(Owner())
+    protocol.data_received(ar._hello_frame())
+    assert protocol.flags == 0
+
+    # this side without msgpack
+    protocol = ar._FrameProtocol(Owner())
+    protocol.data_received(peer_hello)
+    assert protocol.flags == 0
+
+
+def test_msgpack_to_peer_without_msgpack(monkeypatch):
+    monkeypatch.setattr(ar, "msgpack", None)
+    monkeypatch.setattr(ar, "_CODECS", [])
+
+    # routing is decoded, data are marked as not decodable
+    owner = Owner()
+    protocol = ar._FrameProtocol(owner)
+    frame = ar._pack_frame(ar._FLAG_MSGPACK, 7, [1], [], MSGPACK_DATA)
+    protocol.data_received(frame + ar._pack_message(8, [1], [], {"data": None}))
+    assert [(m.id, m.sender, m.decodable) for m in owner.messages] == [(7, [1], False), (8, [1], True)]
+    assert owner.messages[1].data == {"data": None}
+
+    # request is answered by error and connection is kept
+    repeaters, events = make_tree(2)
+    service = EchoService(repeaters[1], events[1])
+    try:
+        client = repeaters[0].clients[1]
+        client.sent_requests[1000] = ({"action": "echo"}, "msgpack")
+        frame = ar._pack_frame(ar._FLAG_MSGPACK, 1000, client.repeater_address, [], MSGPACK_DATA)
+        repeaters[0]._loop.call_soon_threadsafe(client._protocol.transport.write, frame)
+        repeaters[0].send_request([1], {"action": "echo", "data": 1}, "json")
+        answers = []
+        for i in range(100):
+            events[0].wait(0.1)
+            events[0].clear()
+            answers.extend(repeaters[0].get_answers(1))
+            if len(answers) == 2:
+                break
+        answers = {answer.on_answer: answer.answer for answer in answers}
+        assert answers["msgpack"]["error"] == "Unsupported encoding"
+        assert answers["json"] == {"data": 1}
+    finally:
+        service.close()
+        close_tree(repeaters)
+
+
+def test_write_to_peer_without_msgpack():
+    pytest.importorskip("msgpack")
+
+    class Loop:
+        def call_soon(self, callback):
+            pass
+
+    owner = Owner()
+    owner._loop = Loop()
+    protocol = ar._FrameProtocol(owner)
+    frame = ar._pack_message(5, [1], [2], {"data": 1}, ar._FLAG_MSGPACK)
+    protocol.write(frame)
+    protocol.flags = ar._FLAG_MSGPACK
+    protocol.write(frame)
+    # forwarded frame is re-encoded only for peer without msgpack
+    assert protocol._out[0][0] & ar._FLAG_MSGPACK == 0
+    assert ar._unpack_message(protocol._out[0]).data == {"data": 1}
+    assert protocol._out[1] == frame
+
+
+def test_big_answer():
+    repeaters, events = make_tree(3)
+    service = EchoService(repeaters[2], events[2])
+    try:
+        data = ["item {}".format(i) for i in range(100000)]
+        repeaters[0].send_request([1, 1], {"action": "echo", "data": data}, None)
+        answers = []
+        while len(answers) == 0:
+            events[0].wait(1)
+            answers = repeaters[0].get_answers(1)
+        assert answers[0].answer == {"data": data}
+    finally:
+        service.close()
+        close_tree(repeaters)
+
+
+def benchmark_repeater():
+    """
+    Round trips of requests through 3-level repeater tree,
+    sequential (one request in flight) and pipelined.
+    """
+    repeaters, events = make_tree(3)
+    service = EchoService(repeaters[2], events[2])
+    try:
+        for n_requests, window in [(500, 1), (5000, 100)]:
+            start = time.perf_counter()
+            round_trips(repeaters[0], events[0], n_requests, window)
+            t = time.perf_counter() - start
+            print("{:5} requests, window {:4}: {:8.1f} requests/s  {:8.3f} ms/request".format(
+                n_requests, window, n_requests / t, t / n_requests * 1000))
+    finally:
+        service.close()
+        close_tree(repeaters)
+
+
+if __name__ == '__main__':
+    benchmark_repeater()
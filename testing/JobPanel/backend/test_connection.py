@@ -6,6 +6,7 @@
 # TODO: Run in Tox virtual environment, try to set $HOME to a test directory and setup prerequisities
 
 from JobPanel.backend.connection import *
+from JobPanel.backend import manifest
 from JobPanel.backend.service_base import ServiceBase, ServiceStatus
 from JobPanel.backend.service_proxy import ServiceProxy
 from testing.JobPanel.mock.passwords import get_test_password, get_passwords
@@ -20,6 +21,7 @@ import time
 import stat
 import pytest
 import subprocess
+import sys
 
 logging.basicConfig(filename='test_connection.log', filemode='w', level=logging.INFO)
 
@@ -608,3 +610,266 @@ def test_mc_delegator_pbs(request):
     assert answer[-1]["data"] is True
 
     con.close_connections()
+
+
+class LocalSftp:
+    """
+    SFTP session mockup working on local file system, counts calls.
+    """
+    def __init__(self, calls):
+        self._calls = calls
+
+    def _count(self, name):
+        self._calls[name] = self._calls.get(name, 0) + 1
+
+    def get_channel(self):
+        class Channel:
+            def settimeout(self, timeout):
+                pass
+        return Channel()
+
+    def close(self):
+        pass
+
+    def mkdir(self, path):
+        self._count("mkdir")
+        os.mkdir(path)
+
+    def stat(self, path):
+        self._count("stat")
+        return paramiko.SFTPAttributes.from_stat(os.stat(path))
+
+    def lstat(self, path):
+        self._count("stat")
+        return paramiko.SFTPAttributes.from_stat(os.lstat(path))
+
+    def listdir_attr(self, path):
+        self._count("listdir")
+        return [paramiko.SFTPAttributes.from_stat(os.lstat(os.path.join(path, name)), name)
+                for name in os.listdir(path)]
+
+    def put(self, loc, rem):
+        self._count("put")
+        shutil.copyfile(loc, rem)
+
+    def get(self, rem, loc):
+        self._count("get")
+        shutil.copyfile(rem, loc)
+
+    def remove(self, path):
+        os.remove(path)
+
+    def symlink(self, source, dest):
+        os.symlink(source, dest)
+
+    def readlink(self, path):
+        return os.readlink(path)
+
+    def utime(self, path, times):
+        os.utime(path, times)
+
+
+def test_ssh_transfer_engine(request):
+    def finalizer():
+        shutil.rmtree(TEST_FILES, ignore_errors=True)
+    request.addfinalizer(finalizer)
+
+    # local tree
+    loc = os.path.abspath(os.path.join(TEST_FILES, "loc"))
+    rem = os.path.abspath(os.path.join(TEST_FILES, "rem"))
+    loc2 = os.path.abspath(os.path.join(TEST_FILES, "loc2"))
+    files = []
+    for i in range(3):
+        for j in range(10):
+            file = os.path.join("tree", "d{}".format(i), "f{}".format(j))
+            files.append(file)
+            os.makedirs(os.path.dirname(os.path.join(loc, file)), exist_ok=True)
+            with open(os.path.join(loc, file), 'w') as fd:
+                fd.write("x" * (i * 100 + j))
+            os.utime(os.path.join(loc, file), (time.time() - 100, time.time() - 100))
+    os.makedirs(rem)
+
+    # connection with mockup sessions
+    calls = {}
+
+    class SSH:
+        def open_sftp(self):
+            return LocalSftp(calls)
+
+    con = ConnectionSSH({})
+    con._status = ConnectionStatus.online
+    con._sftp_pool = ConnectionSSH.SftpPool(SSH(), 10)
+
+    # upload
+    con.upload(["tree"], loc, rem)
+    for file in files:
+        with open(os.path.join(rem, file)) as fd:
+            assert len(fd.read()) == int(file[-1]) + int(file[-4]) * 100
+    assert calls["put"] == 30
+    assert calls["mkdir"] == 4
+
+    # remote dirs are cached
+    con.upload([os.path.join("tree", "d0", "f0")], loc, rem)
+    assert calls["mkdir"] == 4
+    assert calls["put"] == 31
+
+    # unchanged files are skipped
+    con.upload(["tree"], loc, rem, skip_unchanged=True)
+    assert calls["put"] == 61
+    con.upload(["tree"], loc, rem, skip_unchanged=True)
+    assert calls["put"] == 61
+    with open(os.path.join(loc, files[5]), 'w') as fd:
+        fd.write("changed")
+    con.upload(["tree"], loc, rem, skip_unchanged=True)
+    assert calls["put"] == 62
+
+    # download
+    con.download(["tree"], loc2, rem, skip_unchanged=True)
+    assert calls["get"] == 30
+    for file in files:
+        with open(os.path.join(loc, file)) as fd1, open(os.path.join(loc2, file)) as fd2:
+            assert fd1.read() == fd2.read()
+    con.download(["tree"], loc2, rem, skip_unchanged=True)
+    assert calls["get"] == 30
+    con.download([files[0]], loc2, rem)
+    assert calls["get"] == 31
+
+    # only priority transfers use sessions from priority reserve
+    pool = con._sftp_pool
+    busy = [pool.acquire() for i in range(5 - pool.PRIORITY_RESERVE - 1)]
+    for priority, n_sessions in [(False, 1), (True, con.MAX_TRANSFER_SESSIONS)]:
+        sftp = pool.acquire(priority)
+        assert pool.try_acquire() is None
+        used = set()
+
+        def transfer(s, item):
+            used.add(id(s))
+            time.sleep(0.05)
+        con._run_transfers(sftp, priority, list(range(10)), transfer)
+        pool.release(sftp)
+        assert len(used) == n_sessions
+    for sftp in busy:
+        pool.release(sftp)
+
+    # all sessions returned to pool
+    assert len(con._sftp_pool._pool) == 5
+    con._sftp_pool.close()
+    con._sftp_pool = None
+    con._status = ConnectionStatus.not_connected
+
+
+def test_sync_download(request):
+    def finalizer():
+        shutil.rmtree(TEST_FILES, ignore_errors=True)
+    request.addfinalizer(finalizer)
+
+    rem = os.path.abspath(os.path.join(TEST_FILES, "rem"))
+    loc = os.path.abspath(os.path.join(TEST_FILES, "loc"))
+    for i in range(5):
+        os.makedirs(os.path.join(rem, "mj", "d{}".format(i)), exist_ok=True)
+        with open(os.path.join(rem, "mj", "d{}".format(i), "f"), 'w') as fd:
+            fd.write("content {}".format(i))
+    os.makedirs(loc)
+
+    con = ConnectionLocal({})
+    cache_dir = os.path.join("mj", ".geomop")
+
+    # first sync downloads all, cache is not part of manifest
+    assert len(con.sync_download(["mj"], loc, rem, cache_dir=cache_dir)) == 5
+    for prefix in [loc, rem]:
+        cache = manifest.load_manifest(os.path.join(prefix, cache_dir, manifest.MANIFEST_FILE_NAME))
+        assert len(cache) == 5
+    assert not os.path.exists(os.path.join(loc, manifest.MANIFEST_FILE_NAME))
+    with open(os.path.join(loc, "mj", "d3", "f")) as fd:
+        assert fd.read() == "content 3"
+
+    # nothing changed
+    assert con.sync_download(["mj"], loc, rem, cache_dir=cache_dir) == []
+
+    # changed and new files
+    with open(os.path.join(rem, "mj", "d1", "f"), 'w') as fd:
+        fd.write("changed")
+    with open(os.path.join(rem, "mj", "new"), 'w') as fd:
+        fd.write("new")
+    assert con.sync_download(["mj"], loc, rem, cache_dir=cache_dir) == [os.path.join("mj", "d1", "f"), os.path.join("mj", "new")]
+    with open(os.path.join(loc, "mj", "d1", "f")) as fd:
+        assert fd.read() == "changed"
+
+    # interrupted download is resumed, corrupted file is downloaded again
+    with open(os.path.join(loc, "mj", "d2", "f"), 'w') as fd:
+        fd.write("cont")
+    assert con.sync_download(["mj"], loc, rem, cache_dir=cache_dir) == [os.path.join("mj", "d2", "f")]
+
+    # missing path
+    with pytest.raises(FileNotFoundError):
+        con.sync_download(["missing"], loc, rem, cache_dir=cache_dir)
+
+    # concurrent saves of one cache are merged
+    cache_file = os.path.join(rem, "cache", manifest.MANIFEST_FILE_NAME)
+    threads = [threading.Thread(target=manifest.save_manifest,
+                                args=(cache_file, {"d{}".format(i): [i, 0, ""]}, ["d{}".format(i)]))
+               for i in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(manifest.load_manifest(cache_file)) == 10
+    manifest.save_manifest(cache_file, {}, ["d3"])
+    assert "d3" not in manifest.load_manifest(cache_file)
+
+
+class SlowOutput:
+    """Stdout of remote command, output is available after delay, read times out like channel."""
+    def __init__(self, data, delay, timeout):
+        self.channel = self
+        self._data = data
+        self._delay = delay
+        self._timeout = timeout
+
+    def read(self):
+        if self._timeout is not None and self._timeout < self._delay:
+            time.sleep(self._timeout)
+            raise socket.timeout
+        time.sleep(self._delay)
+        return self._data
+
+    def recv_exit_status(self):
+        return 0
+
+
+class SlowExecSSH:
+    """SSH executing commands locally, output comes after delay."""
+    def __init__(self, delay):
+        self.delay = delay
+
+    def exec_command(self, command, timeout=None):
+        data = subprocess.run(command, shell=True, stdout=subprocess.PIPE).stdout
+        return None, SlowOutput(data, self.delay, timeout), None
+
+    def close(self):
+        pass
+
+
+def test_slow_remote_manifest(request):
+    def finalizer():
+        shutil.rmtree(TEST_FILES, ignore_errors=True)
+    request.addfinalizer(finalizer)
+
+    rem = os.path.abspath(os.path.join(TEST_FILES, "rem"))
+    os.makedirs(os.path.join(rem, "mj"))
+    with open(os.path.join(rem, "mj", "f"), 'w') as fd:
+        fd.write("content")
+
+    con = ConnectionSSH({})
+    con._status = ConnectionStatus.online
+    con.environment.python = sys.executable
+    con.environment.geomop_root = geomop_root_local
+    con._ssh = SlowExecSSH(0.5)
+    # hashing of files takes longer than timeout of ssh operations
+    con._timeout = 0.1
+    res = con._remote_manifest(["mj"], rem, cache_dir=os.path.join("mj", ".geomop"))
+    assert list(res.keys()) == [os.path.join("mj", "f")]
+    assert os.path.isfile(os.path.join(rem, "mj", ".geomop", manifest.MANIFEST_FILE_NAME))
+    with pytest.raises(SSHTimeoutError):
+        con._exec_command("true")
+    con._status = ConnectionStatus.not_connected
@@ -0,0 +1,145 @@
+from JobPanel.backend.executor import parse_qstat_output, PbsStatusPoller, LocalProcessPoller
+from JobPanel.backend.service_base import ServiceStatus
+import JobPanel.backend.executor as executor
+
+import psutil
+import subprocess
+import sys
+import time
+
+
+QSTAT_OUTPUT = """Job Id: 101.meta-pbs.metacentrum.cz
+    Job_Name = job_1
+    job_state = Q
+    queue = short
+
+Job Id: 102.meta-pbs.metacentrum.cz
+    Job_Name = job_2
+    job_state = R
+    queue = short
+
+Job Id: 103.meta-pbs.metacentrum.cz
+    Job_Name = job_3
+    job_state = F
+"""
+
+
+def test_parse_qstat_output():
+    res = parse_qstat_output(QSTAT_OUTPUT)
+    assert res["101.meta-pbs.metacentrum.cz"]["status"] == ServiceStatus.queued
+    assert res["102.meta-pbs.metacentrum.cz"]["status"] == ServiceStatus.running
+    assert res["103.meta-pbs.metacentrum.cz"]["status"] == ServiceStatus.done
+    assert res["102"]["status"] == ServiceStatus.running
+    assert res["102"]["raw"].splitlines() == ["Job Id: 102.meta-pbs.metacentrum.cz",
+                                              "    Job_Name = job_2",
+                                              "    job_state = R",
+                                              "    queue = short"]
+    assert parse_qstat_output("") == {}
+
+
+def test_pbs_status_poller():
+    calls = []
+
+    def qstat(pid_list):
+        calls.append(pid_list)
+        return QSTAT_OUTPUT
+
+    poller = PbsStatusPoller(ttl=1000.0)
+    poller._qstat = qstat
+
+    res = poller.get_status(["101.meta-pbs.metacentrum.cz", "102.meta-pbs.metacentrum.cz"])
+    assert res["101.meta-pbs.metacentrum.cz"]["status"] == ServiceStatus.queued
+    assert len(calls) == 1
+
+    # cached
+    res = poller.get_status(["102.meta-pbs.metacentrum.cz"])
+    assert res["102.meta-pbs.metacentrum.cz"]["status"] == ServiceStatus.running
+    assert len(calls) == 1
+
+    # new job, all tracked jobs in one call
+    res = poller.get_status(["103", "104"])
+    assert res["103"]["status"] == ServiceStatus.done
+    assert res["104"]["status"] is None
+    assert len(calls) == 2
+    assert set(calls[1]) == {"101.meta-pbs.metacentrum.cz", "102.meta-pbs.metacentrum.cz", "103", "104"}
+
+    # expired cache
+    poller.ttl = 0.0
+    poller.get_status(["101.meta-pbs.metacentrum.cz"])
+    assert len(calls) == 3
+
+
+def test_pbs_status_poller_failure():
+    calls = []
+    output = [None]
+
+    def qstat(pid_list):
+        calls.append(pid_list)
+        return output[0]
+
+    poller = PbsStatusPoller(ttl=1000.0)
+    poller._qstat = qstat
+
+    res = poller.get_status(["101.meta-pbs.metacentrum.cz"])
+    assert res["101.meta-pbs.metacentrum.cz"]["status"] is None
+    assert len(calls) == 1
+
+    # failed qstat is not repeated before ttl passes, even for new jobs
+    poller.get_status(["101.meta-pbs.metacentrum.cz"])
+    poller.get_status(["103"])
+    assert len(calls) == 1
+
+    output[0] = QSTAT_OUTPUT
+    poller._retry_time = 0.0
+    res = poller.get_status(["103"])
+    assert res["103"]["status"] == ServiceStatus.done
+    assert len(calls) == 2
+
+
+BUSY_SCRIPT = """
+import subprocess, sys
+child = subprocess.Popen([sys.executable, "-c", "while True: pass"])
+child.wait()
+"""
+
+
+def test_local_process_poller(monkeypatch):
+    scans = []
+    process_iter = psutil.process_iter
+
+    def counting_process_iter(*args, **kwargs):
+        scans.append(1)
+        return process_iter(*args, **kwargs)
+    monkeypatch.setattr(executor.psutil, "process_iter", counting_process_iter)
+
+    # wrapper process with busy child
+    p = psutil.Popen([sys.executable, "-c", BUSY_SCRIPT])
+    try:
+        process_id = "{}@{}".format(p.pid, p.create_time())
+        wrong_id = "{}@{}".format(p.pid, p.create_time() + 1)
+        poller = LocalProcessPoller(ttl=1000.0)
+        res = poller.get_status([process_id, wrong_id, ""])
+        assert res[process_id]["running"]
+        assert not res[wrong_id]["running"]
+        assert not res[""]["running"]
+        assert len(scans) == 1
+
+        # cached
+        poller.get_status([process_id])
+        assert len(scans) == 1
+
+        # resources of process subtree
+        time.sleep(1.0)
+        poller.ttl = 0.0
+        res = poller.get_status([process_id])
+        assert len(scans) == 2
+        assert res[process_id]["cpu_percent"] > 20.0
+        assert res[process_id]["rss"] > 0
+    finally:
+        for child in p.children(recursive=True):
+            child.kill()
+        p.kill()
+        p.wait()
+
+    res = poller.get_status([process_id])
+    assert not res[process_id]["running"]
@@ -1,6 +1,7 @@
 from JobPanel.backend.service_base import ServiceBase, LongRequest, ServiceStatus
 from JobPanel.backend.service_proxy import ServiceProxy
 from JobPanel.backend.connection import *
+from JobPanel.backend.state_journal import StateJournal
 
 import time
 import threading
@@ -106,3 +107,37 @@ def test_serialize_proxy(request):
     test_service_proxy.call("request_stop", None, answer)
     time.sleep(5)
     #assert len(answer) > 0
+
+
+class AnalysisWorkspace:
+    def __init__(self, workspace):
+        self.workspace = workspace
+
+    def get_analysis_workspace(self):
+        return self.workspace
+
+
+def test_download_config_compacted(tmpdir):
+    remote = os.path.join(str(tmpdir), "remote")
+    local = os.path.join(str(tmpdir), "local")
+    con = ConnectionLocal({"environment": {"__class__": "Environment",
+                                           "geomop_analysis_workspace": remote}})
+    con._local_service = AnalysisWorkspace(local)
+    con._status = ConnectionStatus.online
+    proxy = ServiceProxy({"workspace": "mj", "config_file_name": "mj_config.json"})
+    proxy.set_rep_con(None, con)
+
+    remote_file = os.path.join(remote, "mj", "mj_config.json")
+    journal = StateJournal(remote_file)
+    journal.save({"status": "running", "jobs": 1})
+    assert proxy.download_config()
+    assert proxy._downloaded_config == {"status": "running", "jobs": 1}
+
+    # second compaction in the same second with snapshot of the same size,
+    # only the journal header identifies the new snapshot
+    journal.compact({"status": "stopped", "jobs": 2})
+    local_st = os.stat(os.path.join(local, "mj", "mj_config.json"))
+    os.utime(remote_file, (local_st.st_atime, local_st.st_mtime))
+    assert proxy.download_config()
+    assert proxy._downloaded_config == {"status": "stopped", "jobs": 2}
+    assert not proxy._config_reader.mismatch
@@ -0,0 +1,87 @@
+from JobPanel.backend.state_journal import StateJournal, StateReader, load_state, journal_file, \
+    diff, apply_changes
+import JobPanel.backend.state_journal as state_journal
+
+import copy
+import json
+import os
+
+
+def make_state(n_jobs, status=0):
+    return {"status": "running",
+            "jobs_report": {str(i): {"name": "job_{}".format(i), "status": status} for i in range(n_jobs)},
+            "address": ["localhost", 5000]}
+
+
+def test_diff():
+    old = make_state(10)
+    new = make_state(12, 1)
+    del new["jobs_report"]["3"]
+    new["address"] = ["remote", 5000]
+    new["deep"] = {"a": {"b": [1, 2]}}
+    changes = diff(old, new)
+    assert ["d", ["jobs_report", "3"]] in changes
+    assert ["s", ["address"], ["remote", 5000]] in changes
+    # second level dicts are replaced whole
+    assert ["s", ["jobs_report", "5"], {"name": "job_5", "status": 1}] in changes
+    assert apply_changes(copy.deepcopy(old), changes) == new
+    assert diff(new, new) == []
+    assert apply_changes(old, diff(old, [1, 2])) == [1, 2]
+
+
+def test_journal(tmpdir):
+    file = os.path.join(str(tmpdir), "service.conf")
+    journal = StateJournal(file)
+    reader = StateReader(file)
+
+    state = make_state(1000)
+    journal.save(state)
+    snapshot_size = os.path.getsize(file)
+    assert os.path.getsize(journal_file(file)) < 100
+    assert reader.read() == state
+
+    # single change is appended
+    state = copy.deepcopy(state)
+    state["jobs_report"]["10"]["status"] = 2
+    journal.save(state)
+    assert os.path.getsize(file) == snapshot_size
+    assert os.path.getsize(journal_file(file)) < 200
+    assert reader.read() == state
+    assert load_state(file) == state
+
+    # unfinished line is not read
+    with open(journal_file(file), 'a') as fd:
+        fd.write('[["s",["status"],"do')
+    assert reader.read() == state
+    assert load_state(file) == state
+
+    # compaction
+    journal = StateJournal(file)
+    journal.save(state)
+    for i in range(1000):
+        state = copy.deepcopy(state)
+        state["jobs_report"][str(i)]["status"] = 3
+        journal.save(state)
+        assert os.path.getsize(journal_file(file)) <= max(state_journal.COMPACT_MIN_SIZE, snapshot_size) + 200
+        if i % 100 == 0:
+            assert reader.read() == state
+    assert reader.read() == state
+    journal.save(state, compact=True)
+    assert reader.read() == state
+    assert not reader.mismatch
+    assert load_state(file) == state
+
+    # snapshot not matching journal
+    with open(file, 'w') as fd:
+        json.dump(make_state(2), fd)
+    assert reader.read() == make_state(2)
+    assert reader.mismatch
+    assert load_state(file) == make_state(2)
+
+
+def test_plain_file(tmpdir):
+    file = os.path.join(str(tmpdir), "service.conf")
+    assert StateReader(file).read() is None
+    with open(file, 'w') as fd:
+        json.dump(make_state(3), fd, indent=4)
+    assert load_state(file) == make_state(3)
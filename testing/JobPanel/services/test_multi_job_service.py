@@ -0,0 +1,158 @@
+from JobPanel.services.multi_job_service import MultiJob, MJStatus, DispatchMode, JobInfo, JobReport, JobStatus
+from JobPanel.backend.service_base import ServiceBase
+from JobPanel.backend.connection import ConnectionLocal
+
+import psutil
+import threading
+import time
+
+
+class FakeRunner:
+    def __init__(self, id):
+        self.id = id
+        self.create_time = time.time()
+
+
+class FakePipelineProcessor:
+    def __init__(self, n_jobs):
+        self.runners = [FakeRunner(i) for i in range(n_jobs)]
+
+    def is_run(self):
+        return True
+
+    def get_next_job(self):
+        if len(self.runners) > 0:
+            return self.runners.pop(0)
+        return None
+
+
+def make_mj(n_jobs, max_n_jobs, dispatch_mode):
+    mj = MultiJob({"max_n_jobs": max_n_jobs, "dispatch_mode": dispatch_mode.name})
+    mj.mj_status = MJStatus.running
+    mj._pipeline_processor = FakePipelineProcessor(n_jobs)
+    started = []
+
+    def run_job(runner):
+        started.append(runner.id)
+        mj._n_running_jobs += 1
+    mj.run_job = run_job
+    return mj, started
+
+
+def test_dispatch_immediate():
+    mj, started = make_mj(25, 10, DispatchMode.immediate)
+    try:
+        # all free slots are filled in one pass
+        mj._do_work()
+        assert started == list(range(10))
+
+        # slots are full
+        mj._do_work()
+        assert len(started) == 10
+
+        # free slots
+        mj._n_running_jobs -= 3
+        mj._do_work()
+        assert started == list(range(13))
+
+        assert mj.dispatch_stats.n_dispatched == 13
+        assert 0.0 <= mj.dispatch_stats.latency_mean <= mj.dispatch_stats.latency_max
+    finally:
+        mj._repeater.close()
+
+
+def test_dispatch_throttled():
+    mj, started = make_mj(25, 10, DispatchMode.throttled)
+    try:
+        # one job per 10 passes
+        for i in range(30):
+            mj._do_work()
+        assert started == list(range(3))
+    finally:
+        mj._repeater.close()
+
+
+def test_jobs_report_changes():
+    mj, started = make_mj(0, 10, DispatchMode.immediate)
+    try:
+        for i in range(1, 101):
+            mj.jobs_report[str(i)] = JobReport({"name": "job_{}".format(i)})
+            mj._jobs_report_changed(str(i))
+
+        # unknown epoch, all reports
+        res = mj.request_get_jobs_report_changes({"epoch": None, "seq": 0})
+        assert len(res["reports"]) == 100
+        assert res["n_jobs"] == 100
+        epoch, seq = res["epoch"], res["seq"]
+
+        # no change
+        res = mj.request_get_jobs_report_changes({"epoch": epoch, "seq": seq})
+        assert res["reports"] == {}
+        assert res["seq"] == seq
+
+        # started job is queued
+        mj._jobs[7] = JobInfo(FakeRunner(7), [{"data": 3}], "job_7")
+        mj._jobs[8] = JobInfo(FakeRunner(8), [], "job_8")
+        mj.check_jobs()
+        res = mj.request_get_jobs_report_changes({"epoch": epoch, "seq": seq})
+        assert list(res["reports"].keys()) == ["7"]
+        assert res["reports"]["7"]["status"] == JobStatus.queued.name
+        assert res["seq"] == seq + 1
+
+        # old sequence number
+        mj._jobs_report_changed("2")
+        res = mj.request_get_jobs_report_changes({"epoch": epoch, "seq": seq})
+        assert sorted(res["reports"].keys()) == ["2", "7"]
+    finally:
+        mj._repeater.close()
+
+
+class FakeProxy:
+    def __init__(self, process_id):
+        self._connection = ConnectionLocal()
+        self.process_id = process_id
+
+
+def test_sample_jobs_resources():
+    mj, started = make_mj(0, 10, DispatchMode.immediate)
+    try:
+        p = psutil.Process()
+        for i, process_id in [(1, "{}@{}".format(p.pid, p.create_time())), (2, "123.pbs-server")]:
+            mj.jobs_report[str(i)] = JobReport({"name": "job_{}".format(i)})
+            mj._jobs[i] = JobInfo(FakeRunner(i), [], "job_{}".format(i))
+            mj._jobs[i].status = JobStatus.running
+            mj._jobs[i].child_id = i
+            mj._child_services[i] = FakeProxy(process_id)
+        seq = mj._jobs_report_seq
+
+        mj.sample_jobs_resources()
+        assert mj.jobs_report["1"].rss > 0
+        assert mj.jobs_report["2"].rss == 0
+        res = mj.request_get_jobs_report_changes({"epoch": mj._jobs_report_epoch, "seq": seq})
+        assert list(res["reports"].keys()) == ["1"]
+        assert res["reports"]["1"]["rss"] == mj.jobs_report["1"].rss
+    finally:
+        mj._repeater.close()
+
+
+def test_wake():
+    service = ServiceBase({})
+    thread = threading.Thread(target=service.run, daemon=True)
+    try:
+        passes = []
+        service._do_work = lambda: passes.append(time.time())
+        thread.start()
+        time.sleep(0.5)
+
+        # loop is waiting for event
+        n = len(passes)
+        assert n <= 6
+
+        # wake loop
+        for i in range(5):
+            service.wake()
+            time.sleep(0.01)
+        assert len(passes) >= n + 3
+    finally:
+        service._closing = True
+        thread.join(timeout=5)
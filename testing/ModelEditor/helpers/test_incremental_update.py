@@ -0,0 +1,116 @@
+"""Tests for IncrementalUpdater."""
+import pytest
+
+from gm_base.model_data import Loader, Validator, autoconvert, notification_handler
+from ModelEditor.helpers import IncrementalUpdater, StructureAnalyzer
+
+
+IT_INT = dict(base_type='Integer', min=0, max=10)
+IT_STRING = dict(base_type='String')
+IT_REGION = dict(
+    base_type='Record',
+    name='Region',
+    id='region',
+    keys={
+        'name': {'default': {'type': 'obligatory'}, 'type': IT_STRING},
+        'value': {'default': {'type': 'optional'}, 'type': IT_INT}},
+    reducible_to_key='name')
+IT_FLOW = dict(
+    base_type='Record',
+    name='Flow',
+    id='flow',
+    keys={
+        'regions': {'default': {'type': 'optional'},
+                    'type': dict(base_type='Array', subtype=IT_REGION, min=0, max=100)},
+        'n_steps': {'default': {'type': 'obligatory'}, 'type': IT_INT},
+        'TYPE': {'type': IT_STRING}})
+IT_ROOT = dict(
+    base_type='Record',
+    name='Root',
+    id='root',
+    keys={
+        'version': {'default': {'type': 'optional'}, 'type': IT_STRING},
+        'problem': {'default': {'type': 'obligatory'},
+                    'type': dict(base_type='Abstract', name='Problem', id='problem',
+                                 implementations={'Flow': IT_FLOW})},
+        'output': {'default': {'type': 'optional'}, 'type': IT_FLOW},
+        'count': {'default': {'type': 'optional'}, 'type': IT_INT}})
+
+DOCUMENT = (
+    "version: 1.0\n"
+    "problem: !Flow\n"
+    "  n_steps: 5\n"
+    "  regions:\n"
+    "    - name: a\n"
+    "      value: 1\n"
+    "    - b\n"
+    "  # comment\n"
+    "output:\n"
+    "  n_steps: 20\n"
+    "  regions: [{name: c}, d]\n"
+    "count: 3\n"
+)
+
+
+def load(document):
+    """Full update of the document, returns root."""
+    notification_handler.clear()
+    loader = Loader(notification_handler)
+    root = loader.load(document)
+    root = autoconvert(root, IT_ROOT)
+    Validator(notification_handler).validate(root, IT_ROOT)
+    StructureAnalyzer.add_node_info(document, root, notification_handler)
+    return root
+
+
+def dump(root):
+    """Returns comparable description of tree and notifications."""
+    nodes = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        nodes.append((node.absolute_path, str(node.value), str(node.span), str(node.key.span),
+                      node.origin, node.is_flow, str(node.delimiters),
+                      None if node.input_type is None else node.input_type.get('name')))
+        stack.extend(node.children)
+    notifications = [(n.name, str(n.span)) for n in notification_handler.notifications]
+    return nodes, notifications
+
+
+@pytest.mark.parametrize('old, new, path', [
+    ("  n_steps: 5\n", "  n_steps: 50\n", '/problem/n_steps'),
+    ("  n_steps: 5\n", "  n_steps: 500\n", '/problem/n_steps'),
+    ("      value: 1\n", "      value: 1\n      other: 2\n", '/problem/regions'),
+    ("    - b\n", "    - b\n    - e\n    - f\n", '/problem/regions'),
+    ("    - b\n", "    - {name: b, value: 3}\n", '/problem/regions'),
+    ("  regions: [{name: c}, d]\n", "  regions:\n    - c\n", '/output/regions'),
+    ("  n_steps: 20\n", "  n_steps:\n", '/output/n_steps'),
+    ("  n_steps: 20\n", "  n_steps: 20\n  TYPE: x\n", '/output'),
+    ("  # comment\n", "", '/problem/regions'),
+    ("problem: !Flow\n", "problem: !Flow # comment\n", '/problem'),
+])
+def test_incremental_update(old, new, path):
+    new_document = DOCUMENT.replace(old, new)
+    expected = dump(load(new_document))
+
+    root = load(DOCUMENT)
+    updater = IncrementalUpdater(Validator(notification_handler), notification_handler)
+    node = updater.update(DOCUMENT, new_document, root)
+    assert node is not None
+    assert node.absolute_path == path
+    assert dump(root) == expected
+
+
+@pytest.mark.parametrize('old, new', [
+    ("  n_steps: 5\n", "  steps: 5\n"),
+    ("  n_steps: 5\n", "  n_steps: [5\n"),
+    ("problem: !Flow\n", "problems: !Flow\n"),
+    ("count: 3\n", "count: 4\n"),
+    ("  regions: [{name: c}, d]\n", "regions: []\n"),
+    ("      value: 1\n", "      value: &a 1\n"),
+])
+def test_incremental_update_refused(old, new):
+    new_document = DOCUMENT.replace(old, new)
+    root = load(DOCUMENT)
+    updater = IncrementalUpdater(Validator(notification_handler), notification_handler)
+    assert updater.update(DOCUMENT, new_document, root) is None
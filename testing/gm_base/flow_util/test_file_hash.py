@@ -0,0 +1,62 @@
+import hashlib
+import os
+
+from gm_base.flow_util import YamlSupportRemote
+from gm_base.flow_util.file_hash import FileHasher, digest_algorithm, LEGACY_ALGORITHM
+import gm_base.flow_util.file_hash as file_hash
+
+
+def test_file_hash(tmpdir, monkeypatch):
+    content = b"line 1\nline 2\n" * 100000
+    files = []
+    for i in range(4):
+        file = tmpdir.join("file{0}.msh".format(i))
+        file.write_binary(content + bytes([i]))
+        os.utime(str(file), (1000000000, 1000000000))
+        files.append(str(file))
+    expected = "blake2b:" + hashlib.blake2b(content + b"\x00").hexdigest()
+
+    cache_file = str(tmpdir.join("cache", "file_hash_cache.json"))
+    hasher = FileHasher(cache_file)
+    err, digest = hasher.file_hash(files[0])
+    assert len(err) == 0
+    assert digest == expected
+    assert digest_algorithm(digest) == "blake2b"
+
+    # chunked and memory mapped reads
+    monkeypatch.setattr(file_hash, "CHUNK_SIZE", 1000)
+    monkeypatch.setattr(file_hash, "MMAP_SIZE", 1000)
+    for use_mmap in [True, False]:
+        err, digest = FileHasher(use_mmap=use_mmap).file_hash(files[0])
+        assert digest == expected
+
+    # parallel hashing, persistent cache
+    err, hashes = hasher.file_hashes(files)
+    assert len(err) == 0
+    assert len(set(hashes.values())) == 4
+    assert os.path.isfile(cache_file)
+    hasher = FileHasher(cache_file)
+    monkeypatch.setattr(file_hash, "_binary_hash", None)
+    err, cached = hasher.file_hashes(files)
+    assert cached == hashes
+    monkeypatch.undo()
+
+    # changed file is hashed again
+    tmpdir.join("file0.msh").write_binary(b"changed")
+    err, digest = hasher.file_hash(files[0])
+    assert digest == "blake2b:" + hashlib.blake2b(b"changed").hexdigest()
+
+    # missing file
+    err, digest = hasher.file_hash(str(tmpdir.join("missing.msh")))
+    assert len(err) == 1
+
+
+def test_legacy_hash(tmpdir):
+    file = tmpdir.join("flow.yaml")
+    file.write("a: 1\nb: 2\n")
+    legacy = hashlib.sha512(b"a: 1\nb: 2\n").hexdigest()
+    assert YamlSupportRemote.hash_algorithm(legacy) == LEGACY_ALGORITHM
+    err, digest = YamlSupportRemote.file_hash(str(file), YamlSupportRemote.hash_algorithm(legacy))
+    assert digest == legacy
+    err, digest = YamlSupportRemote.file_hash(str(file))
+    assert YamlSupportRemote.hash_algorithm(digest) == "blake2b"
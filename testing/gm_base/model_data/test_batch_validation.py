@@ -0,0 +1,51 @@
+"""
+Tests for batch validation of YAML files.
+"""
+import io
+import json
+
+from gm_base.model_data.batch_validation import get_format_file, validate_files, write_results
+
+
+VALID = (
+    "flow123d_version: 2.0.0\n"
+    "problem: !Coupling_Sequential\n"
+    "  mesh:\n"
+    "    mesh_file: input/test.msh\n"
+    "  flow_equation: !Flow_Darcy_MH\n"
+    "    input_fields: []\n"
+    "    nonlinear_solver:\n"
+    "      linear_solver: !Petsc\n"
+    "    output_stream:\n"
+    "      file: test.pvd\n"
+)
+
+INVALID = VALID.replace("    input_fields: []\n", "")
+
+
+def test_validate_files(tmpdir):
+    files = []
+    for i, document in enumerate([VALID, INVALID, VALID]):
+        file = tmpdir.join('input{}.yaml'.format(i))
+        file.write(document)
+        files.append(str(file))
+    files.append(str(tmpdir.join('missing.yaml')))
+    format_file = get_format_file('2.0.0')
+
+    sequential = {result['file']: result for result in validate_files(format_file, files, 1)}
+    parallel = {result['file']: result for result in validate_files(format_file, files, 2)}
+    assert sorted(sequential) == sorted(files)
+    for file in files:
+        assert sequential[file]['valid'] == parallel[file]['valid']
+        assert sequential[file]['notifications'] == parallel[file]['notifications']
+    assert [sequential[file]['valid'] for file in files] == [True, False, True, False]
+    assert 'error' in sequential[files[3]]
+    assert any(notification['name'] == 'MissingObligatoryKey'
+               for notification in sequential[files[1]]['notifications'])
+
+    output = io.StringIO()
+    assert write_results(sequential.values(), output) == 2
+    lines = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert lines[-1]['type'] == 'summary'
+    assert lines[-1]['files'] == 4
+    assert len([line for line in lines if line['type'] == 'file']) == 4
@@ -0,0 +1,116 @@
+"""
+Tests for DataNode indexes and caches.
+"""
+
+from gm_base.model_data import DataNode, Loader, MappingDataNode, ScalarDataNode
+from gm_base.geomop_util import Position, Span, TextValue
+
+
+def make_scalar(key, line):
+    node = ScalarDataNode(TextValue(key), value=line)
+    node.span = Span(Position(line, 5), Position(line, 10))
+    node.key.span = Span(Position(line, 1), Position(line, 4))
+    return node
+
+
+def linear_get_child(node, key):
+    for child in node.children:
+        if key == child.key.value:
+            return child
+    return None
+
+
+def test_child_index():
+    node = MappingDataNode()
+    for i in range(10):
+        node.set_child(make_scalar('k{}'.format(i), i + 1))
+    keys = ['k{}'.format(i) for i in range(12)]
+
+    def check():
+        for key in keys:
+            assert node.get_child(key) is linear_get_child(node, key)
+
+    check()
+    # replace
+    new = make_scalar('k3', 4)
+    node.set_child(new)
+    assert node.children[3] is new
+    check()
+    # duplicit
+    dup = make_scalar('k5', 20)
+    node.set_child(dup, False)
+    assert node.children[5].key.value == 'k5_dup10'
+    assert node.get_child('k5') is dup
+    keys.append('k5_dup10')
+    check()
+    # direct modifications
+    node.children.append(make_scalar('k10', 30))
+    check()
+    node.children[0] = make_scalar('k11', 1)
+    check()
+    del node.children[1]
+    check()
+    node.children.reverse()
+    check()
+    node.children[2].key = TextValue('k0')
+    check()
+    node.children.clear()
+    check()
+    node.children = [make_scalar('k1', 1)]
+    check()
+
+
+def test_absolute_path_cache():
+    root = MappingDataNode()
+    record = MappingDataNode(TextValue('a'))
+    root.set_child(record)
+    scalar = make_scalar('b', 1)
+    record.set_child(scalar)
+    assert scalar.absolute_path == '/a/b'
+    assert root.get_node_at_path('/a/b') is scalar
+
+    record.key = TextValue('c')
+    assert scalar.absolute_path == '/c/b'
+    other = MappingDataNode(TextValue('d'))
+    root.set_child(other)
+    other.set_child(scalar)
+    assert scalar.absolute_path == '/d/b'
+    assert root.get_node_at_path('/d/b') is scalar
+
+
+def linear_node_at_position(node, position):
+    if node.implementation == DataNode.Implementation.scalar:
+        return node if node.start <= position <= node.end else None
+    result = None
+    if node.start <= position <= node.end:
+        result = node
+        for child in node.children:
+            descendant = linear_node_at_position(child, position)
+            if descendant is not None:
+                if descendant.origin is not DataNode.Origin.ac_transposition or \
+                        descendant.parent is not node:
+                    result = descendant
+                    break
+    return result
+
+
+def test_node_at_position():
+    document = (
+        "problem: !Flow\n"
+        "  mesh: {file: a.msh, regions: [1, 2, 3]}\n"
+        "  fields:\n"
+        "    - region: a\n"
+        "      value: 1\n"
+        "    - {region: b, value: 2}\n"
+        "    -\n"
+        "      - 1\n"
+        "      - 2\n"
+        "output: x\n"
+    )
+    root = Loader().load(document)
+    lines = document.splitlines()
+    for line in range(1, len(lines) + 1):
+        for column in range(1, len(lines[line - 1]) + 2):
+            position = Position(line, column)
+            assert root.get_node_at_position(position) is \
+                linear_node_at_position(root, position)
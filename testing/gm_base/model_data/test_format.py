@@ -4,6 +4,8 @@ Tests for format package.
 
 @author: Tomas Krizek
 """
+import json
+
 from gm_base.model_data.format import parse_format, _list_to_dict
 
 
@@ -221,5 +223,34 @@ def test_list_to_dict():
     assert dictionary['METIS']['description'] == "METIS description"
 
 
+def test_load_format_cache(tmpdir):
+    from gm_base.model_data.format import load_format, clear_formats
+    text = json.dumps({"ist_nodes": [
+        {"id": "root", "input_type": "Record", "name": "Root", "keys": [
+            {"key": "a", "type": "int"}, {"key": "b", "type": "root"}]},
+        {"id": "int", "input_type": "Integer", "name": "Integer", "range": [0, 10]}]})
+    cache_dir = str(tmpdir.join('cache'))
+
+    clear_formats()
+    root, ist_nodes = load_format(text, cache_dir)
+    assert root['keys']['b']['type'] is root
+    assert ist_nodes['root']['keys'][0]['type'] == 'int'
+    assert load_format(text, cache_dir)[0] is root
+    assert len(tmpdir.join('cache').listdir()) == 1
+
+    # loaded from pickle
+    clear_formats()
+    cached_root, cached_ist_nodes = load_format(text, cache_dir)
+    assert cached_root is not root
+    assert cached_root['keys']['b']['type'] is cached_root
+    assert cached_root['keys']['a']['type']['max'] == 10
+    assert cached_ist_nodes == ist_nodes
+
+    # invalid cache file is ignored
+    clear_formats()
+    tmpdir.join('cache').listdir()[0].write('invalid')
+    assert load_format(text, cache_dir)[0]['keys']['a']['type']['min'] == 0
+
+
 if __name__ == '__main__':
     test_abstract_record()
@@ -5,6 +5,7 @@ Tests for validator
 """
 
 from gm_base.model_data import Validator, Loader, ScalarDataNode, NotificationHandler
+from gm_base.model_data.validation.plan import get_type_plan, clear_type_plans
 
 
 def test_validator():
@@ -141,5 +142,41 @@ def test_validator():
     assert validator.validate(node, it_abstract) is False
     assert len(error_handler.notifications) == 4
 
+
+def test_type_plan():
+    it_int = dict(base_type='Integer', min=0, max=3)
+    it_record = dict(
+        base_type='Record',
+        keys={'value': {'default': {'type': 'obligatory'}, 'type': it_int}},
+        name='Tree')
+    it_array = dict(base_type='Array', subtype=it_record, min=0, max=10)
+    # recursive type
+    it_record['keys']['children'] = {'default': {'type': 'optional'}, 'type': it_array}
+
+    plan = get_type_plan(it_record)
+    assert get_type_plan(it_record) is plan
+    assert plan.keys['value'] == (get_type_plan(it_int), True)
+    assert plan.keys['children'][0].subtype is plan
+
+    error_handler = NotificationHandler()
+    validator = Validator(error_handler)
+    document = (
+        "value: 1\n"
+        "children:\n"
+        "  - value: <p1>\n"
+        "    children:\n"
+        "      - value: 5\n"
+        "      - value: <p1>\n"
+        "      - children: []\n")
+    node = Loader(error_handler).load(document)
+    assert validator.validate(node, it_record) is False
+    assert sorted(n.name for n in error_handler.notifications) == \
+        ['MissingObligatoryKey', 'ValueTooBig']
+    assert [param.name for param in validator.params] == ['p1']
+
+    clear_type_plans()
+    assert get_type_plan(it_record) is not plan
+
+
 if __name__ == '__main__':
     test_validator()
@@ -4,7 +4,9 @@ Tests for customized YAML loader.
 Author: Tomas Krizek
 """
 from gm_base.model_data import Loader
+from gm_base.model_data.yaml.loader import LIBYAML_AVAILABLE
 from unittest.mock import Mock
+import pytest
 
 # pylint: disable=protected-access
 
@@ -143,3 +145,71 @@ def test_merge():
     assert root.get_node_at_path('/maps/2/y').value == 2
     assert root.get_node_at_path('/maps/2/r').value == 10
 
+
+
+def _node_spans(node):
+    """Returns list of (path, value, span) of all nodes in the tree."""
+    res = [(node.absolute_path, getattr(node, 'value', None), str(node.span))]
+    for child in node.children:
+        res.extend(_node_spans(child))
+    return res
+
+
+LIBYAML_DOCUMENTS = [
+    "a: 1",
+    "a: 1\n",
+    "a: 1\r\n",
+    "a: 1   ",
+    "a:\n  - 1\n  - 2",
+    "a: |\n  x\n  y",
+    "problem: !Flow &flow\n  mesh: {file: ščř.msh}\n  output: *flow\n# comment",
+    "a: 1\nb: [1, 2",
+    "a: 1\n  b: 2\n",
+]
+
+
+@pytest.mark.skipif(not LIBYAML_AVAILABLE, reason="libyaml is not available")
+def test_libyaml():
+    """Tests that libyaml parser gives same tree and spans as python parser."""
+    for document in LIBYAML_DOCUMENTS:
+        loader = Loader(use_libyaml=False)
+        root = loader.load(document)
+        c_loader = Loader(use_libyaml=True)
+        c_root = c_loader.load(document)
+        assert _node_spans(c_root) == _node_spans(root)
+        assert [str(n.span) for n in c_loader.notification_handler.notifications] == \
+            [str(n.span) for n in loader.notification_handler.notifications]
+
+
+def _generate_document(n_items):
+    """Generates large document similar to flow123d input."""
+    lines = ["flow123d_version: 3.0.0", "problem: !Coupling_Sequential",
+             "  mesh:", "    mesh_file: mesh.msh", "  flow_equation: !Flow_Darcy_MH",
+             "    input_fields:"]
+    for i in range(n_items):
+        lines.extend([
+            "      - region: region_{}".format(i),
+            "        conductivity: {}".format(1.0e-3 * (i + 1)),
+            "        cross_section: [1, 2, 3]",
+            "        bc_type: &bc_{} dirichlet".format(i),
+            "        bc_pressure: !FieldFormula",
+            "          value: x + y * {}".format(i)])
+    return "\n".join(lines)
+
+
+def benchmark_loader():
+    """Load times of the generated documents with python and libyaml parser."""
+    import time
+    for n_items in [100, 1000, 10000]:
+        document = _generate_document(n_items)
+        for use_libyaml in [False, True]:
+            loader = Loader(use_libyaml=use_libyaml)
+            start = time.perf_counter()
+            loader.load(document)
+            t_load = time.perf_counter() - start
+            print("{:6} items, {:7} lines, libyaml: {:5}  load: {:8.3f}s".format(
+                n_items, document.count("\n") + 1, str(use_libyaml), t_load))
+
+
+if __name__ == '__main__':
+    benchmark_loader()
@@ -11,8 +11,9 @@ def test_make_aabb():
     box = make_aabb(points, margin=0.1)
     assert np.all(box == np.array([-0.1, -4.1, 4.1, 5.1]))
 
-def test_intersect_candidates():
-    al = AABB_Lookup()
+@pytest.mark.parametrize("backend", ['linear', 'rtree'])
+def test_intersect_candidates(backend):
+    al = make_lookup(backend)
     box = make_aabb([[-1,-1],[1,1]], margin = 0.1)
 
     def add_box(*pts):
@@ -40,9 +41,10 @@ def min_distance(point, box_list):
             min_dist = (dist, i)
     return min_dist
 
+@pytest.mark.parametrize("backend", ['linear', 'rtree'])
 @pytest.mark.parametrize("seed", list(range(40)))
-def test_closest_candidates(seed):
-    al = AABB_Lookup(init_size=10)
+def test_closest_candidates(seed, backend):
+    al = make_lookup(backend, init_size=10)
 
     def add_box(*pts):
         al.add_object(add_box.ibox, make_aabb(pts) )
@@ -69,3 +71,72 @@ def test_closest_candidates(seed):
     min_dist = (min_dist[0], candidates[min_dist[1]])
     assert ref_min_dist == min_dist
 
+
+
+@pytest.mark.parametrize("seed", list(range(5)))
+def test_rtree_vs_linear(seed):
+    """
+    Random sequence of additions, replacements and removals,
+    the R-tree must give same candidates as the linear lookup.
+    """
+    np.random.seed(seed)
+    linear = AABB_Lookup()
+    rtree = AABB_RTree(max_entries=4)
+    ids = set()
+    for i in range(600):
+        id = np.random.randint(300)
+        if id in ids and np.random.rand() < 0.4:
+            linear.rm_object(id)
+            rtree.rm_object(id)
+            ids.remove(id)
+        else:
+            pts = np.random.rand(2, 2) * 0.1 + np.random.rand(2) * 10
+            box = make_aabb(pts, margin=0.01)
+            linear.add_object(id, box)
+            rtree.add_object(id, box)
+            ids.add(id)
+        assert rtree.n_boxes == len(ids)
+
+        point = np.random.rand(2) * 10
+        assert rtree.closest_candidates(point).tolist() == linear.closest_candidates(point).tolist()
+        box = make_aabb(np.random.rand(2, 2) * 2 + np.random.rand(2) * 10)
+        assert rtree.intersect_candidates(box).tolist() == linear.intersect_candidates(box).tolist()
+
+    for id in list(ids):
+        rtree.rm_object(id)
+    assert rtree.n_boxes == 0
+    assert rtree.root.is_leaf
+    assert len(rtree.closest_candidates(np.array([1.0, 1.0]))) == 0
+
+
+
+def benchmark_lookup():
+    """
+    Query times of the lookups filled by boxes of random short segments.
+    Linear lookup grows linearly with number of segments, the R-tree logarithmically.
+    """
+    import time
+    np.random.seed(1)
+    for n_segs in [1000, 10000, 100000]:
+        size = np.sqrt(n_segs)
+        pts = np.random.rand(n_segs, 2) * size
+        ends = pts + np.random.rand(n_segs, 2) - 0.5
+        queries = np.random.rand(100, 2) * size
+        for backend in ['linear', 'rtree']:
+            al = make_lookup(backend)
+            start = time.perf_counter()
+            for i, (a, b) in enumerate(zip(pts, ends)):
+                al.add_object(i, make_aabb([a, b], margin=0.01))
+            t_build = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for q in queries:
+                al.closest_candidates(q)
+                al.intersect_candidates(make_aabb([q, q + 0.5]))
+            t_query = (time.perf_counter() - start) / len(queries)
+            print("{:7} segments: {:6} build: {:8.3f}s  query: {:8.3f}ms".format(
+                n_segs, backend, t_build, t_query * 1000))
+
+
+if __name__ == '__main__':
+    benchmark_lookup()
@@ -1,5 +1,6 @@
 from gm_base.polygons.polygons import PolygonDecomposition
 import gm_base.polygons.merge as merge
+from gm_base.polygons.decomp import right_side, out_vtx
 import numpy as np
 import pytest
 # def test_deep_copy(self):
@@ -57,6 +58,71 @@ def test_simple_intersections():
 
 
 
+def check_maps(decomp, decomps, maps):
+    """
+    Check that objects of the intersection are geometricaly part of their preimages.
+    """
+    assert len(maps) == len(decomps)
+    for orig, (pt_map, seg_map, poly_map) in zip(decomps, maps):
+        for pt_id, orig_pt_id in pt_map.items():
+            assert np.allclose(decomp.points[pt_id].xy, orig.points[orig_pt_id].xy)
+        for seg_id, orig_seg_id in seg_map.items():
+            orig_seg = orig.segments[orig_seg_id]
+            for pt in decomp.segments[seg_id].vtxs:
+                t = orig.seg_project_point(orig_seg, pt.xy)
+                assert np.allclose(orig_seg.parametric(t), pt.xy)
+        for poly_id, orig_poly_id in poly_map.items():
+            wire = decomp.polygons[poly_id].outer_wire
+            if wire.is_root():
+                assert orig.polygons[orig_poly_id] == orig.outer_polygon
+                continue
+            # point inside the polygon close to the middle of a segment
+            seg, side = wire.segment
+            tang = seg.vector
+            norm = np.array([-tang[1], tang[0]])
+            if side == right_side:
+                norm = -norm
+            inner_point = seg.vtxs[out_vtx].xy + 0.5 * tang + 1e-6 * norm
+            assert orig.polygons[orig_poly_id].contains_point(inner_point)
+
+
+def make_frac_decomps(n_frac, seed):
+    box = np.array([[0.0, 0.0],
+                    [2.0, 3.0]])
+    da = PolygonDecomposition()
+    p00, p11 = box
+    p01 = np.array([p00[0], p11[1]])
+    p10 = np.array([p11[0], p00[1]])
+    da.add_line(p00, p01)
+    da.add_line(p01, p11)
+    da.add_line(p11, p10)
+    da.add_line(p10, p00)
+    decomps = [da]
+
+    np.random.seed(seed)
+    p0 = np.random.rand(n_frac, 2) * (box[1] - box[0]) + box[0]
+    p1 = np.random.rand(n_frac, 2) * (box[1] - box[0]) + box[0]
+    for pa, pb in zip(p0, p1):
+        dd = PolygonDecomposition()
+        dd.add_line(pa, pb)
+        decomps.append(dd)
+    return decomps
+
+
+def test_intersect_process_pool():
+    import concurrent.futures
+    decomps = make_frac_decomps(10, seed=2)
+    decomp, maps = merge.intersect_decompositions(decomps)
+    check_maps(decomp, decomps, maps)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=2) as pool:
+        pool_decomp, pool_maps = merge.intersect_decompositions(decomps, pool=pool)
+    pool_decomp.decomp.check_consistency()
+    check_maps(pool_decomp, decomps, pool_maps)
+    assert maps == pool_maps
+    assert len(decomp.polygons) == len(pool_decomp.polygons)
+
+
 #@pytest.mark.skip
 def test_frac_intersections():
     # import sys
@@ -103,6 +169,7 @@ def test_frac_intersections():
     # p.sort_stats('cumulative').print_stats()
 
     decomp, maps = tracer_func()
+    check_maps(decomp, decomps, maps)
 
     #######
     # Test merge with empty decomp.
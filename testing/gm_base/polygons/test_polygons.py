@@ -3,6 +3,7 @@
 # from matplotlib import collections  as mc
 # from matplotlib import patches as mp
 import pytest
+import tracemalloc
 
 from gm_base.polygons.polygons import *
 from gm_base.polygons.decomp import PolygonChange
@@ -126,3 +127,99 @@ def test_check_displacement():
     assert not res
     assert decomp.get_last_polygon_changes() == (PolygonChange.shape, [1,2,3], None)
 
+
+
+def test_lines_intersections():
+    lines = np.array([
+        [[0, 0], [2, 2]],
+        [[0, 2], [2, 0]],
+        [[0, 1], [2, 1]],
+        [[3, 0], [3, 2]],
+        [[0, 3], [2, 3]]])
+    i, j, t_i, t_j = PolygonDecomposition.lines_intersections(lines)
+    isecs = { (min(a, b), max(a, b)) for a, b in zip(i, j) }
+    assert isecs == {(0, 1), (0, 2), (1, 2)}
+    assert np.allclose(t_i, 0.5)
+    assert np.allclose(t_j, 0.5)
+
+    # processing in chunks gives the same result
+    np.random.seed(1)
+    lines = np.random.rand(300, 2, 2) * 10
+    res = PolygonDecomposition.lines_intersections(lines)
+    res_chunked = PolygonDecomposition.lines_intersections(lines, max_pairs=7)
+    for a, b in zip(res, res_chunked):
+        assert np.array_equal(a, b)
+
+
+def test_lines_intersections_memory():
+    # long parallel lines, all 12.5e6 pairs overlap in X, none in Y
+    n_lines = 5000
+    lines = np.zeros((n_lines, 2, 2))
+    lines[:, 0, 0] = np.random.rand(n_lines) * 1e-3
+    lines[:, 1, 0] = 1 + np.random.rand(n_lines)
+    lines[:, 0, 1] = np.arange(n_lines)
+    lines[:, 1, 1] = np.arange(n_lines) + 0.5
+    tracemalloc.start()
+    try:
+        i, j, t_i, t_j = PolygonDecomposition.lines_intersections(lines)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert len(i) == 0
+    # all candidate pairs at once would take over 100 MB per index array
+    assert peak < 50e6
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_add_lines(seed):
+    np.random.seed(seed)
+    lines = np.random.rand(30, 2, 2) * 10
+
+    pd_seq = PolygonDecomposition()
+    pd_seq.set_tolerance(1e-8)
+    for a, b in lines:
+        pd_seq.add_line(a, b)
+
+    pd = PolygonDecomposition()
+    pd.set_tolerance(1e-8)
+    pd.add_line((-1, -1), (11, -1))
+    line_segments = pd.add_lines(lines)
+    pd.decomp.check_consistency()
+    assert len(line_segments) == len(lines)
+    for (a, b), segments in zip(lines, line_segments):
+        length = sum(la.norm(seg.vector) for seg in segments)
+        assert abs(length - la.norm(b - a)) < 1e-6
+    assert len(pd.points) == len(pd_seq.points) + 2
+    assert len(pd.segments) == len(pd_seq.segments) + 1
+    assert len(pd.polygons) == len(pd_seq.polygons)
+
+
+def test_pickle():
+    import pickle
+
+    def segment_links(pd):
+        return [ (seg.id, seg.point_ids(), [w.id for w in seg.wire], [(s.id, side) for s, side in seg.next])
+                 for seg in pd.segments.values()]
+
+    np.random.seed(3)
+    lines = np.random.rand(50, 2, 2) * 10
+    pd = PolygonDecomposition()
+    pd.add_lines(lines)
+    pd.add_point((20, 20))
+    for seg in list(pd.segments.values())[:10]:
+        pd.delete_segment(seg)
+
+    pd_copy = pickle.loads(pickle.dumps(pd))
+    pd_copy.decomp.check_consistency()
+    assert segment_links(pd) == segment_links(pd_copy)
+    for poly in pd.polygons.values():
+        poly_copy = pd_copy.polygons[poly.id]
+        assert poly.outer_wire.id == poly_copy.outer_wire.id
+        assert {w.id for w in poly.outer_wire.childs} == {w.id for w in poly_copy.outer_wire.childs}
+        assert {pt.id for pt in poly.free_points} == {pt.id for pt in poly_copy.free_points}
+
+    # Same results of further operations.
+    pd.add_line((0, 0), (10, 10))
+    pd_copy.add_line((0, 0), (10, 10))
+    pd_copy.decomp.check_consistency()
+    assert segment_links(pd) == segment_links(pd_copy)